@@ -0,0 +1,108 @@
+"""Benchmark dell'avvio a freddo della dashboard.
+
+Ogni ripetizione avvia un interprete Python nuovo (nessun modulo già in memoria) che importa
+il percorso di avvio della dashboard e ne esegue il primo rendering senza file caricati, come
+accade quando un nuovo replica riceve la prima richiesta. Per confronto misura anche il costo
+delle viste e delle librerie di analisi, che vengono importate solo quando servono.
+
+Uso (dalla radice del repository):
+
+    python benchmarks/cold_start.py --repeat 5 --json cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Librerie che non devono essere caricate dal primo rendering
+HEAVY_MODULES = ["sklearn", "matplotlib", "seaborn", "plotly", "streamlit_echarts", "pyarrow"]
+
+# Codice eseguito in ogni interprete nuovo: stampa una riga JSON con i tempi (secondi)
+CHILD = r'''
+import json, sys, time
+sys.path.insert(0, ROOT)
+timings = {}
+
+start = time.perf_counter()
+import streamlit, pandas
+from streamlit.testing.v1 import AppTest
+timings["import_runtime"] = time.perf_counter() - start
+preloaded = {name for name in HEAVY_MODULES if name in sys.modules}  # Importate da streamlit e pandas stessi
+
+start = time.perf_counter()
+import script_app.display_dashboard
+timings["import_dashboard"] = time.perf_counter() - start
+
+start = time.perf_counter()
+app = AppTest.from_string(
+    "from script_app.display_dashboard import display_dashboard\ndisplay_dashboard()\n", default_timeout=300
+)
+app.run()
+timings["first_render"] = time.perf_counter() - start
+loaded = [name for name in HEAVY_MODULES if name in sys.modules and name not in preloaded]
+
+start = time.perf_counter()
+import script_app.statistics_map_combined.Statistics
+import script_app.statistics_map_combined.map_combined_datasets
+timings["import_views"] = time.perf_counter() - start
+
+start = time.perf_counter()
+import sklearn.decomposition, sklearn.preprocessing, matplotlib.pyplot, seaborn
+timings["import_analysis_libraries"] = time.perf_counter() - start
+
+print(json.dumps({"timings": timings, "heavy_modules_at_startup": loaded, "loaded_by_runtime": sorted(preloaded),
+                  "exceptions": [str(error.value) for error in app.exception]}))
+'''
+
+def run_once():
+    """Esegue una misura in un interprete nuovo e ne restituisce il risultato."""
+    code = f"ROOT = {ROOT!r}\nHEAVY_MODULES = {HEAVY_MODULES!r}\n{CHILD}"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"Cold start measurement failed:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="numero di avvii a freddo misurati")
+    parser.add_argument("--json", help="file in cui salvare i risultati")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeat)]
+    summary = {
+        stage: {
+            "median_s": statistics.median(run["timings"][stage] for run in runs),
+            "min_s": min(run["timings"][stage] for run in runs),
+            "max_s": max(run["timings"][stage] for run in runs),
+        }
+        for stage in runs[0]["timings"]
+    }
+    result = {
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "stages": summary,
+        "startup_s": summary["import_dashboard"]["median_s"] + summary["first_render"]["median_s"],
+        "heavy_modules_at_startup": sorted({name for run in runs for name in run["heavy_modules_at_startup"]}),
+        "loaded_by_runtime": runs[0]["loaded_by_runtime"],
+        "exceptions": sorted({error for run in runs for error in run["exceptions"]}),
+    }
+
+    print(f"{'stage':<28}{'median':>10}{'min':>10}{'max':>10}")
+    for stage, values in summary.items():
+        print(f"{stage:<28}{values['median_s']:>9.3f}s{values['min_s']:>9.3f}s{values['max_s']:>9.3f}s")
+    print(f"\nDashboard startup (import + first render): {result['startup_s']:.3f}s")
+    print(f"Heavy modules loaded at startup: {', '.join(result['heavy_modules_at_startup']) or 'none'}"
+          f" (already imported by streamlit/pandas: {', '.join(result['loaded_by_runtime']) or 'none'})")
+    if result["exceptions"]:
+        print(f"Exceptions during first render: {result['exceptions']}")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(result, handle, indent=2)
+
+if __name__ == "__main__":
+    main()
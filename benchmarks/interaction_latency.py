@@ -0,0 +1,183 @@
+"""Benchmark della latenza di un'interazione in ogni vista della dashboard.
+
+Con Streamlit AppTest esegue le viste della dashboard (Statistics e Map Generator, come in
+`display_dashboard`) su file sintetici di piezometro e pluviometro, apre ogni modalità di analisi e
+cambia un widget della vista. Ogni interazione è misurata in due modi:
+
+- rerun completo: tutta la pagina viene rieseguita, come per ogni widget prima dei frammenti;
+- rerun del frammento: solo la vista che contiene il widget viene rieseguita (`st.fragment`).
+
+I due valori del widget si alternano dopo un riscaldamento, così le figure e i calcoli sono già in
+cache in entrambi i casi e si misura il costo del rerun stesso. AppTest riesegue sempre tutta la
+pagina: i rerun dei frammenti sono richiesti passando l'id del frammento al runner, come fa il
+browser (API interne di Streamlit: AppTest deve conservare i frammenti tra i run, non è così in Streamlit 1.38).
+
+Un rerun del frammento della mappa che trova una nuova area selezionata chiama `st.rerun()` e
+diventa un rerun di tutta la pagina, più lento del rerun completo: questi rerun sono contati nella
+colonna "escalated" invece di passare inosservati nella mediana.
+
+Uso (dalla radice del repository):
+
+    python benchmarks/interaction_latency.py --rows 100000 --repeat 5 --json interactions.json
+"""
+import argparse
+import functools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from streamlit.testing.v1 import AppTest
+import streamlit.testing.v1.local_script_runner as local_script_runner
+from pipeline import generate, _quiet_streamlit
+
+# Vista, pulsante della modalità, widget (tipo, chiave o etichetta) e due valori alternati
+SCENARIOS = [
+    ("Single Plot", "📊 Single Plot", ("selectbox", "plot_type_0"), ("Basic Line", "Basic Scatter")),
+    ("Merge", "🔄 Merge Datasets", ("checkbox", "secondary_y_0"), (True, False)),
+    ("Autocorrelation", "📈 Autocorrelation", ("number_input", "lag_0"), (100, 50)),
+    ("Cross-Correlation", "🔀 Cross-Correlation", ("number_input", "lag_{0}"), (100, 50)),
+    ("Distribution", "🔄 Distribution Data", ("selectbox", "reducer_{0}_0"), ("Max", "Count")),
+    ("PCA", "🔢 PCA Analysis", ("selectbox", "Select dataset for PCA"), ("{1}", "{0}")),
+    ("Map Generator", None, ("select_slider", "map_zoom"), (8, "Auto")),
+]
+DATASETS = ["piezometer", "rain_gauge"]
+
+def dashboard(root, paths):
+    """Script eseguito da AppTest: le due schede della dashboard sui file dati."""
+    import sys
+    sys.path.insert(0, root)
+    import streamlit as st
+    from script_app.load_plotting_utils.ingest import _Upload
+    from script_app.load_plotting_utils.load import load_dataset
+    from script_app.load_plotting_utils.profiling import start_rerun
+    from script_app.statistics_map_combined.Statistics import Statistics_Data
+    from script_app.statistics_map_combined.map_combined_datasets import map_combined_datasets, area_datasets
+
+    start_rerun()
+    datasets = []
+    for path in paths:
+        with open(path, "rb") as handle:
+            datasets.append(load_dataset(_Upload(path.rsplit("/", 1)[-1], handle.read())))
+    tab1, tab2 = st.tabs(["📊 Statistics", "🌍 Map Generator"])
+    with tab1:
+        Statistics_Data(area_datasets(datasets))
+    with tab2:
+        map_combined_datasets(datasets)
+
+def _widget(at, kind, name):
+    """Widget di AppTest per chiave o, se non ha chiave, per etichetta."""
+    return next(widget for widget in at.get(kind) if name in (widget.key, widget.label))
+
+def _fragment_ids(at):
+    return set(at._fragment_storage._fragments)
+
+def _timed_run(at, fragment_id=None):
+    """Rerun completo, o del solo frammento `fragment_id`; restituisce i millisecondi e gli ambiti rieseguiti."""
+    trace = at.session_state["_profiling_trace"]
+    first_rerun = trace.rerun + 1
+    start = time.perf_counter()
+    if fragment_id is None:
+        at.run()
+    else:
+        rerun_data = functools.partial(local_script_runner.RerunData, fragment_id_queue=[fragment_id])
+        with patch.object(local_script_runner, "RerunData", rerun_data):
+            at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    elapsed = (time.perf_counter() - start) * 1000
+    trace = at.session_state["_profiling_trace"]
+    return elapsed, [trace.scopes[rerun] for rerun in range(first_rerun, trace.rerun + 1)]
+
+def _last_rerun(at):
+    """Ambito e numero di chiamate misurate dell'ultimo rerun (profilo della sessione)."""
+    from script_app.load_plotting_utils.profiling import rerun_summary
+
+    summary = rerun_summary(at.session_state["_profiling_trace"])
+    last = summary.iloc[-1]
+    return last["scope"], int(last["calls"])
+
+def measure(at, scenario, names, map_id, repeat):
+    view, button, (kind, name), values = scenario
+    name = name.format(*names)
+    values = [value.format(*names) if isinstance(value, str) else value for value in values]
+    at.run()
+    if button is not None:
+        _widget(at, "button", button).click().run()
+    fragment_id = map_id if button is None else next(iter(_fragment_ids(at) - {map_id}))
+
+    for value in values:  # Riscaldamento: figure e calcoli di entrambi i valori in cache
+        _widget(at, kind, name).set_value(value).run()
+    results = {"view": view, "widget": name}
+    for label, target in (("full", None), ("fragment", fragment_id)):
+        timings, escalated = [], 0
+        for _ in range(repeat):
+            for value in values:
+                _widget(at, kind, name).set_value(value)
+                elapsed, scopes = _timed_run(at, target)
+                timings.append(elapsed)
+                escalated += target is not None and "app" in scopes  # Il frammento ha chiesto un rerun completo
+        results[f"{label}_ms"] = statistics.median(timings)
+        results[f"{label}_escalated"] = escalated
+        results[f"{label}_scope"], results[f"{label}_calls"] = _last_rerun(at)
+    at.run()  # Albero completo per la vista successiva
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="righe per file")
+    parser.add_argument("--repeat", type=int, default=3, help="coppie di interazioni misurate per vista (si usa la mediana)")
+    parser.add_argument("--views", nargs="+", choices=[scenario[0] for scenario in SCENARIOS],
+                        default=[scenario[0] for scenario in SCENARIOS])
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "land_instability_benchmark"),
+                        help="cartella dei file sintetici (riusati se presenti)")
+    parser.add_argument("--json", help="file in cui salvare i risultati")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    paths = []
+    for instrument in DATASETS:
+        path = os.path.join(args.data_dir, f"{instrument}_{args.rows}_comma_s0.csv")
+        generate(path, instrument, args.rows, "csv", "comma")
+        paths.append(path)
+    names = [os.path.basename(path) for path in paths]
+
+    _quiet_streamlit()
+    at = AppTest.from_function(dashboard, args=(ROOT, paths), default_timeout=600)
+    if not hasattr(at, "_fragment_storage"):
+        sys.exit("This Streamlit version does not keep fragments between AppTest runs: fragment reruns can't be measured.")
+    # Statistics_Data chiude la vista Distribution a ogni rerun completo finché manca "show_pivot":
+    # la chiave la tiene aperta, così le due misure riguardano la stessa vista
+    at.session_state["show_pivot"] = True
+    at.run()
+    # Id del frammento della mappa: l'unico presente con due modalità diverse della scheda Statistics
+    first = _fragment_ids(at)
+    if not first:
+        sys.exit("Fragments are disabled (LAND_INSTABILITY_FRAGMENTS=0): nothing to compare.")
+    _widget(at, "button", "🔄 Merge Datasets").click().run()
+    map_id = next(iter(first & _fragment_ids(at)))
+
+    results = []
+    print(f"{'view':<18}{'widget':<40}{'full rerun':>12}{'fragment':>12}{'speedup':>9}{'escalated':>11}  calls (full → fragment)")
+    for scenario in SCENARIOS:
+        if scenario[0] not in args.views:
+            continue
+        result = measure(at, scenario, names, map_id, args.repeat)
+        results.append(result)
+        print(f"{result['view']:<18}{result['widget']:<40}{result['full_ms']:>10.0f}ms{result['fragment_ms']:>10.0f}ms"
+              f"{result['full_ms'] / result['fragment_ms']:>8.1f}×{result['fragment_escalated']:>11}"
+              f"  {result['full_calls']} → {result['fragment_calls']}"
+              f" ({result['fragment_scope']})")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "results": results},
+                      handle, indent=2, default=str)
+
+if __name__ == "__main__":
+    main()
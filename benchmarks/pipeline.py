@@ -0,0 +1,313 @@
+"""Benchmark di tutte le fasi della pipeline su dataset sintetici di monitoraggio frane.
+
+Genera file sintetici di inclinometri, GNSS, piezometri e pluviometri (dimensioni da 10⁴ a 10⁸
+righe) in CSV, TXT e XLSX, con separatore virgola, punto e virgola e virgola decimale, e misura
+per ogni fase tempo (reale e CPU) e picco di memoria allocata (tracemalloc): lettura, elaborazione,
+conversione delle date, statistiche, aggregazioni, autocorrelazione, correlazione incrociata, PCA,
+costruzione dei grafici e della mappa. I file generati sono deterministici (seed fisso) e vengono
+riusati tra un'esecuzione e l'altra se si passa la stessa `--data-dir`.
+
+I risultati vanno in un file JSON; con `--compare` si confrontano con un'esecuzione precedente e
+le fasi più lente oltre la soglia sono segnalate (codice di uscita 1), utile per le regressioni.
+
+Uso (dalla radice del repository):
+
+    python benchmarks/pipeline.py --sizes 10000 100000 --json pipeline.json
+    python benchmarks/pipeline.py --instruments gnss --formats csv --sizes 1000000 --compare pipeline.json
+"""
+import argparse
+import gc
+import importlib.metadata
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from script_app.load_plotting_utils.load import load_file, process_file
+from script_app.load_plotting_utils.dataset import build_dataset, dataset_pyramid
+from script_app.load_plotting_utils.utils import (convert_unix_to_datetime, calcula_statistics, aggrega_datos_time,
+                                                  compute_autocorrelation, compute_cross_correlation, compute_pca,
+                                                  AGGREGATION_REDUCERS)
+from script_app.load_plotting_utils.plotting import create_and_render_plot
+from script_app.statistics_map_combined.map_combined_datasets import map_combined_datasets
+
+CHUNK_ROWS = 1_000_000  # Righe generate e scritte per blocco
+XLSX_LIMIT = 1_048_575  # Righe di dati massime di un foglio Excel
+VARIANTS = {
+    "comma": {"sep": ",", "decimal": "."},
+    "semicolon": {"sep": ";", "decimal": "."},
+    "decimal-comma": {"sep": ";", "decimal": ","},
+}
+FORMATS = ["csv", "txt", "xlsx"]
+PACKAGES = ["numpy", "pandas", "pyarrow", "plotly", "streamlit", "scikit-learn"]  # Versioni salvate con i risultati
+
+def _quiet_streamlit():
+    """Le viste girano senza server Streamlit: si spengono gli avvisi che emettono a ogni chiamata."""
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).disabled = True
+
+# 🔹 Generatori: blocco di `n` righe a partire dalla riga `start` (stessi dati a parità di seed)
+def _sites(rng, n, n_sites, lat=46.0, lon=11.0):
+    """Coordinate di n_sites postazioni, assegnate a rotazione alle righe."""
+    site_lat = lat + np.random.default_rng(0).random(n_sites) * 0.5
+    site_lon = lon + np.random.default_rng(1).random(n_sites) * 0.5
+    site = np.arange(n) % n_sites
+    return site, site_lat[site], site_lon[site]
+
+def inclinometer(rng, start, n):
+    depths = np.arange(0.5, 30.5, 0.5)
+    reading = (start + np.arange(n)) // len(depths)  # Una lettura completa del profilo ogni ora
+    site, lat, lon = _sites(rng, n, 5)
+    return pd.DataFrame({
+        "Date": (pd.Timestamp("2015-01-01") + pd.to_timedelta(reading, unit="h")).strftime("%d/%m/%Y %H:%M"),
+        "Depth": depths[(start + np.arange(n)) % len(depths)],
+        "A0": np.round(np.cumsum(rng.normal(0, 0.05, n)), 3),
+        "B0": np.round(np.cumsum(rng.normal(0, 0.05, n)), 3),
+        "Temperature": np.round(11 + rng.normal(0, 0.3, n), 2),
+        "Latitude": np.round(lat, 6),
+        "Longitude": np.round(lon, 6),
+    })
+
+def gnss(rng, start, n):
+    epochs = 1_420_070_400 + 30 * (start + np.arange(n))  # Tempo Unix in secondi, un'epoca ogni 30 s
+    site, lat, lon = _sites(rng, n, 10)
+    return pd.DataFrame({
+        "time": epochs,
+        "lat": np.round(lat + rng.normal(0, 2e-8, n), 9),
+        "lon": np.round(lon + rng.normal(0, 2e-8, n), 9),
+        "height": np.round(850 + site * 12 + rng.normal(0, 0.004, n), 4),
+        "dN": np.round(rng.normal(0, 0.002, n), 4),
+        "dE": np.round(rng.normal(0, 0.002, n), 4),
+        "dU": np.round(rng.normal(0, 0.005, n), 4),
+    })
+
+def piezometer(rng, start, n):
+    times = pd.Timestamp("2015-01-01") + pd.to_timedelta(10 * (start + np.arange(n)), unit="min")
+    site, lat, lon = _sites(rng, n, 8)
+    level = 12 + np.sin(np.arange(start, start + n) / 4_000) + np.cumsum(rng.normal(0, 0.002, n))
+    return pd.DataFrame({
+        "Date": times.strftime("%Y-%m-%d %H:%M:%S"),
+        "Water level": np.round(level, 3),
+        "Pressure": np.round(level * 9.81 + rng.normal(0, 0.05, n), 2),
+        "Temperature": np.round(9 + rng.normal(0, 0.2, n), 2),
+        "Latitude": np.round(lat, 6),
+        "Longitude": np.round(lon, 6),
+    })
+
+def rain_gauge(rng, start, n):
+    times = pd.Timestamp("2015-01-01") + pd.to_timedelta(5 * (start + np.arange(n)), unit="min")
+    site, lat, lon = _sites(rng, n, 4)
+    rain = np.where(rng.random(n) < 0.08, np.round(rng.gamma(0.6, 1.5, n), 1), 0.0)  # Per lo più zero
+    return pd.DataFrame({
+        "Date": times.strftime("%d.%m.%Y %H:%M:%S"),
+        "Station": np.array(["RG01", "RG02", "RG03", "RG04"])[site],
+        "Rain": rain,
+        "Air temperature": np.round(10 + 8 * np.sin(np.arange(start, start + n) / 288 * 2 * np.pi) + rng.normal(0, 1, n), 1),
+        "Latitude": np.round(lat, 6),
+        "Longitude": np.round(lon, 6),
+    })
+
+# Generatore, colonna temporale (dopo l'elaborazione) e due colonne di valori per strumento
+INSTRUMENTS = {
+    "inclinometer": (inclinometer, "Date", ["A0", "B0"]),
+    "gnss": (gnss, "time", ["dN", "dU"]),
+    "piezometer": (piezometer, "Date", ["Water level", "Pressure"]),
+    "rain_gauge": (rain_gauge, "Date", ["Rain", "Air temperature"]),
+}
+
+def generate(path, instrument, n_rows, file_format, variant, seed=0):
+    """Scrive il file sintetico a blocchi (memoria costante per CSV/TXT), se non esiste già."""
+    if os.path.exists(path):
+        return
+    generator = INSTRUMENTS[instrument][0]
+    root, extension = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{extension}"  # Stessa estensione: pandas sceglie il writer Excel da qui
+    chunks = (generator(np.random.default_rng([seed, chunk]), start, min(CHUNK_ROWS, n_rows - start))
+              for chunk, start in enumerate(range(0, n_rows, CHUNK_ROWS)))
+    if file_format == "xlsx":
+        pd.concat(chunks, ignore_index=True).to_excel(tmp_path, index=False, engine="openpyxl")
+    else:
+        with open(tmp_path, "w", encoding="utf-8", newline="") as handle:
+            for chunk, frame in enumerate(chunks):
+                frame.to_csv(handle, index=False, header=chunk == 0, **VARIANTS[variant])
+    os.replace(tmp_path, path)
+
+# 🔹 Misura delle fasi
+def measure(stages, stage, function, memory=False):
+    """Esegue una fase e ne registra tempo reale e CPU, oppure (con `memory`) il picco di memoria allocata.
+
+    Tempo e memoria si misurano in due passate separate: tracemalloc rallenta di più volte il
+    codice Python (costruzione delle figure plotly) e falserebbe i tempi.
+    """
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        value, error = function(), None
+    except Exception as e:
+        value, error = None, f"{type(e).__name__}: {e}"
+    metrics = {"stage": stage, "error": error}
+    if memory:
+        metrics["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    else:
+        metrics.update(wall_s=time.perf_counter() - wall, cpu_s=time.process_time() - cpu)
+    stages.append(metrics)
+    return value
+
+def run_pipeline(path, instrument, memory=False):
+    """Tutte le fasi, nell'ordine in cui le esegue la dashboard, su un file; restituisce le misure per fase."""
+    _, time_col, (value_1, value_2) = INSTRUMENTS[instrument]
+    stages = []
+    with open(path, "rb") as handle:
+        raw = measure(stages, "load_file", lambda: load_file(handle), memory)
+    if raw is None:
+        return stages
+    measure(stages, "convert_unix_to_datetime", lambda: convert_unix_to_datetime(raw.copy(deep=False)), memory)
+    df = measure(stages, "process_file", lambda: process_file(raw), memory)
+    del raw
+    if df is None:
+        return stages
+    key = (os.path.basename(path), memory)  # Chiave diversa per file e passata: le cache delle viste partono vuote
+    dataset = measure(stages, "build_dataset", lambda: build_dataset(df, os.path.basename(path), key), memory)
+
+    measure(stages, "calcula_statistics", lambda: calcula_statistics(df), memory)
+    reducers = tuple(AGGREGATION_REDUCERS.values())
+    measure(stages, "aggrega_datos_time", lambda: aggrega_datos_time(df, time_col, value_1, reducers), memory)
+    if dataset is not None and dataset.pyramid is not None:
+        # La piramide di una colonna è costruita alla prima aggregazione
+        pyramid = measure(stages, "dataset_pyramid (1 column)", lambda: dataset_pyramid(dataset, time_col, [value_1]), memory)
+        measure(stages, "aggrega_datos_time (pyramid)",
+                lambda: aggrega_datos_time(df, time_col, value_1, ("count", "mean", "min", "max", "sum"), pyramid), memory)
+    measure(stages, "compute_autocorrelation", lambda: compute_autocorrelation(df, value_1), memory)
+    measure(stages, "compute_cross_correlation", lambda: compute_cross_correlation(df, value_1, value_2), memory)
+    measure(stages, "perform_pca (compute_pca)", lambda: compute_pca(df, df.select_dtypes("number").columns.tolist()), memory)
+    measure(stages, "plotting (Basic Line)", lambda: create_and_render_plot(df, time_col, value_1, "Basic Line"), memory)
+    if dataset is not None:
+        measure(stages, "map_combined_datasets", lambda: map_combined_datasets([dataset]), memory)
+    return stages
+
+def benchmark_file(path, record, memory=True, repeat=1):
+    """Passate dei tempi (mediana di `repeat`) e passata della memoria su un file; una riga di risultati per fase."""
+    peaks = {stage["stage"]: stage["peak_mb"] for stage in run_pipeline(path, record["instrument"], True)} if memory else {}
+    runs = [run_pipeline(path, record["instrument"]) for _ in range(repeat)]
+    results = []
+    for stage in runs[0]:
+        timings = [other for run in runs for other in run if other["stage"] == stage["stage"]]
+        stage = dict(stage, wall_s=statistics.median(t["wall_s"] for t in timings), cpu_s=statistics.median(t["cpu_s"] for t in timings))
+        result = dict(record, **stage, peak_mb=peaks.get(stage["stage"]))
+        results.append(result)
+        peak = "" if result["peak_mb"] is None else f"{result['peak_mb']:>10.1f} MB"
+        print(f"{record['instrument']:>13} {record['format']:>5} {record['variant']:>14} {record['rows']:>11,} "
+              f"{stage['stage']:<32}{stage['wall_s']:>9.3f}s{peak}" + (f"  ✗ {stage['error']}" if stage["error"] else ""))
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline_path, threshold, min_delta):
+    """Confronta i tempi con un'esecuzione precedente; restituisce le fasi più lente della soglia.
+
+    Le differenze sotto `min_delta` secondi sono ignorate: sulle fasi brevi sono solo rumore.
+    """
+    with open(baseline_path) as handle:
+        baseline = {_result_key(result): result for result in json.load(handle)["results"]}
+    regressions = []
+    print(f"\nComparison with {baseline_path} (threshold +{threshold:.0%}):")
+    for result in results:
+        previous = baseline.get(_result_key(result))
+        if previous is None or result["error"] or previous["error"] or previous["wall_s"] <= 0:
+            continue
+        ratio = result["wall_s"] / previous["wall_s"]
+        if ratio > 1 + threshold and result["wall_s"] - previous["wall_s"] > min_delta:
+            regressions.append(dict(result, baseline_wall_s=previous["wall_s"], ratio=ratio))
+            print(f"  ✗ {' / '.join(map(str, _result_key(result)))}: {previous['wall_s']:.3f}s → {result['wall_s']:.3f}s ({ratio:.2f}×)")
+    if not regressions:
+        print("  no regressions")
+    return regressions
+
+def _result_key(result):
+    return result["instrument"], result["format"], result["variant"], result["rows"], result["stage"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="righe per file (fino a 10^8)")
+    parser.add_argument("--instruments", nargs="+", choices=list(INSTRUMENTS), default=list(INSTRUMENTS))
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS),
+                        help="separatori dei file CSV/TXT (i file XLSX hanno un'unica variante)")
+    parser.add_argument("--xlsx-max-rows", type=int, default=100_000, help="dimensione massima dei file XLSX generati")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "land_instability_benchmark"),
+                        help="cartella dei file sintetici (riusati se presenti)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="passate dei tempi per file (si usa la mediana)")
+    parser.add_argument("--no-memory", action="store_true", help="salta la passata di misura della memoria")
+    parser.add_argument("--json", help="file in cui salvare i risultati")
+    parser.add_argument("--compare", help="risultati JSON di un'esecuzione precedente da confrontare")
+    parser.add_argument("--threshold", type=float, default=0.2, help="rallentamento tollerato nel confronto (0.2 = +20%%)")
+    parser.add_argument("--min-delta", type=float, default=0.01, help="differenza minima (s) per segnalare una regressione")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    # Riscaldamento (import pigri, prima figura plotly) su un file piccolo, non registrato
+    warmup = os.path.join(args.data_dir, f"warmup_s{args.seed}.csv")
+    generate(warmup, "piezometer", 1_000, "csv", "comma", args.seed)
+    _quiet_streamlit()
+    run_pipeline(warmup, "piezometer")
+    _quiet_streamlit()  # Anche i logger creati durante il riscaldamento
+
+    results, skipped = [], []
+    print(f"{'instrument':>13} {'fmt':>5} {'variant':>14} {'rows':>11} {'stage':<32}{'time':>10}{'peak':>13}")
+    for n_rows in args.sizes:
+        for instrument in args.instruments:
+            for file_format in args.formats:
+                variants = ["native"] if file_format == "xlsx" else args.variants
+                for variant in variants:
+                    record = {"instrument": instrument, "format": file_format, "variant": variant, "rows": n_rows}
+                    if file_format == "xlsx" and n_rows > min(args.xlsx_max_rows, XLSX_LIMIT):
+                        skipped.append(dict(record, reason="above the XLSX size limit"))
+                        continue
+                    path = os.path.join(args.data_dir, f"{instrument}_{n_rows}_{variant}_s{args.seed}.{file_format}")
+                    start = time.perf_counter()
+                    generate(path, instrument, n_rows, file_format, variant, args.seed)
+                    record["file_mb"] = os.path.getsize(path) / 1024 ** 2
+                    record["generate_s"] = time.perf_counter() - start
+                    results += benchmark_file(path, record, not args.no_memory, args.repeat)
+
+    output = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {name: importlib.metadata.version(name) for name in PACKAGES},
+        "args": vars(args),
+        "results": results,
+        "skipped": skipped,
+    }
+    regressions = compare(results, args.compare, args.threshold, args.min_delta) if args.compare else []
+    output["regressions"] = regressions
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(output, handle, indent=2, default=str)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
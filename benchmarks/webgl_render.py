@@ -0,0 +1,70 @@
+"""Benchmark dei grafici scatter/linee: SVG (Scatter) contro WebGL (Scattergl).
+
+Per ogni dimensione costruisce la stessa figura con le due tracce e misura il tempo di
+costruzione lato server (figura + serializzazione JSON, come fa `st.plotly_chart`) e la
+dimensione del payload inviato al browser; per confronto misura anche la traccia SVG dopo la
+decimazione LTTB al budget di punti predefinito. Il tempo di disegno nel browser non è misurabile
+da qui: WebGL lo mantiene interattivo ben oltre il limite pratico dell'SVG (~50k punti).
+
+Uso (dalla radice del repository):
+
+    python benchmarks/webgl_render.py --sizes 1000 10000 100000 1000000 --json webgl.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plotly.graph_objects as go
+from script_app.load_plotting_utils.plotting import resolve_render_mode, WEBGL_THRESHOLD
+from script_app.load_plotting_utils.decimation import decimate_xy, CHART_POINT_BUDGET
+
+TRACES = {"svg": (go.Scatter, False), "webgl": (go.Scattergl, False), "svg+lttb": (go.Scatter, True)}
+
+def synthetic_series(n_points, seed=0):
+    """Serie temporale sintetica (passeggiata casuale) con n_points punti."""
+    rng = np.random.default_rng(seed)
+    return pd.date_range("2020-01-01", periods=n_points, freq="min"), np.cumsum(rng.normal(size=n_points))
+
+def measure(trace, x, y, repeat, decimated=False):
+    """Tempo mediano di costruzione + serializzazione (e decimazione) e dimensione del JSON della figura."""
+    timings, payload = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        x_plot, y_plot = decimate_xy(x, y, CHART_POINT_BUDGET) if decimated else (x, y)
+        figure = go.Figure(trace(x=x_plot, y=y_plot, mode="lines"))
+        payload = len(figure.to_json())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), payload
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="ripetizioni per misura")
+    parser.add_argument("--json", help="file in cui salvare i risultati")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'points':>10} {'renderer':>9} {'build (s)':>10} {'payload (MB)':>13} {'auto picks':>11}")
+    for n_points in args.sizes:
+        x, y = synthetic_series(n_points)
+        for renderer, (trace, decimated) in TRACES.items():
+            build_s, payload = measure(trace, x, y, args.repeat, decimated)
+            auto = resolve_render_mode(n_points)
+            results.append({"points": n_points, "renderer": renderer, "build_s": build_s,
+                            "payload_bytes": payload, "auto_choice": auto})
+            print(f"{n_points:>10,} {renderer:>9} {build_s:>10.3f} {payload / 1024 ** 2:>13.2f} {auto:>11}")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({"webgl_threshold": WEBGL_THRESHOLD, "results": results}, handle, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import tracemalloc
+import streamlit as st
+from script_app.load_plotting_utils.profiling import (current_trace, set_memory_tracking, rerun_summary, function_summary,
+                                                      spans_frame, export_json, export_chrome_trace, TRACE_STATE,
+                                                      MEMORY_TRACKING_ALLOWED)
+
+def diagnostics_panel():
+    """Pannello con le misure delle chiamate della dashboard in questa sessione (pagina Info)."""
+    st.caption("Wall and CPU time, memory peak, rows and cache hits of every instrumented call, per rerun. "
+               "Use the Dashboard, then come back here.")
+    # tracemalloc vale per tutto il processo: applicato solo quando si sposta il toggle, non a ogni rerun
+    if MEMORY_TRACKING_ALLOWED:
+        st.toggle("Track memory peaks (tracemalloc, slows down the app for every user)", value=tracemalloc.is_tracing(),
+                  key="diagnostics_memory", on_change=lambda: set_memory_tracking(st.session_state["diagnostics_memory"]))
+    if tracemalloc.is_tracing():
+        st.caption("⚠️ Memory peaks are approximate: tracemalloc is process-wide, so they include allocations "
+                   "made at the same time by other sessions.")
+    elif not MEMORY_TRACKING_ALLOWED:
+        st.caption("Memory peaks are off. Set LAND_INSTABILITY_MEMORY_TRACKING=1 on the server to allow them.")
+
+    trace = current_trace()
+    if trace is None or not trace.spans:
+        st.info("No measurements yet.")
+        return
+
+    reruns = rerun_summary(trace)
+    st.markdown("**Reruns**")
+    st.dataframe(reruns.tail(20), hide_index=True, use_container_width=True)
+
+    rerun = st.selectbox("Rerun", reruns["rerun"].tolist()[::-1], key="diagnostics_rerun")
+    st.markdown("**Functions**")
+    st.dataframe(function_summary(trace, rerun), hide_index=True, use_container_width=True)
+
+    with st.expander("Calls"):
+        spans = spans_frame(trace)
+        spans = spans[spans["rerun"] == rerun].assign(name=lambda df: df["depth"].map(lambda depth: "  " * depth) + df["name"])  # Chiamate annidate rientrate
+        st.dataframe(spans.drop(columns=["rerun", "depth"]), hide_index=True, use_container_width=True)
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("⬇️ JSON", export_json(trace), file_name="land_instability_profile.json", mime="application/json")
+    col2.download_button("⬇️ Chrome trace", export_chrome_trace(trace), file_name="land_instability_trace.json",
+                         mime="application/json", help="Open in chrome://tracing or ui.perfetto.dev")
+    if col3.button("🗑️ Clear"):
+        del st.session_state[TRACE_STATE]
+        st.rerun()
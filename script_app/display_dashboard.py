@@ -1,14 +1,13 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from streamlit_echarts import st_echarts
-from script_app.load_plotting_utils.plotting import create_and_render_plot
-from script_app.load_plotting_utils.load import load_file, process_file
-from script_app.statistics_map_combined.map_combined_datasets import map_combined_datasets
-from script_app.statistics_map_combined.Statistics import Statistics_Data
+from script_app.load_plotting_utils.load import file_dialect
+from script_app.load_plotting_utils.ingest import load_datasets
+from script_app.load_plotting_utils.cache import get_cache
+from script_app.load_plotting_utils.decimation import CHART_POINT_BUDGET, DECIMATION_METHODS
+from script_app.load_plotting_utils.profiling import start_rerun
 
 def display_dashboard():
+    start_rerun()  # Le chiamate misurate di questo rerun (pannello Diagnostics nella pagina Info)
     st.header("Data Analysis and Plotting")
     st.write("Here you can upload and view your data on a map and plot." 
              " Use the side window to upload your files, and the dashboard will display the various products:  **📊 Statistics** and **🌍 Map Generator**. "
@@ -23,20 +22,42 @@ def display_dashboard():
         st.sidebar.info("No files uploaded yet.")
         return
     
-    df_list = []
-    filenames = []
+    # File non ancora in cache letti in parallelo; riusa i dataset elaborati se i file non sono cambiati
+    datasets = load_datasets(uploaded_files)
+    loaded = {dataset.name for dataset in datasets}
 
     for uploaded_file in uploaded_files:
-        df = load_file(uploaded_file)
-        if df is not None:
-            #sep = detect_separator(uploaded_file)  # Rileva il separatore
-            df = process_file(df)  # Passa il separatore alla funzione
-            df_list.append(df)
-            filenames.append(uploaded_file.name)
+        dialect = file_dialect(uploaded_file)
+        if uploaded_file.name in loaded and dialect is not None:
+            st.sidebar.caption(f"**{uploaded_file.name}** - {dialect.describe()}")  # Dialetto rilevato
+
+    # Memoria risparmiata dall'ottimizzazione dei tipi, per colonna
+    with st.sidebar.expander("🧮 Memory optimization"):
+        for dataset in datasets:
+            st.caption(f"**{dataset.name}** - {dataset.n_rows} rows, {dataset.memory_bytes / 1024 ** 2:.1f} MB in memory")
+            report = pd.DataFrame(dataset.df.attrs.get("dtype_report", []))
+            if not report.empty:
+                st.dataframe(report, hide_index=True)
+
+    # Punti massimi per serie inviati al browser: oltre il budget i grafici sono decimati
+    with st.sidebar.expander("📉 Chart rendering"):
+        st.number_input("Max points per series", min_value=500, max_value=500_000, value=CHART_POINT_BUDGET,
+                        step=500, key="chart_point_budget")
+        st.selectbox("Downsampling method", list(DECIMATION_METHODS), key="chart_decimation",
+                     help="LTTB keeps the visual shape of the series; Min-Max keeps every bucket's extremes.")
+
+    # Statistiche della cache di caricamento
+    stats = get_cache("datasets").stats()
+    st.sidebar.caption(f"🗄️ Cache: {stats['hits']} hits / {stats['misses']} misses - "
+                       f"{stats['used_mb']:.1f} of {stats['budget_mb']:.0f} MB")
     
+    # Le viste (plotly e librerie di analisi) sono importate solo quando ci sono dati da mostrare
+    from script_app.statistics_map_combined.Statistics import Statistics_Data
+    from script_app.statistics_map_combined.map_combined_datasets import map_combined_datasets, area_datasets
+
     tab1, tab2 = st.tabs(["📊 Statistics","🌍 Map Generator"])
     
     with tab1:
-        Statistics_Data(df_list, filenames)    
+        Statistics_Data(area_datasets(datasets))  # Ristretti all'area selezionata sulla mappa, se presente    
     with tab2:
-        map_combined_datasets(df_list, filenames)
+        map_combined_datasets(datasets)
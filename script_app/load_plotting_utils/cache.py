@@ -0,0 +1,199 @@
+import os
+import sys
+import glob
+import hashlib
+import threading
+import pandas as pd
+import streamlit as st
+from cachetools import LRUCache
+
+# 🔹 Budget di memoria (MB) di tutte le cache in memoria, configurabile da variabile d'ambiente
+CACHE_MB = int(os.environ.get("LAND_INSTABILITY_CACHE_MB", "2048"))
+
+# Quota del budget di ciascuna cache: la somma è 1, quindi insieme non superano CACHE_MB
+CACHE_SHARES = {
+    "datasets": 0.61,  # DataFrame elaborati con piramidi e metadati
+    "figures": 0.125,  # Figure plotly e immagini della PCA
+    "aggregations": 0.06,
+    "alignment": 0.06,
+    "spatial_index": 0.05,
+    "map_bins": 0.03,
+    "time_order": 0.03,
+    "area_positions": 0.02,
+    "pca": 0.01,
+    "statistics": 0.004,
+    "dialects": 0.001,
+}
+
+# 🔹 Cache su disco dei dataset elaborati (Arrow IPC, riaperti in memory-map)
+DISK_CACHE_DIR = os.environ.get("LAND_INSTABILITY_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "land_instability"))
+DISK_CACHE_MB = int(os.environ.get("LAND_INSTABILITY_DISK_CACHE_MB", "20480"))
+DISK_CACHE_VERSION = 4  # Da incrementare quando cambia l'elaborazione dei dataset
+
+# Registro delle cache create, usato per mostrare le statistiche di hit/miss
+_registry = {}
+# Hit/miss del thread corrente: ogni sessione Streamlit esegue lo script nel suo thread
+_thread_counters = threading.local()
+
+def content_hash(data):
+    """Calcola l'hash del contenuto del file (bytes)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def make_cache_key(digest, options=None):
+    """Costruisce la chiave di cache a partire dall'hash del contenuto e dalle opzioni di parsing."""
+    return (digest, tuple(sorted((options or {}).items())))
+
+def estimate_size(value):
+    """Stima l'occupazione in memoria (bytes) di un valore salvato in cache."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if hasattr(value, "to_plotly_json"):  # Figura plotly: dati delle tracce e layout
+        return estimate_size(value.to_plotly_json())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+class MemoryCache:
+    """Cache LRU con budget di memoria in bytes e contatori di hit/miss."""
+
+    def __init__(self, name, max_bytes, getsizeof=estimate_size):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._cache = LRUCache(maxsize=max_bytes, getsizeof=getsizeof)
+        self._lock = threading.RLock()
+
+    def get_or_compute(self, key, compute):
+        """Restituisce il valore in cache per `key`, altrimenti lo calcola con `compute()` e lo memorizza."""
+        with self._lock:
+            try:
+                value = self._cache[key]
+                self.hits += 1
+                _thread_counters.hits = getattr(_thread_counters, "hits", 0) + 1
+                return value
+            except KeyError:
+                self.misses += 1
+                _thread_counters.misses = getattr(_thread_counters, "misses", 0) + 1
+
+        value = compute()
+        if value is not None:
+            with self._lock:
+                try:
+                    self._cache[key] = value  # Le voci meno usate vengono rimosse oltre il budget
+                except ValueError:
+                    pass  # Il valore da solo supera l'intero budget: non viene memorizzato
+        return value
+
+    def resize(self, key):
+        """Ricalcola l'occupazione della voce `key` dopo che il valore è cresciuto sul posto.
+
+        Le voci meno usate vengono rimosse se il budget è superato; se il valore da solo supera
+        l'intero budget la voce viene rimossa.
+        """
+        with self._lock:
+            if key not in self._cache:
+                return
+            try:
+                self._cache[key] = self._cache[key]
+            except ValueError:
+                del self._cache[key]
+
+    def __contains__(self, key):
+        """Presenza della chiave, senza aggiornare contatori e ordine LRU."""
+        with self._lock:
+            return key in self._cache
+
+    def clear(self):
+        """Svuota la cache e azzera i contatori."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Restituisce le statistiche correnti della cache."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._cache),
+                "used_mb": self._cache.currsize / 1024 ** 2,
+                "budget_mb": self.max_bytes / 1024 ** 2,
+            }
+
+# 🔹 Cache condivisa tra rerun e sessioni (una per nome)
+@st.cache_resource
+def get_cache(name):
+    """Restituisce la cache condivisa con il nome dato (una voce di CACHE_SHARES), creandola alla prima richiesta."""
+    cache = MemoryCache(name, int(CACHE_SHARES[name] * CACHE_MB * 1024 ** 2))
+    _registry[name] = cache
+    return cache
+
+def cache_stats():
+    """Statistiche di tutte le cache create finora."""
+    return [cache.stats() for cache in _registry.values()]
+
+def thread_cache_counters():
+    """Hit e miss di tutte le cache nel thread corrente, senza quelli delle altre sessioni."""
+    return getattr(_thread_counters, "hits", 0), getattr(_thread_counters, "misses", 0)
+
+# 🔹 Cache su disco condivisa tra sessioni e utenti
+def disk_cache_path(key):
+    """Percorso del file Arrow associato alla chiave di cache."""
+    name = hashlib.blake2b(repr((DISK_CACHE_VERSION, key)).encode(), digest_size=16).hexdigest()
+    return os.path.join(DISK_CACHE_DIR, f"{name}.arrow")
+
+def read_disk_cache(key):
+    """Riapre il DataFrame salvato su disco in memory-map, o None se non presente.
+
+    Le colonne numeriche senza valori nulli restano mappate sul file (zero-copy), quindi
+    la riapertura non dipende dalla dimensione dell'archivio originale.
+    """
+    import pyarrow as pa
+
+    path = disk_cache_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        os.utime(path)  # Aggiorna la data di ultimo uso per la pulizia LRU
+        return table.to_pandas(split_blocks=True)
+    except (OSError, ValueError, TypeError):
+        return None  # File corrotto o incompatibile: verrà rigenerato
+
+def write_disk_cache(key, df):
+    """Salva il DataFrame elaborato su disco in formato Arrow IPC (non compresso, mappabile)."""
+    import pyarrow as pa
+
+    path = disk_cache_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)  # Scrittura atomica: nessun lettore vede file parziali
+        prune_disk_cache()
+    except (OSError, ValueError, TypeError):
+        # Colonne non convertibili in Arrow o disco non scrivibile: si resta senza cache su disco
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def prune_disk_cache(max_mb=DISK_CACHE_MB):
+    """Rimuove i file usati meno di recente finché la cache su disco supera il budget."""
+    files = sorted(glob.glob(os.path.join(DISK_CACHE_DIR, "*.arrow")), key=os.path.getmtime)
+    total = sum(os.path.getsize(path) for path in files)
+    for path in files:
+        if total <= max_mb * 1024 ** 2:
+            break
+        total -= os.path.getsize(path)
+        os.remove(path)
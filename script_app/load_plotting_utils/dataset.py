@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field
+import pandas as pd
+from script_app.load_plotting_utils.pyramid import build_pyramid, ensure_columns
+from script_app.load_plotting_utils.spatial import build_spatial_index
+from script_app.load_plotting_utils.cache import get_cache
+from script_app.load_plotting_utils.profiling import profiled
+
+# 🔹 Nomi riconosciuti per le coordinate (vedi sezione Info), in ordine di preferenza
+COORDINATE_NAMES = {
+    "lat": ["latitude", "lat", "_latitude", "y"],
+    "lon": ["longitude", "lon", "long", "_longitude", "x"],
+}
+
+@dataclass
+class Dataset:
+    """DataFrame caricato con i metadati calcolati una sola volta al caricamento.
+
+    Le viste leggono ruoli delle colonne, coordinate e intervalli da qui invece di
+    riesaminare i dati a ogni interazione. Il DataFrame va trattato in sola lettura.
+    """
+    name: str
+    df: pd.DataFrame
+    key: tuple = None  # Chiave di cache (hash del contenuto + opzioni)
+    columns: list = field(default_factory=list)
+    numeric_columns: list = field(default_factory=list)
+    datetime_columns: list = field(default_factory=list)
+    categorical_columns: list = field(default_factory=list)
+    lat_column: str = None
+    lon_column: str = None
+    time_column: str = None
+    time_sorted: bool = False
+    n_rows: int = 0
+    memory_bytes: int = 0
+    column_ranges: dict = field(default_factory=dict)  # colonna -> (min, max)
+    pyramid: object = None  # TimePyramid sulla colonna temporale, riempita alla prima richiesta (`dataset_pyramid`)
+    spatial_index: object = None  # SpatialIndex sulle colonne di coordinate rilevate
+
+    @property
+    def nbytes(self):
+        """Occupazione in memoria (dati, piramide e indice spaziale), usata dalla cache per il budget."""
+        extras = (self.pyramid, self.spatial_index)
+        return self.memory_bytes + sum(extra.nbytes for extra in extras if extra is not None)
+
+    @property
+    def has_coordinates(self):
+        return self.lat_column is not None and self.lon_column is not None
+
+def detect_coordinate_columns(columns):
+    """Rileva le colonne di latitudine e longitudine dai nomi (maiuscole e spazi ignorati)."""
+    normalized = {str(col).strip().lower(): col for col in columns}
+    detected = {}
+    for role, names in COORDINATE_NAMES.items():
+        # Prima i nomi esatti, poi le colonne che contengono "lat" o "lon"
+        exact = [normalized[name] for name in names if name in normalized]
+        partial = [col for name, col in normalized.items() if role in name]
+        detected[role] = (exact or partial or [None])[0]
+    return detected["lat"], detected["lon"]
+
+@profiled
+def build_dataset(df, name, key=None):
+    """Costruisce il Dataset calcolando una sola volta ruoli delle colonne e metadati."""
+    numeric_columns = df.select_dtypes(include=['number']).columns.tolist()
+    datetime_columns = df.select_dtypes(include=['datetime', 'datetimetz']).columns.tolist()
+    categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    lat_column, lon_column = detect_coordinate_columns(df.columns)
+
+    time_column = datetime_columns[0] if datetime_columns else None
+    time_sorted = bool(df[time_column].is_monotonic_increasing) if time_column else False
+
+    # Minimo e massimo di tutte le colonne numeriche e di date in un'unica riduzione per tipo
+    column_ranges = {}
+    for columns in (numeric_columns, datetime_columns):
+        if columns:
+            minimums, maximums = df[columns].min(), df[columns].max()
+            column_ranges.update({col: (minimums[col], maximums[col]) for col in columns})
+
+    # Aggregati multi-risoluzione per grafici e aggregazioni: le colonne sono aggregate alla prima richiesta
+    pyramid = build_pyramid(df, time_column) if time_column and numeric_columns else None
+    # Indice per le interrogazioni per area (mappa e selezioni), costruito una volta sulle coordinate rilevate
+    spatial_index = build_spatial_index(df, lat_column, lon_column) if lat_column and lon_column else None
+
+    return Dataset(
+        name=name,
+        df=df,
+        key=key,
+        columns=df.columns.tolist(),
+        numeric_columns=numeric_columns,
+        datetime_columns=datetime_columns,
+        categorical_columns=categorical_columns,
+        lat_column=lat_column,
+        lon_column=lon_column,
+        time_column=time_column,
+        time_sorted=time_sorted,
+        n_rows=len(df),
+        memory_bytes=int(df.memory_usage(index=True, deep=True).sum()),
+        column_ranges=column_ranges,
+        pyramid=pyramid,
+        spatial_index=spatial_index,
+    )
+
+@profiled
+def dataset_pyramid(dataset, time_column, columns):
+    """Piramide del dataset con `columns` aggregate (una volta per colonna), o None se non è applicabile.
+
+    La piramide cresce sul posto: quando si aggiungono colonne l'occupazione del Dataset nella
+    cache "datasets" viene ricalcolata, così il budget tiene conto anche dei livelli.
+    """
+    pyramid = dataset.pyramid
+    if pyramid is None or pyramid.time_column != time_column or not set(columns) <= set(dataset.numeric_columns):
+        return None
+    n_columns = len(pyramid.columns)
+    ensure_columns(pyramid, dataset.df, columns)
+    if len(pyramid.columns) != n_columns and dataset.key is not None:
+        get_cache("datasets").resize(dataset.key)
+    return pyramid
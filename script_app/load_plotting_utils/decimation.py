@@ -0,0 +1,103 @@
+import os
+import numpy as np
+import pandas as pd
+
+# 🔹 Punti massimi per serie inviati al browser, configurabile da variabile d'ambiente
+CHART_POINT_BUDGET = int(os.environ.get("LAND_INSTABILITY_CHART_POINTS", "5000"))
+DECIMATION_METHODS = {"LTTB": "lttb", "Min-Max": "minmax"}
+
+def _as_float(values):
+    """Valori come float64 (date in nanosecondi), o None se non numerici."""
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        numbers = pd.DatetimeIndex(values).asi8.astype(np.float64)
+        numbers[values.isna().to_numpy()] = np.nan
+        return numbers
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return None
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: posizioni di `n_out` punti che conservano la forma della serie.
+
+    `x` deve essere ordinato e senza NaN. Il primo e l'ultimo punto sono sempre tenuti; in ogni
+    bucket si sceglie il punto che forma il triangolo più grande con il punto scelto prima e con
+    la media del bucket successivo, quindi picchi e minimi restano visibili.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 bucket tra primo e ultimo punto
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        area = np.abs((x[previous] - avg_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def minmax_indices(y, n_out):
+    """Posizioni del minimo e del massimo di ogni bucket (più primo e ultimo punto), al massimo ~`n_out`."""
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+
+    n_buckets = max(n_out // 2 - 1, 1)
+    size = -(-n // n_buckets)
+    offsets = np.arange(n_buckets) * size
+    low = np.full(n_buckets * size, np.inf)
+    high = np.full(n_buckets * size, -np.inf)
+    low[:n] = np.where(np.isnan(y), np.inf, y)
+    high[:n] = np.where(np.isnan(y), -np.inf, y)
+    minimums = offsets + low.reshape(n_buckets, size).argmin(axis=1)
+    maximums = offsets + high.reshape(n_buckets, size).argmax(axis=1)
+    selected = np.unique(np.concatenate([[0, n - 1], minimums, maximums]))
+    return selected[selected < n]
+
+def _series_indices(x, y, budget, method):
+    """Posizioni da tenere di una serie (x ordinato), ignorando i punti con valori mancanti."""
+    positions = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    if len(positions) <= budget:
+        return positions
+    if method == "minmax":
+        return positions[minmax_indices(y[positions], budget)]
+    return positions[lttb_indices(x[positions], y[positions], budget)]
+
+def decimate(df, x, y_columns, budget=CHART_POINT_BUDGET, method="lttb"):
+    """Righe di `df` da disegnare: circa `budget` punti per colonna y, in ordine di `x`.
+
+    Con righe entro il budget `df` è restituito invariato. Se `x` non è numerico o temporale si usa
+    la posizione delle righe; colonne y non numeriche sono campionate a passo costante.
+    """
+    if len(df) <= budget:
+        return df
+
+    x_values = _as_float(df[x])
+    if x_values is None:
+        x_values = np.arange(len(df), dtype=np.float64)
+    order = None
+    if not np.all(x_values[1:] >= x_values[:-1]):  # Non ordinato (o con NaN, che argsort mette in fondo)
+        order = np.argsort(x_values, kind="stable")
+        x_values = x_values[order]
+
+    selected = []
+    for column in dict.fromkeys(y_columns):
+        y_values = _as_float(df[column])
+        if y_values is None:
+            selected.append(np.linspace(0, len(df) - 1, budget).astype(np.int64))
+            continue
+        selected.append(_series_indices(x_values, y_values if order is None else y_values[order], budget, method))
+
+    rows = np.unique(np.concatenate(selected))
+    return df.iloc[rows if order is None else order[rows]]
+
+def decimate_xy(x, y, budget=CHART_POINT_BUDGET, method="lttb"):
+    """Versione di `decimate` per una singola traccia: restituisce (x, y) ridotti."""
+    frame = decimate(pd.DataFrame({"x": np.asarray(x), "y": np.asarray(y)}), "x", ["y"], budget, method)
+    return frame["x"], frame["y"]
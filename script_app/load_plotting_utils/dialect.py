@@ -0,0 +1,167 @@
+import re
+import csv
+from collections import Counter
+from dataclasses import dataclass
+
+# 🔹 Parametri del campionamento del file
+SNIFF_BYTES = 64 * 1024  # Bytes letti da ciascun blocco (inizio, metà, fine)
+SNIFF_MAX_LINES = 400  # Righe massime analizzate per blocco
+
+POSSIBLE_SEPARATORS = [';', ',', '\t', '|', ' ']  # I separatori più comuni
+
+# Forme numeriche riconosciute nei campi
+_POINT_DECIMAL = re.compile(r'^[+-]?\d+\.\d+$')
+_COMMA_DECIMAL = re.compile(r'^[+-]?\d+,\d+$')
+_POINT_THOUSANDS = re.compile(r'^[+-]?\d{1,3}(\.\d{3})+(,\d+)?$')
+_COMMA_THOUSANDS = re.compile(r'^[+-]?\d{1,3}(,\d{3})+(\.\d+)?$')
+_NUMBER = re.compile(r'^[+-]?[\d.,]+([eE][+-]?\d+)?$')
+_DOTTED_DATE = re.compile(r'^\d{1,2}\.\d{1,2}\.\d{2,4}(\s.*)?$')  # DD.MM.YYYY, con ora opzionale
+
+@dataclass(frozen=True)
+class Dialect:
+    """Opzioni di parsing rilevate per un file di testo, da passare direttamente a `pd.read_csv`."""
+    sep: str = ','
+    decimal: str = '.'
+    thousands: str = None
+    quotechar: str = '"'
+    header: int = 0  # None se il file non ha una riga di intestazione
+    thousands_columns: tuple = ()  # Colonne a cui togliere il punto delle migliaia dopo la lettura (vedi `sniff_dialect`)
+
+    def read_csv_kwargs(self):
+        """Argomenti per `pd.read_csv` corrispondenti al dialetto."""
+        return {
+            "sep": r'\s+' if self.sep == ' ' else self.sep,
+            "decimal": self.decimal,
+            "thousands": self.thousands,
+            "quotechar": self.quotechar,
+            "header": self.header,
+        }
+
+    def describe(self):
+        """Descrizione leggibile del dialetto, da mostrare all'utente."""
+        names = {',': "comma", ';': "semicolon", '\t': "tab", '|': "pipe", ' ': "space", '.': "point", None: "none"}
+        header = "row 1" if self.header == 0 else "none"
+        thousands = names.get(self.thousands, self.thousands)
+        if self.thousands_columns:
+            thousands = f"point (columns {', '.join(str(position + 1) for position in self.thousands_columns)})"
+        return (f"separator: {names.get(self.sep, self.sep)} · decimal: {names.get(self.decimal, self.decimal)} · "
+                f"thousands: {thousands} · header: {header}")
+
+def sample_lines(buffer, block_bytes=SNIFF_BYTES, max_lines=SNIFF_MAX_LINES):
+    """Campiona righe dall'inizio, dalla metà e dalla fine del file senza leggerlo per intero.
+
+    Restituisce (righe_di_testa, altre_righe); nei blocchi centrali e finali la prima e
+    l'ultima riga, probabilmente troncate, vengono scartate.
+    """
+    buffer.seek(0, 2)
+    size = buffer.tell()
+    head_lines, other_lines = [], []
+    offsets = [0]
+    if size > block_bytes:
+        offsets += [max(size // 2 - block_bytes // 2, block_bytes), max(size - block_bytes, block_bytes)]
+
+    for i, offset in enumerate(dict.fromkeys(offsets)):
+        buffer.seek(offset)
+        lines = buffer.read(block_bytes).decode("utf-8-sig" if offset == 0 else "utf-8", errors="ignore").splitlines()
+        if offset > 0:
+            lines = lines[1:]  # Riga iniziale troncata
+        if offset + block_bytes < size:
+            lines = lines[:-1]  # Riga finale troncata
+        lines = [line for line in lines if line.strip()][:max_lines]
+        (head_lines if i == 0 else other_lines).extend(lines)
+
+    buffer.seek(0)
+    return head_lines, other_lines
+
+def _split(line, sep, quotechar):
+    """Divide una riga nei campi rispettando le virgolette."""
+    if sep == ' ':
+        return line.split()
+    return next(csv.reader([line], delimiter=sep, quotechar=quotechar))
+
+def _detect_quotechar(lines):
+    """Sceglie il carattere di quoting più usato all'inizio dei campi."""
+    double = sum(line.count('"') for line in lines)
+    single = sum(len(re.findall(r"(?:^|[,;\t|])'", line)) for line in lines)
+    return "'" if single > double else '"'
+
+def _detect_separator(lines, quotechar):
+    """Sceglie il separatore che produce lo stesso numero di campi sul maggior numero di righe."""
+    best_sep, best_score = ',', (0, 0)
+    for sep in POSSIBLE_SEPARATORS:
+        counts = [len(_split(line, sep, quotechar)) for line in lines]
+        if not counts:
+            continue
+        modal_count, frequency = Counter(counts).most_common(1)[0]
+        if modal_count < 2:
+            continue
+        # Prima la coerenza tra le righe, poi il numero di colonne
+        score = (frequency / len(counts), modal_count)
+        if score > best_score:
+            best_sep, best_score = sep, score
+    return best_sep
+
+def _detect_number_format(fields, sep):
+    """Rileva separatore decimale e delle migliaia dai campi numerici campionati."""
+    shapes = Counter()
+    for field in fields:
+        field = field.strip()
+        if not field or not _NUMBER.match(field):
+            continue
+        if _COMMA_DECIMAL.match(field):
+            shapes["comma_decimal"] += 1
+        elif _POINT_THOUSANDS.match(field) and ',' in field:
+            shapes["point_thousands"] += 1
+        elif _COMMA_THOUSANDS.match(field):
+            shapes["comma_thousands"] += 1
+        elif _POINT_DECIMAL.match(field):
+            shapes["point_decimal"] += 1
+
+    # La virgola non può essere decimale se è il separatore di colonna; il punto delle migliaia
+    # solo se compare nei numeri: altrimenti date come 01.02.2020 diventerebbero interi
+    comma_votes = shapes["comma_decimal"] + shapes["point_thousands"]
+    if sep != ',' and comma_votes > shapes["point_decimal"]:
+        return ',', '.' if shapes["point_thousands"] else None
+    thousands = ',' if sep != ',' and shapes["comma_thousands"] > shapes["comma_decimal"] else None
+    return '.', thousands
+
+def _point_thousands_columns(rows):
+    """Posizioni delle colonne con numeri come 1.234,5 nelle righe campionate."""
+    return tuple(sorted({position for row in rows for position, field in enumerate(row)
+                         if ',' in field and _POINT_THOUSANDS.match(field.strip())}))
+
+def _is_numeric_field(field):
+    return bool(_NUMBER.match(field.strip()))
+
+def _detect_header(first_row, data_rows):
+    """C'è intestazione se la prima riga ha campi testuali dove le righe di dati sono numeriche."""
+    if not data_rows:
+        return 0
+    for position, field in enumerate(first_row):
+        column = [row[position] for row in data_rows if position < len(row)]
+        numeric_share = sum(_is_numeric_field(value) for value in column) / max(len(column), 1)
+        if numeric_share > 0.5:
+            return None if _is_numeric_field(field) else 0
+    return 0  # Nessuna colonna numerica: si assume l'intestazione
+
+def sniff_dialect(buffer):
+    """Rileva il dialetto (separatore, decimali, migliaia, quoting e intestazione) da un campione del file."""
+    head_lines, other_lines = sample_lines(buffer)
+    lines = head_lines + other_lines
+    if not lines:
+        return Dialect()
+
+    quotechar = _detect_quotechar(lines)
+    sep = _detect_separator(lines, quotechar)
+    rows = [_split(line, sep, quotechar) for line in lines]
+    header = _detect_header(rows[0], rows[1:])
+    data_rows = rows[1:] if header == 0 else rows
+    fields = [field for row in data_rows for field in row]
+    decimal, thousands = _detect_number_format(fields, sep)
+    thousands_columns = ()
+    if thousands == '.' and any(_DOTTED_DATE.match(field.strip()) for field in fields):
+        # Il punto delle migliaia su tutto il file trasformerebbe le date 01.02.2020 in interi:
+        # si toglie dopo la lettura, solo nelle colonne con numeri come 1.234,5
+        thousands, thousands_columns = None, _point_thousands_columns(data_rows)
+    return Dialect(sep=sep, decimal=decimal, thousands=thousands, quotechar=quotechar, header=header,
+                   thousands_columns=thousands_columns)
@@ -0,0 +1,123 @@
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+import streamlit as st
+from script_app.load_plotting_utils.cache import get_cache, disk_cache_path, read_disk_cache, write_disk_cache
+from script_app.load_plotting_utils.load import parse_file, process_file, load_dataset, dataset_key, file_dialect
+from script_app.load_plotting_utils.profiling import profiled
+
+# 🔹 Processi per la lettura in parallelo dei file caricati, configurabile da variabile d'ambiente
+INGEST_WORKERS = int(os.environ.get("LAND_INSTABILITY_INGEST_WORKERS", str(os.cpu_count() or 1)))
+
+class _Upload(io.BytesIO):
+    """Bytes di un file caricato con il suo nome, come l'UploadedFile di Streamlit."""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+def _to_arrow(df):
+    """DataFrame in un buffer Arrow IPC (stream), o None se una colonna non è convertibile."""
+    import pyarrow as pa
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, TypeError, ValueError):
+        return None
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+def _from_arrow(buffer):
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(buffer).read_all().to_pandas(split_blocks=True)
+
+def ingest_file(name, data, dialect, key, read_options):
+    """Lettura ed elaborazione di un file in un processo separato (decodifica, parsing, date e tipi).
+
+    Il risultato è salvato nella cache Arrow su disco, da cui il processo principale lo riapre in
+    memory-map senza copie; se la cache su disco non è scrivibile il DataFrame torna come buffer
+    Arrow IPC (o serializzato con pickle se Arrow non lo supporta). Gli errori sono sollevati.
+    Restituisce (payload, dtype_report) con payload None quando il DataFrame è su disco.
+    """
+    df = process_file(parse_file(_Upload(name, data), dialect, **read_options))
+    report = df.attrs.get("dtype_report", [])
+    write_disk_cache(key, df)
+    if os.path.exists(disk_cache_path(key)):
+        return None, report
+    buffer = _to_arrow(df)
+    return (df if buffer is None else buffer), report
+
+def _receive(key, payload, report):
+    """DataFrame restituito da `ingest_file`."""
+    if payload is None:
+        df = read_disk_cache(key)
+    elif isinstance(payload, pd.DataFrame):
+        df = payload
+    else:
+        df = _from_arrow(payload)
+    if df is not None:
+        df.attrs["dtype_report"] = report
+    return df
+
+@st.cache_resource
+def ingest_pool(workers):
+    """Pool di processi condiviso tra rerun e sessioni (avviati con spawn: il server ha più thread)."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _describe_error(error):
+    if isinstance(error, (pd.errors.ParserError, pd.errors.EmptyDataError)):
+        return f"Errore di parsing: {error}"
+    return str(error) or type(error).__name__
+
+@profiled
+def load_datasets(uploaded_files, workers=INGEST_WORKERS, **read_options):
+    """Carica più file analizzando in parallelo quelli che non sono già in cache.
+
+    I file già in memoria o nella cache su disco sono riaperti direttamente; gli altri sono letti
+    da un pool di `workers` processi, con una barra di avanzamento. Un file che non si legge
+    mostra il suo errore senza interrompere gli altri. I Dataset sono restituiti nell'ordine dei
+    file, saltando quelli non leggibili.
+    """
+    keys = [dataset_key(uploaded_file, **read_options) for uploaded_file in uploaded_files]
+    cache = get_cache("datasets")
+    pending = [i for i, key in enumerate(keys) if key not in cache and not os.path.exists(disk_cache_path(key))]
+
+    parsed, errors = {}, {}
+    if len(pending) > 1 and workers > 1:
+        progress = st.sidebar.progress(0.0, text=f"Loading {len(pending)} files…")
+        try:
+            pool = ingest_pool(workers)
+            futures = {
+                pool.submit(ingest_file, uploaded_files[i].name, uploaded_files[i].getvalue(),
+                            file_dialect(uploaded_files[i]), keys[i], read_options): i
+                for i in pending
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                try:
+                    parsed[i] = _receive(keys[i], *future.result())
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:  # Errore limitato al singolo file
+                    errors[i] = _describe_error(e)
+                progress.progress(done / len(pending), text=f"Loaded {done} of {len(pending)} files")
+        except BrokenProcessPool:
+            ingest_pool.clear()  # Un processo è terminato: i file rimasti si leggono qui
+            st.sidebar.warning("⚠️ Parallel loading failed; remaining files are loaded sequentially.")
+        progress.empty()
+
+    datasets = []
+    for i, uploaded_file in enumerate(uploaded_files):
+        if i in errors:
+            st.error(f"❌ {uploaded_file.name}: {errors[i]}")
+            continue
+        dataset = load_dataset(uploaded_file, parsed=parsed.get(i), **read_options)
+        if dataset is not None:
+            datasets.append(dataset)
+    return datasets
@@ -1,7 +1,13 @@
 import re
 import io
+from dataclasses import replace
+import numpy as np
 import pandas as pd
 import streamlit as st
+from script_app.load_plotting_utils.cache import get_cache, content_hash, make_cache_key, read_disk_cache, write_disk_cache
+from script_app.load_plotting_utils.dialect import sniff_dialect
+from script_app.load_plotting_utils.dataset import build_dataset
+from script_app.load_plotting_utils.profiling import profiled
 
 # 🔹 Rimuove il separatore delle migliaia senza toccare i separatori di colonna
 def remove_thousands_separator(text):
@@ -38,110 +44,308 @@ def normalize_separator(text, detected_separator):
 
     return text  # Manteniamo i ritorni a capo
 
-def load_file(uploaded_file):
-    """Carica il file CSV o TXT rilevando automaticamente il separatore."""
-    if uploaded_file.name.endswith(('.csv', '.txt')):
+def strip_thousands(df, dialect):
+    """Converte in numeri le colonne del dialetto con il punto delle migliaia, lette come testo."""
+    for position in dialect.thousands_columns:
+        if position >= df.shape[1] or df.iloc[:, position].dtype != object:
+            continue
+        text = df.iloc[:, position].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
         try:
+            df[df.columns[position]] = pd.to_numeric(text)
+        except (ValueError, TypeError):
+            pass  # Non tutti i valori sono numeri: la colonna resta testo
+    return df
+
+def read_csv_streaming(buffer, dialect, **read_options):
+    """Legge un CSV/TXT in un solo passaggio direttamente dal flusso di bytes con il parser C.
+
+    Separatore, decimali e migliaia arrivano dal dialetto rilevato e sono gestiti dal parser,
+    quindi il testo non viene mai decodificato né riscritto per intero. Il parser C legge già a
+    blocchi al suo interno e unisce i blocchi colonna per colonna: non c'è una lista di DataFrame
+    parziali da concatenare, e la memoria di picco resta vicina a quella del DataFrame finale.
+    """
+    buffer.seek(0)
+    df = pd.read_csv(
+        buffer,
+        **dialect.read_csv_kwargs(),
+        skipinitialspace=True,
+        encoding="utf-8-sig",
+        engine="c",
+        **read_options,
+    )
+    df = strip_thousands(df, dialect)
+    if dialect.header is None:
+        df.columns = [f"column_{i + 1}" for i in range(df.shape[1])]  # Nomi leggibili senza intestazione
+    return df
+
+@profiled
+def parse_file(uploaded_file, dialect=None, streaming=True, **read_options):
+    """Legge il file CSV, TXT o XLSX in un DataFrame senza usare l'interfaccia.
+
+    Con `streaming=True` il file viene letto in un solo passaggio dal parser C usando il `dialect` passato
+    (o rilevato su un campione del file se assente); con `streaming=False`
+    si usa la lettura originale (decodifica completa, normalizzazione e parser Python).
+    Le eventuali `read_options` vengono passate direttamente a pandas. Gli errori sono sollevati
+    come ValueError (formato non supportato, dataset vuoto) o errori di parsing di pandas, così
+    la funzione può girare anche in un processo separato.
+    """
+    if uploaded_file.name.endswith(('.csv', '.txt')):
+        if streaming:
+            dialect = dialect or sniff_dialect(uploaded_file)  # Rileva separatore, decimali, intestazione
+            df = read_csv_streaming(uploaded_file, dialect, **read_options)
+        else:
             raw_text = uploaded_file.getvalue().decode("utf-8")  # Legge il contenuto del file
             detected_separator = detect_separator(raw_text)  # Rileva il separatore
             normalized_text = normalize_separator(raw_text, detected_separator)  # Normalizza il testo
-            df = pd.read_csv(io.StringIO(normalized_text), sep=detected_separator, engine="python")  # Legge con pandas
+            df = pd.read_csv(io.StringIO(normalized_text), sep=detected_separator, engine="python", **read_options)  # Legge con pandas
 
-            if df.empty:
-                st.error("❌ Il dataset è vuoto. Controlla il file e il separatore.")
-                return None
+        if df.empty:
+            raise ValueError("Il dataset è vuoto. Controlla il file e il separatore.")
+        return df
 
-            return df
+    elif uploaded_file.name.endswith('.xlsx'):
+        return pd.read_excel(uploaded_file, **read_options)
+    raise ValueError("Formato file non supportato")
 
-        except pd.errors.ParserError as e:
-            st.error(f"❌ Errore di parsing: {e}")
-            return None
+def load_file(uploaded_file, dialect=None, streaming=True, **read_options):
+    """Carica il file CSV o TXT rilevando automaticamente il separatore (vedi `parse_file`).
 
-    elif uploaded_file.name.endswith('.xlsx'):
-        return pd.read_excel(uploaded_file)
-    else:
-        st.error("Formato file non supportato")
+    Gli errori sono mostrati nell'interfaccia e il risultato è None.
+    """
+    try:
+        return parse_file(uploaded_file, dialect, streaming, **read_options)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:  # Sottoclassi di ValueError: vanno prima
+        st.error(f"❌ Errore di parsing: {e}")
+    except ValueError as e:
+        st.error(f"❌ {e}")
+    return None
+
+# 🔹 Formati di data riconosciuti (vedi sezione Info), provati in quest'ordine sulle colonne di testo
+DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',  # ISO
+    '%Y%m%d',  # YYYYMMDD
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',  # Giorno prima, con barre
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M', '%d-%m-%Y',  # Giorno prima, con trattini
+    '%d.%m.%Y %H:%M:%S', '%d.%m.%Y',  # Giorno prima, con punti
+    '%Y/%m/%d %H:%M:%S', '%Y/%m/%d',
+    'ISO8601',  # Altre varianti ISO (frazioni di secondo, fuso orario)
+]
+# Intervalli plausibili per le colonne numeriche
+UNIX_SECONDS_RANGE = (1e9, 2e9)
+UNIX_MILLISECONDS_RANGE = (1e12, 2e12)
+YYYYMMDD_RANGE = (19000101, 21001231)
+DATE_SAMPLE_ROWS = 1_000  # Valori campionati per scegliere il formato
+DATE_MIN_MATCH = 0.95  # Quota minima del campione che deve rispettare il formato
+
+def _detect_numeric_date_format(series):
+    """Riconosce Unix in secondi/millisecondi o interi YYYYMMDD; restituisce il formato o None."""
+    if pd.api.types.is_bool_dtype(series):
+        return None
+    sample = _sample(series.dropna(), DATE_SAMPLE_ROWS)
+    if sample.empty:
+        return None
+    for unit, (low, high) in (("s", UNIX_SECONDS_RANGE), ("ms", UNIX_MILLISECONDS_RANGE)):
+        if sample.between(low, high).all() and series.min() >= low and series.max() <= high:
+            return f"unix_{unit}"
+    if pd.api.types.is_integer_dtype(series) and sample.between(*YYYYMMDD_RANGE).all():
+        if pd.to_datetime(sample.astype(str), format='%Y%m%d', errors='coerce').notna().all():
+            return '%Y%m%d'
+    return None
+
+def _detect_text_date_format(series):
+    """Sceglie il primo formato di DATE_FORMATS che interpreta il campione della colonna di testo."""
+    sample = _sample(series.dropna(), DATE_SAMPLE_ROWS)
+    if sample.empty or not isinstance(sample.iloc[0], str):
         return None
+    sample = sample.astype(str).str.strip()
+    if not sample.str.match(r'^\d').all():
+        return None  # Le date riconosciute iniziano sempre con una cifra
+    for date_format in DATE_FORMATS:
+        parsed = pd.to_datetime(sample, format=date_format, errors='coerce')
+        if parsed.notna().mean() >= DATE_MIN_MATCH:
+            return date_format
+    return None
+
+def detect_datetime_format(series):
+    """Formato di data della colonna ('unix_s', 'unix_ms' o formato strftime), o None se non è una data."""
+    if pd.api.types.is_numeric_dtype(series):
+        return _detect_numeric_date_format(series)
+    if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        return _detect_text_date_format(series)
+    return None
+
+def parse_datetime_column(series, date_format):
+    """Converte la colonna in datetime con il formato esplicito rilevato."""
+    if date_format == "unix_s":
+        return pd.to_datetime(series, unit='s')
+    if date_format == "unix_ms":
+        return pd.to_datetime(series, unit='ms')
+    if pd.api.types.is_numeric_dtype(series):
+        series = series.astype("Int64").astype(str)  # Interi YYYYMMDD
+    return pd.to_datetime(series, format=date_format, errors='coerce')
 
 # 🔹 Funzione per inferire e analizzare le date nel DataFrame
+@profiled
 def infer_and_parse_dates(df):
-    """Inferisce e analizza le date nel DataFrame."""
-    date_formats = ['%d/%m/%Y %H:%M:%S']
+    """Rileva una sola volta, su un campione, le colonne di date e le converte con un formato esplicito.
+
+    I formati rilevati sono salvati in `df.attrs["datetime_formats"]`, così le viste non devono
+    più riesaminare le colonne.
+    """
+    formats = dict(df.attrs.get("datetime_formats", {}))
     for col in df.columns:
-        if df[col].dtype == 'object':
-            for date_format in date_formats:
-                try:
-                    temp_col = pd.to_datetime(df[col], format=date_format, errors='coerce')
-                    if temp_col.notna().sum() > 0:
-                        df[col] = temp_col
-                        break
-                except Exception:
-                    continue
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        date_format = detect_datetime_format(df[col])
+        if date_format is not None:
+            df[col] = parse_datetime_column(df[col], date_format)
+            formats[col] = date_format
+    df.attrs["datetime_formats"] = formats
     return df
 
+# 🔹 Parametri dell'inferenza dei tipi
+TYPE_SAMPLE_ROWS = 10_000  # Righe campionate per decidere il tipo di una colonna
+CATEGORY_MAX_RATIO = 0.5  # Rapporto massimo valori distinti / righe per usare 'category'
+FLOAT32_MAX_DIGITS = 6  # Cifre significative garantite da float32
+FLOAT32_MAX_DECIMALS = 6  # Decimali massimi considerati per il downcast a float32
+
+def _sample(series, n=TYPE_SAMPLE_ROWS):
+    """Campione a passo costante della colonna (tutta la colonna se è corta)."""
+    step = max(len(series) // n, 1)
+    return series.iloc[::step]
+
+def _float32_decimals(values):
+    """Numero di decimali con cui i valori si rappresentano esattamente in float32, o None."""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return None
+    magnitude = np.abs(values).max()
+    integer_digits = int(np.floor(np.log10(magnitude))) + 1 if magnitude >= 1 else 1
+    for decimals in range(FLOAT32_MAX_DECIMALS + 1):
+        if integer_digits + decimals > FLOAT32_MAX_DIGITS:
+            return None
+        if np.array_equal(np.round(values, decimals), values):
+            return decimals
+    return None
+
+def _optimize_numeric(series):
+    """Restituisce la colonna numerica nel tipo più stretto che conserva i valori."""
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+
+    values = series.to_numpy(dtype=np.float64)
+    sample = _sample(series).to_numpy(dtype=np.float64)
+    # Solo numeri interi e nessun valore mancante -> intero (deciso sul campione, confermato su tutta la colonna)
+    if not np.isnan(sample).any() and np.array_equal(sample, np.round(sample)):
+        if not np.isnan(values).any() and np.array_equal(values, np.round(values)):
+            return pd.to_numeric(series.astype(np.int64), downcast="integer")
+
+    # Decimali -> float32 solo se i valori non perdono cifre significative
+    decimals = _float32_decimals(sample)
+    if decimals is not None:
+        narrow = values.astype(np.float32)
+        if np.array_equal(np.round(narrow.astype(np.float64), decimals), values, equal_nan=True):
+            return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+def _optimize_text(series):
+    """Converte in 'category' le colonne di testo con pochi valori distinti (ID sensori, siti, ...)."""
+    sample = _sample(series)
+    if sample.nunique(dropna=True) > CATEGORY_MAX_RATIO * len(sample):
+        return series
+    if series.nunique(dropna=True) > CATEGORY_MAX_RATIO * len(series):
+        return series
+    return series.astype("category")
+
 # 🔹 Funzione per mantenere i tipi originali delle colonne
+@profiled
 def preserve_column_types(df):
     """
-    Mantiene il tipo di dati originale di ogni colonna:
-    - Se la colonna ha solo interi -> mantiene int
-    - Se ha numeri decimali -> mantiene float
-    - Se contiene testo -> mantiene stringhe
+    Assegna a ogni colonna il tipo più compatto che ne conserva i valori:
+    - Se la colonna ha solo interi -> intero della larghezza minima (int8...int64)
+    - Se ha numeri decimali -> float32 se bastano 6 cifre significative, altrimenti float64
+    - Se contiene testo con pochi valori distinti -> category, altrimenti resta testo
+
+    Il tipo viene deciso su un campione e verificato sull'intera colonna con riduzioni NumPy.
+    Il risparmio di memoria delle colonne convertite è salvato in `df.attrs["dtype_report"]`.
     """
+    report = []
     for col in df.columns:
-        # Controlla se la colonna contiene solo numeri interi
-        if pd.api.types.is_numeric_dtype(df[col]) and all(df[col] % 1 == 0):  
-            df[col] = df[col].astype(int)  # Converte in interi
-        
-        # Se la colonna contiene numeri decimali, lascia float
-        elif pd.api.types.is_float_dtype(df[col]):  
-            df[col] = df[col].astype(float)  
-
-        # Se la colonna contiene testo, lascia stringhe
-        elif pd.api.types.is_object_dtype(df[col]):  
-            df[col] = df[col].astype(str)  
+        if pd.api.types.is_numeric_dtype(df[col]):
+            optimized = _optimize_numeric(df[col])
+        elif pd.api.types.is_object_dtype(df[col]):
+            optimized = _optimize_text(df[col])
+        else:
+            continue  # Date e altri tipi restano invariati
 
+        if optimized is df[col] or optimized.dtype == df[col].dtype:
+            continue  # Nessun cambio di tipo: niente da riportare
+        before = df[col].memory_usage(index=False, deep=True)
+        df[col] = optimized
+        after = df[col].memory_usage(index=False, deep=True)
+        report.append({"Column": col, "Type": str(df[col].dtype), "Before (bytes)": int(before),
+                       "After (bytes)": int(after), "Saved (bytes)": int(before - after)})
+
+    df.attrs["dtype_report"] = report
     return df
 
 # 🔹 Funzione per elaborare i dati del DataFrame
+@profiled
 def process_file(df):
     """Elabora i dati del DataFrame."""
     df = infer_and_parse_dates(df)  # Analizza e converte le date
     df = preserve_column_types(df)  # Mantiene i tipi originali delle colonne
     return df
 
-# 🔹 Funzione per caricare e visualizzare il file
-def load_and_display_file(uploaded_file):
-    """Carica e visualizza il file."""
-    try:
-        file_name = uploaded_file.name  # Ottieni il nome del file
-
-        # Se il file non è già stato caricato nella sessione, caricalo e memorizzalo
-        if file_name not in st.session_state:
-            df = load_file(uploaded_file)  # Carica il file
-            if df is not None:
-                df = process_file(df)  # Elabora i dati
-                st.session_state[file_name] = df  # Memorizza il dataframe in session_state
-
-        # Recupera il dataframe dalla sessione e visualizzalo
-        df = st.session_state.get(file_name)
-        if df is not None:
-            st.subheader(f"File: {file_name}")  # Mostra il nome del file
-            st.dataframe(df)  # Mostra il dataframe
-            return df
+# 🔹 Funzione per caricare ed elaborare il file riusando la cache
+def dataset_key(uploaded_file, **read_options):
+    """Chiave di cache del file: hash dei bytes più estensione e opzioni di parsing."""
+    digest = _file_digest(uploaded_file)
+    extension = uploaded_file.name.rsplit(".", 1)[-1].lower()
+    return make_cache_key(digest, dict(read_options, extension=extension))
 
-        return None
-    except pd.errors.ParserError as e:
-        st.error(f"Error file CSV: {e}")
-    except Exception as e:
-        st.error(f"Error: {e}")
+@profiled
+def load_dataset(uploaded_file, parsed=None, **read_options):
+    """Carica ed elabora il file e restituisce il Dataset con i metadati, riusando la cache.
 
-# 🔹 Interfaccia utente
-uploaded_file = st.file_uploader("Upload your file (CSV, TXT, Excel)", type=["csv", "txt", "xlsx"])
+    La chiave di cache è l'hash dei bytes del file più le opzioni di parsing, quindi lo stesso file
+    caricato con un altro nome (o da un'altra sessione) viene riconosciuto. Se il Dataset non è
+    in memoria il DataFrame viene cercato nella cache Arrow su disco prima di rileggere il file.
+    `parsed` è un DataFrame già letto ed elaborato altrove (vedi `ingest.load_datasets`).
+    """
+    key = dataset_key(uploaded_file, **read_options)
 
-if uploaded_file is not None:
-    load_and_display_file(uploaded_file)
-else:
-    st.info("No file.")
+    def _load_and_process():
+        df = parsed if parsed is not None else read_disk_cache(key)  # Stesso file già elaborato in un'altra sessione
+        if df is None:
+            df = load_file(uploaded_file, dialect=file_dialect(uploaded_file), **read_options)
+            if df is None:
+                return None
+            df = process_file(df)
+            write_disk_cache(key, df)
+        return build_dataset(df, uploaded_file.name, key)
 
+    dataset = get_cache("datasets").get_or_compute(key, _load_and_process)
+    if dataset is None:
+        return None
+    # Copia superficiale: le modifiche alle colonne fatte dalle viste non alterano il DataFrame in cache
+    return replace(dataset, name=uploaded_file.name, df=dataset.df.copy(deep=False))
 
+def file_dialect(uploaded_file):
+    """Dialetto rilevato per il file (None per i file Excel), memorizzato per hash del contenuto."""
+    if not uploaded_file.name.endswith(('.csv', '.txt')):
+        return None
+    return get_cache("dialects").get_or_compute(_file_digest(uploaded_file), lambda: sniff_dialect(uploaded_file))
 
+def _file_digest(uploaded_file):
+    """Hash del contenuto del file, memorizzato per file_id così da non ricalcolarlo a ogni rerun."""
+    file_id = getattr(uploaded_file, "file_id", None)
+    digests = st.session_state.setdefault("_file_digests", {})
+    if file_id is not None and file_id in digests:
+        return digests[file_id]
+    digest = content_hash(uploaded_file.getvalue())
+    if file_id is not None:
+        digests[file_id] = digest
+    return digest
@@ -1,68 +1,204 @@
+import os
+import numpy as np
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
+from script_app.load_plotting_utils.cache import get_cache
+from script_app.load_plotting_utils.decimation import decimate, decimate_xy, CHART_POINT_BUDGET, DECIMATION_METHODS
+from script_app.load_plotting_utils.profiling import profiled
+
+# 🔹 Scatter e linee passano a WebGL (Scattergl) oltre questa soglia di righe per serie, contate prima
+# della decimazione (dopo, le serie lunghe sono ridotte al budget di punti e non la supererebbero)
+WEBGL_THRESHOLD = int(os.environ.get("LAND_INSTABILITY_WEBGL_POINTS", "5000"))
+RENDER_MODES = {"Auto": "auto", "SVG": "svg", "WebGL": "webgl"}
+
+def resolve_render_mode(n_points, render_mode="auto"):
+    """Modalità di rendering effettiva: in "auto" WebGL oltre WEBGL_THRESHOLD righe della serie originale, SVG altrimenti."""
+    if render_mode == "auto":
+        return "webgl" if n_points > WEBGL_THRESHOLD else "svg"
+    return render_mode
+
+def scatter_trace(n_points, render_mode="auto", **trace_kwargs):
+    """Traccia `go.Scatter` (SVG) o `go.Scattergl` (WebGL) in base al numero di punti o alla scelta esplicita."""
+    trace = go.Scattergl if resolve_render_mode(n_points, render_mode) == "webgl" else go.Scatter
+    return trace(**trace_kwargs)
+
+def render_mode_selector(key):
+    """Selettore per forzare SVG o WebGL su un singolo grafico (predefinito: automatico)."""
+    label = st.selectbox("Renderer", list(RENDER_MODES), key=key,
+                         help="Auto switches scatter and line charts to WebGL above the point threshold.")
+    return RENDER_MODES[label]
 
 # Funzioni di creazione dei grafici
+@profiled
 def create_basic_bar_chart(df, x, y):
     return px.bar(df, x=x, y=y, title="Basic Bar Chart")
 
-def create_basic_line_chart(df, x, y):
-    return px.line(df, x=x, y=y, title="Basic Line Chart")
+@profiled
+def create_basic_line_chart(df, x, y, render_mode="auto"):
+    return px.line(df, x=x, y=y, title="Basic Line Chart", render_mode=resolve_render_mode(len(df), render_mode))
 
-def create_basic_scatter_chart(df, x, y):
-    return px.scatter(df, x=x, y=y, title="Basic Scatter Chart")
+@profiled
+def create_basic_scatter_chart(df, x, y, render_mode="auto"):
+    return px.scatter(df, x=x, y=y, title="Basic Scatter Chart", render_mode=resolve_render_mode(len(df), render_mode))
 
-def create_effect_scatter_chart(df, x, y):
-    return px.scatter(df, x=x, y=y, title="Effect Scatter", size=df[y], color=df[x])
+@profiled
+def create_effect_scatter_chart(df, x, y, render_mode="auto"):
+    return px.scatter(df, x=x, y=y, title="Effect Scatter", size=df[y], color=df[x],
+                      render_mode=resolve_render_mode(len(df), render_mode))
 
+@profiled
 def create_calendar_heatmap(df, date_col, value_col):
     return px.density_heatmap(df, x=date_col, y=value_col, title="Calendar Heatmap")
 
+@profiled
 def create_datazoom_chart(df, x, y):
     fig = px.bar(df, x=x, y=y, title="Data Zoom Chart")
     fig.update_layout(xaxis_rangeslider_visible=True)
     return fig
 
-def create_mixed_line_and_bar_chart(df, x, y_line, y_bar):
+@profiled
+def create_mixed_line_and_bar_chart(df, x, y_line, y_bar, render_mode="auto"):
     fig = go.Figure()
     fig.add_trace(go.Bar(x=df[x], y=df[y_bar], name='Bar Data'))
-    fig.add_trace(go.Scatter(x=df[x], y=df[y_line], name='Line Data', mode='lines'))
+    fig.add_trace(scatter_trace(len(df), render_mode, x=df[x], y=df[y_line], name='Line Data', mode='lines'))
     fig.update_layout(title="Mixed Line and Bar Chart")
     return fig
 
-# Funzione per creare e visualizzare i grafici con gestione errori
-def create_and_render_plot(df, x_axis, y_axis, plot_type):
-    chart = None  # Inizializza per evitare errori
+# 🔹 Decimazione dei punti prima della costruzione dei grafici
+def chart_settings():
+    """Budget di punti per serie e metodo di decimazione scelti nella sidebar (o i valori predefiniti)."""
+    budget = int(st.session_state.get("chart_point_budget", CHART_POINT_BUDGET))
+    label = st.session_state.get("chart_decimation", next(iter(DECIMATION_METHODS)))
+    return budget, label
+
+def reduction_messages(n_in, n_out, label):
+    """Indicatore dei punti disegnati rispetto a quelli dei dati, come messaggi di `cached_figure`."""
+    if n_out < n_in:
+        return [("caption", f"📉 Rendering {n_out:,} of {n_in:,} points ({n_in / max(n_out, 1):.0f}× reduction, {label})")]
+    return []
+
+@profiled
+def decimate_for_chart(df, x_axis, y_columns):
+    """Riduce `df` ai punti da disegnare (picchi e minimi conservati); restituisce anche l'indicatore di riduzione."""
+    budget, label = chart_settings()
+    reduced = decimate(df, x_axis, y_columns, budget, DECIMATION_METHODS[label])
+    return reduced, reduction_messages(len(df), len(reduced), label)
+
+@profiled
+def decimate_trace(x, y, counter=None):
+    """Riduce i punti di una traccia; `counter` ([punti originali, punti disegnati]) accumula i totali della figura."""
+    budget, label = chart_settings()
+    x_out, y_out = decimate_xy(x, y, budget, DECIMATION_METHODS[label])
+    if counter is not None:
+        counter[0] += len(x)
+        counter[1] += len(x_out)
+    return x_out, y_out
+
+# 🔹 Figure in cache e in formato compatto
+def datetime_to_ms(values):
+    """Array di date (datetime64) in millisecondi dal 1970 come float, NaT -> NaN: il formato numerico delle date di plotly."""
+    millis = values.astype("datetime64[ms]").view("int64").astype(np.float64)
+    millis[np.isnat(values)] = np.nan
+    return millis
+
+def compact_dates(fig):
+    """Date delle tracce in millisecondi dal 1970 su assi di tipo data (modifica `fig`).
+
+    Plotly (>= 6) serializza gli array numerici in binario (base64 tipizzato) invece che come
+    liste JSON, ma le date resterebbero stringhe ISO di ~30 caratteri per punto.
+    """
+    for trace in fig.data:
+        for axis in ("x", "y"):
+            if axis not in trace:  # Tracce senza assi cartesiani (es. mappe)
+                continue
+            values = trace[axis]
+            if not (isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64)):
+                continue
+            trace[axis] = datetime_to_ms(values)
+            ref = trace[f"{axis}axis"] or axis  # "x", "x2"... -> layout.xaxis, layout.xaxis2...
+            fig.layout[f"{axis}axis{ref[1:]}"].type = "date"
+    return fig
+
+@profiled
+def cached_figure(key, build):
+    """Figura costruita da `build()` una volta per `key` (dataset, colonne, tipo di grafico, opzioni).
 
+    `build` restituisce (figura, messaggi), con messaggi come `("caption", testo)`: sono mostrati
+    a ogni rerun, anche quando la figura arriva dalla cache. Con `key` None la figura non è
+    memorizzata. La figura in cache è condivisa tra sessioni e non va modificata.
+    """
+    def compute():
+        fig, messages = build()
+        return (None if fig is None else compact_dates(fig)), messages
+
+    if key is None:
+        fig, messages = compute()
+    else:
+        fig, messages = get_cache("figures").get_or_compute(key, compute)
+    for kind, text in messages:
+        getattr(st, kind)(text)
+    return fig
+
+@profiled
+def plotly_chart(fig, **kwargs):
+    """`st.plotly_chart` misurato a parte: serializzazione della figura e invio al browser."""
+    return st.plotly_chart(fig, **kwargs)
+
+# Funzione per creare e visualizzare i grafici con gestione errori
+@profiled
+def create_and_render_plot(df, x_axis, y_axis, plot_type, render_mode="auto", cache_key=None):
+    """Grafico di `df`; con `cache_key` (dataset e selezione delle righe) la figura è riusata tra i rerun."""
     if df.empty:
         st.error("❌ Errore: Il dataset è vuoto. Impossibile generare il grafico.")
         return
 
-    if plot_type == "Basic Bar":
-        chart = create_basic_bar_chart(df, x_axis, y_axis)
-    elif plot_type == "Basic Line":
-        chart = create_basic_line_chart(df, x_axis, y_axis)
-    elif plot_type == "Basic Scatter":
-        chart = create_basic_scatter_chart(df, x_axis, y_axis)
-    elif plot_type == "Effect Scatter":
-        chart = create_effect_scatter_chart(df, x_axis, y_axis)
-    elif plot_type == "Calendar Heatmap":
-        chart = create_calendar_heatmap(df, x_axis, y_axis)
-    elif plot_type == "DataZoom":
-        chart = create_datazoom_chart(df, x_axis, y_axis)
-    elif plot_type == "Mixed Line and Bar":
+    # Modalità decisa sulle righe originali, prima che la decimazione le riduca
+    render_mode = resolve_render_mode(len(df), render_mode)
+
+    # Colonne y disegnate (il grafico misto chiede le sue prima di ridurre i punti)
+    y_columns = [y_axis]
+    y_axis_line = y_axis_bar = None
+    if plot_type == "Mixed Line and Bar":
         y_axis_line = st.selectbox("Select Line Y axis", df.columns.tolist(), key=f"y_axis_line_{x_axis}")
         y_axis_bar = st.selectbox("Select Bar Y axis", df.columns.tolist(), key=f"y_axis_bar_{x_axis}")
-        chart = create_mixed_line_and_bar_chart(df, x_axis, y_axis_line, y_axis_bar)
-    else:
-        st.error("❌ Error: Chart type not supported.")
+        y_columns = [y_axis_line, y_axis_bar]
+
+    def build():
+        data = df
+        messages = []
+        # La heatmap conta le densità: ridurre i punti ne altererebbe i valori
+        if plot_type != "Calendar Heatmap":
+            data, messages = decimate_for_chart(df, x_axis, y_columns)
+
+        if plot_type == "Basic Bar":
+            chart = create_basic_bar_chart(data, x_axis, y_axis)
+        elif plot_type == "Basic Line":
+            chart = create_basic_line_chart(data, x_axis, y_axis, render_mode)
+        elif plot_type == "Basic Scatter":
+            chart = create_basic_scatter_chart(data, x_axis, y_axis, render_mode)
+        elif plot_type == "Effect Scatter":
+            chart = create_effect_scatter_chart(data, x_axis, y_axis, render_mode)
+        elif plot_type == "Calendar Heatmap":
+            chart = create_calendar_heatmap(data, x_axis, y_axis)
+        elif plot_type == "DataZoom":
+            chart = create_datazoom_chart(data, x_axis, y_axis)
+        elif plot_type == "Mixed Line and Bar":
+            chart = create_mixed_line_and_bar_chart(data, x_axis, y_axis_line, y_axis_bar, render_mode)
+        else:
+            return None, [("error", "❌ Error: Chart type not supported.")]
+        return chart, messages
+
+    key = None
+    if cache_key is not None:
+        key = ("chart", cache_key, x_axis, tuple(y_columns), plot_type, render_mode, chart_settings())
+    chart = cached_figure(key, build)
+    if chart is None:
         return
 
     if chart:
-        st.plotly_chart(chart, use_container_width=True)
+        plotly_chart(chart, use_container_width=True)
     else:
         st.error("❌ Error: Unable to generate chart.")
 
     return chart
-
-
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import functools
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass, field
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from script_app.load_plotting_utils.cache import thread_cache_counters
+
+# 🔹 Misure per chiamata delle funzioni della pipeline, attive di default (costo di pochi µs per chiamata)
+PROFILING_ENABLED = os.environ.get("LAND_INSTABILITY_PROFILING", "1") != "0"
+# 🔹 Picchi di memoria (tracemalloc, per tutto il processo): attivabili dal pannello solo se l'amministratore lo consente
+MEMORY_TRACKING_ALLOWED = os.environ.get("LAND_INSTABILITY_MEMORY_TRACKING", "0") == "1"
+# 🔹 Viste eseguite come frammenti (rerun limitati alla vista), disattivabili per confronto
+FRAGMENTS_ENABLED = os.environ.get("LAND_INSTABILITY_FRAGMENTS", "1") != "0"
+MAX_SPANS = 5_000  # Chiamate conservate per sessione (le più vecchie vengono scartate)
+TRACE_STATE = "_profiling_trace"
+
+@dataclass
+class Trace:
+    """Chiamate misurate di una sessione, raggruppate per rerun."""
+    spans: deque = field(default_factory=lambda: deque(maxlen=MAX_SPANS))
+    reruns: dict = field(default_factory=dict)  # rerun -> inizio (secondi da `origin`)
+    scopes: dict = field(default_factory=dict)  # rerun -> "app" o nome del frammento rieseguito
+    rerun: int = 0
+    origin: float = field(default_factory=time.perf_counter)
+    stack: list = field(default_factory=list)  # Chiamate in corso, con il picco di memoria visto dai figli
+
+def current_trace():
+    """Trace della sessione Streamlit corrente; None fuori dal runtime (processi di lettura, benchmark)."""
+    if not PROFILING_ENABLED or get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    if TRACE_STATE not in st.session_state:
+        st.session_state[TRACE_STATE] = Trace()
+    return st.session_state[TRACE_STATE]
+
+def start_rerun(scope="app"):
+    """Segna l'inizio di un rerun (di tutta la pagina o di un frammento): le chiamate successive gli vengono attribuite."""
+    trace = current_trace()
+    if trace is not None:
+        trace.rerun += 1
+        trace.reruns[trace.rerun] = time.perf_counter() - trace.origin
+        trace.scopes[trace.rerun] = scope
+        trace.stack.clear()
+
+def fragment_rerun():
+    """True se lo script in esecuzione è il rerun di uno o più frammenti e non di tutta la pagina."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return bool(ctx is not None and getattr(ctx, "fragment_ids_this_run", None))
+
+def set_memory_tracking(enabled):
+    """Attiva o disattiva tracemalloc (per tutto il processo: rallenta il codice Python di tutte le sessioni)."""
+    if enabled and not MEMORY_TRACKING_ALLOWED:
+        return
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def _rows(value):
+    """Righe di un DataFrame, di una Serie o di un Dataset (o somma per una lista di Dataset)."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(getattr(value, "n_rows", None), int):  # Dataset (non i DeltaGenerator, che rispondono a ogni attributo)
+        return value.n_rows
+    if isinstance(value, (list, tuple)) and value and all(isinstance(getattr(item, "n_rows", None), int) for item in value):
+        return sum(item.n_rows for item in value)
+    return None
+
+def profiled(function):
+    """Decoratore: registra tempo reale e CPU, picco di memoria, righe e hit/miss di cache per chiamata.
+
+    Il picco di memoria (rispetto all'inizio della chiamata) è misurato solo con tracemalloc
+    attivo ed è approssimato: tracemalloc vede anche le allocazioni delle altre sessioni. Gli
+    hit/miss sono quelli del thread della sessione. Le chiamate annidate sono registrate con
+    la loro profondità.
+    """
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        trace = current_trace()
+        if trace is None:
+            return function(*args, **kwargs)
+
+        frame = {"peak": 0}
+        memory = tracemalloc.is_tracing()
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if trace.stack:
+                trace.stack[-1]["peak"] = max(trace.stack[-1]["peak"], peak)  # Il picco del chiamante non va perso
+            tracemalloc.reset_peak()
+            frame["start_memory"] = current
+        hits, misses = thread_cache_counters()
+        depth = len(trace.stack)
+        trace.stack.append(frame)
+        start, cpu = time.perf_counter(), time.process_time()
+        result, error = None, None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+            if trace.stack and trace.stack[-1] is frame:
+                trace.stack.pop()
+            peak_delta = None
+            if memory and tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], frame["peak"])
+                peak_delta = max(peak - frame["start_memory"], 0)
+                if trace.stack:
+                    trace.stack[-1]["peak"] = max(trace.stack[-1]["peak"], peak)
+            new_hits, new_misses = thread_cache_counters()
+            rows_in = next((rows for rows in map(_rows, list(args) + list(kwargs.values())) if rows is not None), None)
+            trace.spans.append({
+                "name": name,
+                "rerun": trace.rerun,
+                "depth": depth,
+                "start_s": start - trace.origin,
+                "wall_ms": wall * 1000,
+                "cpu_ms": cpu * 1000,
+                "peak_memory_mb": None if peak_delta is None else peak_delta / 1024 ** 2,
+                "rows_in": rows_in,
+                "rows_out": _rows(result),
+                "cache_hits": new_hits - hits,
+                "cache_misses": new_misses - misses,
+                "error": error,
+            })
+
+    return wrapper
+
+def fragment(function):
+    """Decoratore: `st.fragment` misurato con `profiled`.
+
+    I widget della funzione rieseguono solo la funzione stessa (con gli argomenti dell'ultimo
+    rerun completo); ogni rerun del frammento è registrato come un rerun a sé, con il suo nome.
+    Con LAND_INSTABILITY_FRAGMENTS=0 la funzione resta parte del rerun di tutta la pagina.
+    Fuori dal runtime (benchmark) la funzione è chiamata direttamente.
+    """
+    measured = profiled(function)
+    if not FRAGMENTS_ENABLED:
+        return measured
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def body(*args, **kwargs):
+        if fragment_rerun():
+            start_rerun(name)
+        return measured(*args, **kwargs)
+
+    scoped = st.fragment(body)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # Senza ScriptRunContext `st.fragment` non esegue la funzione
+        if get_script_run_ctx(suppress_warning=True) is None:
+            return measured(*args, **kwargs)
+        return scoped(*args, **kwargs)
+
+    return wrapper
+
+# 🔹 Riepiloghi ed esportazione
+def spans_frame(trace):
+    return pd.DataFrame(list(trace.spans))
+
+def rerun_summary(trace):
+    """Una riga per rerun: pagina o frammento, durata (fino alla fine dell'ultima chiamata), chiamate e hit/miss di cache."""
+    spans = spans_frame(trace)
+    if spans.empty:
+        return spans
+    spans["end_s"] = spans["start_s"] + spans["wall_ms"] / 1000
+    top = spans[spans["depth"] == 0]
+    summary = spans.groupby("rerun").agg(calls=("name", "size"), end_s=("end_s", "max"))
+    summary = summary.join(top.groupby("rerun").agg(cache_hits=("cache_hits", "sum"), cache_misses=("cache_misses", "sum")))
+    started = pd.Series(trace.reruns, dtype=float).reindex(summary.index)
+    summary["duration_ms"] = (summary["end_s"] - started.fillna(spans.groupby("rerun")["start_s"].min())) * 1000
+    summary["scope"] = pd.Series(trace.scopes, dtype=object).reindex(summary.index)
+    return summary.drop(columns="end_s").reset_index()
+
+def function_summary(trace, rerun=None):
+    """Una riga per funzione: chiamate, tempi totali e massimi, memoria, righe e hit/miss di cache."""
+    spans = spans_frame(trace)
+    if spans.empty:
+        return spans
+    if rerun is not None:
+        spans = spans[spans["rerun"] == rerun]
+    summary = spans.groupby("name").agg(
+        calls=("name", "size"), total_ms=("wall_ms", "sum"), max_ms=("wall_ms", "max"), cpu_ms=("cpu_ms", "sum"),
+        peak_memory_mb=("peak_memory_mb", "max"), rows_max=("rows_in", "max"),
+        cache_hits=("cache_hits", "sum"), cache_misses=("cache_misses", "sum"),
+    )
+    return summary.sort_values("total_ms", ascending=False).reset_index()
+
+def export_json(trace):
+    """Tutte le chiamate registrate e gli inizi dei rerun, in JSON."""
+    return json.dumps({"reruns": trace.reruns, "scopes": trace.scopes, "spans": list(trace.spans)}, indent=2)
+
+def export_chrome_trace(trace):
+    """Formato Trace Event di Chrome (chrome://tracing, Perfetto): una traccia con le chiamate annidate."""
+    events = [{"name": f"rerun {rerun} ({trace.scopes.get(rerun, 'app')})", "ph": "i", "s": "p", "ts": start * 1e6, "pid": 1, "tid": 1}
+              for rerun, start in trace.reruns.items()]
+    events += [{
+        "name": span["name"], "cat": span["name"].split(".")[0], "ph": "X",
+        "ts": span["start_s"] * 1e6, "dur": span["wall_ms"] * 1000, "pid": 1, "tid": 1,
+        "args": {key: value for key, value in span.items() if key not in ("name", "start_s", "wall_ms")},
+    } for span in trace.spans]
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
@@ -0,0 +1,139 @@
+import threading
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from script_app.load_plotting_utils.decimation import CHART_POINT_BUDGET
+
+# 🔹 Livelli della piramide, dal più fine al più grossolano (unità datetime64 di numpy)
+PYRAMID_LEVELS = {"minute": "m", "hour": "h", "day": "D", "month": "M"}
+PYRAMID_MIN_REDUCTION = 10  # Un livello è salvato solo se riduce le righe grezze almeno di questo fattore
+
+ROWS = "__rows__"  # Colonna con il numero di righe (anche con valori nulli) per bucket
+_COMBINE = {"count": "sum", "sum": "sum", "min": "min", "max": "max"}
+
+@dataclass
+class TimePyramid:
+    """Aggregati per bucket temporale (conteggio, somma, minimo, massimo) a più risoluzioni.
+
+    Ogni livello è un DataFrame indicizzato per inizio del bucket, con colonne (colonna, statistica)
+    più il numero di righe grezze; la media si ricava come somma / conteggio. Le colonne sono
+    aggregate alla prima richiesta (`ensure_columns`), non al caricamento.
+    """
+    time_column: str
+    columns: list = field(default_factory=list)  # Colonne già aggregate
+    levels: dict = field(default_factory=dict)  # nome del livello -> DataFrame
+    n_rows: int = 0
+    lock: object = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def nbytes(self):
+        return int(sum(level.memory_usage(index=True).sum() for level in self.levels.values()))
+
+    @property
+    def coarsest(self):
+        """Nome del livello salvato più grossolano, o None se la piramide è vuota."""
+        return next(reversed(self.levels), None)
+
+def _naive_times(series):
+    """Valori datetime64[ns] senza fuso orario (gli istanti tz-aware restano in UTC)."""
+    times = pd.DatetimeIndex(series)
+    if times.tz is not None:
+        times = times.tz_convert("UTC").tz_localize(None)
+    return times.to_numpy(dtype="datetime64[ns]")
+
+def _bucket(times, unit):
+    """Inizio del bucket di ciascun istante."""
+    return times.astype(f"datetime64[{unit}]").astype("datetime64[ns]")
+
+def _aggregate_rows(df, time_column, columns, unit):
+    """Aggrega le righe grezze al livello più fine in un unico raggruppamento."""
+    times = _naive_times(df[time_column])
+    valid = ~np.isnat(times)
+    values = df.loc[valid, columns].astype(np.float64)
+    values.index = pd.DatetimeIndex(_bucket(times[valid], unit), name=time_column)
+
+    grouped = values.groupby(level=0, sort=True)
+    level = grouped.agg(list(_COMBINE))
+    level[(ROWS, "count")] = grouped.size()
+    return level
+
+def _combine(level, keys):
+    """Combina i bucket di un livello raggruppandoli per `keys` (stesse statistiche in uscita)."""
+    grouped = level.groupby(keys, sort=True)
+    parts = [
+        getattr(grouped[[col for col in level.columns if _COMBINE[col[1]] == how]], how)()
+        for how in ("sum", "min", "max")
+    ]
+    combined = pd.concat(parts, axis=1)[level.columns]
+    combined.index.name = level.index.name
+    return combined
+
+def _coarsen(level, unit):
+    """Porta un livello alla risoluzione `unit` combinando i bucket."""
+    return _combine(level, _bucket(level.index.to_numpy(dtype="datetime64[ns]"), unit))
+
+def _build_levels(df, time_column, columns):
+    """Tutti i livelli per le righe date: il più fine dai dati grezzi, gli altri ciascuno dal precedente."""
+    names = list(PYRAMID_LEVELS)
+    levels = {names[0]: _aggregate_rows(df, time_column, columns, PYRAMID_LEVELS[names[0]])}
+    for previous, name in zip(names, names[1:]):
+        levels[name] = _coarsen(levels[previous], PYRAMID_LEVELS[name])
+    return levels
+
+def build_pyramid(df, time_column, columns=()):
+    """Piramide sulla colonna temporale; `columns` sono aggregate subito, le altre alla prima richiesta."""
+    return ensure_columns(TimePyramid(time_column=time_column, n_rows=len(df)), df, columns)
+
+def ensure_columns(pyramid, df, columns):
+    """Aggiunge alla piramide le colonne non ancora aggregate, con una passata sulle sole colonne nuove.
+
+    I bucket dipendono solo dalla colonna temporale: i livelli salvati sono scelti alla prima
+    aggregazione (quelli che non riducono i dati sono scartati) e valgono per tutte le colonne.
+    """
+    with pyramid.lock:  # Il Dataset in cache è condiviso tra sessioni
+        missing = [col for col in columns if col not in pyramid.columns]
+        if not missing:
+            return pyramid
+        if not pyramid.columns:
+            levels = _build_levels(df, pyramid.time_column, missing)
+            pyramid.levels = {name: level for name, level in levels.items()
+                              if len(level) * PYRAMID_MIN_REDUCTION <= len(df)}
+        elif pyramid.levels:
+            levels = _build_levels(df, pyramid.time_column, missing)
+            for name, level in pyramid.levels.items():
+                pyramid.levels[name] = pd.concat([level, levels[name].drop(columns=[(ROWS, "count")])], axis=1)
+        pyramid.columns = pyramid.columns + missing  # Dopo i livelli: chi legge vede solo colonne complete
+    return pyramid
+
+def _naive_bound(value):
+    """Estremo dell'intervallo confrontabile con l'indice dei livelli (senza fuso orario)."""
+    if value is None:
+        return None
+    value = pd.Timestamp(value)
+    return value.tz_convert("UTC").tz_localize(None) if value.tz is not None else value
+
+def query_pyramid(pyramid, start=None, end=None, max_points=CHART_POINT_BUDGET):
+    """Sceglie il livello più fine con al massimo `max_points` bucket in [start, end].
+
+    Restituisce (nome del livello, bucket selezionati), oppure (None, None) se le righe grezze
+    nell'intervallo sono già entro il limite e conviene leggere i dati originali.
+    """
+    if pyramid is None or not pyramid.levels:
+        return None, None
+    start, end = _naive_bound(start), _naive_bound(end)
+    coarsest = pyramid.levels[pyramid.coarsest].loc[start:end]
+    if coarsest[(ROWS, "count")].sum() <= max_points:
+        return None, None
+    for name, level in pyramid.levels.items():
+        selection = level.loc[start:end]
+        if len(selection) <= max_points:
+            return name, selection
+    return pyramid.coarsest, coarsest
+
+def level_means(pyramid, selection, columns):
+    """DataFrame con la colonna temporale e la media per bucket di ciascuna colonna (stessi nomi dei dati grezzi)."""
+    frame = pd.DataFrame({
+        col: selection[(col, "sum")] / selection[(col, "count")].where(selection[(col, "count")] > 0)
+        for col in columns
+    })
+    return frame.rename_axis(pyramid.time_column).reset_index()
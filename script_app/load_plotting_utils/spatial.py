@@ -0,0 +1,143 @@
+import os
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+# 🔹 Marker massimi per dataset sulla mappa: oltre questo numero i punti sono aggregati in celle
+MAP_POINT_BUDGET = int(os.environ.get("LAND_INSTABILITY_MAP_POINTS", "20000"))
+GRID_CELLS_PER_TILE = 8  # Celle per tile (256 px) della mappa: circa 32 px per cella sullo schermo
+KM_PER_DEGREE = 111.32
+
+def coordinates(df, lat_col, lon_col):
+    """Latitudine e longitudine come float64 e maschera delle righe con coordinate valide."""
+    lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+    valid = ~np.isnan(lat) & ~np.isnan(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    return lat, lon, valid
+
+def grid_cell_size(zoom):
+    """Lato della cella (gradi) per il livello di zoom della mappa."""
+    return 360.0 / 2 ** zoom / GRID_CELLS_PER_TILE
+
+def grid_bins(lat, lon, values=None, cell_size=1.0, max_bins=MAP_POINT_BUDGET):
+    """Aggrega i punti in celle di una griglia regolare in gradi.
+
+    Per ogni cella restituisce baricentro, numero di punti e, se `values` è dato, media, minimo e
+    massimo dei valori. Se le celle sono più di `max_bins` il lato della cella raddoppia finché
+    rientrano nel budget. Restituisce (DataFrame delle celle, lato della cella usato).
+    """
+    frame = pd.DataFrame({"lat": lat, "lon": lon})
+    aggregations = {"lat": ("lat", "mean"), "lon": ("lon", "mean"), "count": ("lat", "size")}
+    if values is not None:
+        frame["value"] = values
+        aggregations.update({"mean": ("value", "mean"), "min": ("value", "min"), "max": ("value", "max")})
+
+    while True:
+        rows = np.floor((lat + 90.0) / cell_size).astype(np.int64)
+        cols = np.floor((lon + 180.0) / cell_size).astype(np.int64)
+        cell = rows * (int(360.0 / cell_size) + 2) + cols
+        n_cells = pd.unique(cell).size
+        if n_cells <= max_bins:
+            break
+        cell_size *= 2
+
+    bins = frame.groupby(cell, sort=False).agg(**aggregations).reset_index(drop=True)
+    return bins, cell_size
+
+# 🔹 Indice spaziale: griglia di SPATIAL_INDEX_CELLS celle sul lato maggiore dell'estensione dei dati.
+# Con al massimo 256 × 256 celle le chiavi stanno in uint16, ordinabili con radix sort
+SPATIAL_INDEX_CELLS = 255
+MAP_TILE_PX = 512  # Larghezza del mondo in pixel a zoom 0 (tile mapbox)
+MAX_AUTO_ZOOM = 15
+
+@dataclass
+class SpatialIndex:
+    """Punti validi ordinati per cella di una griglia regolare sull'estensione dei dati.
+
+    Le celle sono numerate riga per riga, quindi i punti di una riga di celle compresi tra due
+    colonne sono contigui: un rettangolo si estrae con due ricerche binarie per riga di celle.
+    """
+    lat_column: str
+    lon_column: str
+    bounds: tuple  # (lat_min, lat_max, lon_min, lon_max)
+    cell_size: float
+    n_rows: int
+    n_cols: int
+    keys: np.ndarray  # Cella di ogni punto, in ordine crescente
+    positions: np.ndarray  # Posizione nel DataFrame di ogni punto, nello stesso ordine
+    lat: np.ndarray
+    lon: np.ndarray
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.keys, self.positions, self.lat, self.lon))
+
+def _cells(values, origin, cell_size, n_cells):
+    """Indice di cella (0 … n_cells - 1) dei valori lungo un asse."""
+    return np.clip(np.floor((values - origin) / cell_size), 0, n_cells - 1).astype(np.int64)
+
+def build_spatial_index(df, lat_col, lon_col, cells=SPATIAL_INDEX_CELLS):
+    """Costruisce l'indice sulle coordinate valide di `df`; None se non ce ne sono."""
+    lat, lon, valid = coordinates(df, lat_col, lon_col)
+    positions = np.flatnonzero(valid)
+    if not len(positions):
+        return None
+    lat, lon = lat[positions], lon[positions]
+
+    bounds = (float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max()))
+    cell_size = max(bounds[1] - bounds[0], bounds[3] - bounds[2], 1e-9) / cells
+    n_rows = int((bounds[1] - bounds[0]) / cell_size) + 1
+    n_cols = int((bounds[3] - bounds[2]) / cell_size) + 1
+    keys = _cells(lat, bounds[0], cell_size, n_rows) * n_cols + _cells(lon, bounds[2], cell_size, n_cols)
+    keys = keys.astype(np.uint16 if n_rows * n_cols <= 2 ** 16 else np.int64)
+
+    order = np.argsort(keys, kind="stable")
+    position_dtype = np.int32 if len(df) < 2 ** 31 else np.int64
+    return SpatialIndex(lat_col, lon_col, bounds, cell_size, n_rows, n_cols,
+                        keys[order], positions[order].astype(position_dtype), lat[order], lon[order])
+
+def query_bbox(index, lat_min, lat_max, lon_min, lon_max):
+    """Posizioni (crescenti) delle righe con coordinate nel rettangolo, estremi inclusi.
+
+    Si visitano solo le righe di celle che intersecano il rettangolo: O(r log n) per le ricerche
+    più il numero di punti nelle celle di bordo, senza scorrere tutto il dataset.
+    """
+    lat_min, lon_min = max(lat_min, index.bounds[0]), max(lon_min, index.bounds[2])
+    lat_max, lon_max = min(lat_max, index.bounds[1]), min(lon_max, index.bounds[3])
+    if lat_min > lat_max or lon_min > lon_max:
+        return np.empty(0, dtype=index.positions.dtype)
+
+    row_start, row_stop = _cells(np.array([lat_min, lat_max]), index.bounds[0], index.cell_size, index.n_rows)
+    col_start, col_stop = _cells(np.array([lon_min, lon_max]), index.bounds[2], index.cell_size, index.n_cols)
+    rows = np.arange(row_start, row_stop + 1) * index.n_cols
+    # Limiti dello stesso tipo delle chiavi, altrimenti numpy converte (copia) tutto l'array a ogni ricerca
+    starts = np.searchsorted(index.keys, (rows + col_start).astype(index.keys.dtype), side="left")
+    stops = np.searchsorted(index.keys, (rows + col_stop).astype(index.keys.dtype), side="right")
+
+    candidates = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)])
+    lat, lon = index.lat[candidates], index.lon[candidates]
+    inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+    return np.sort(index.positions[candidates[inside]])
+
+def union_bounds(bounds):
+    """Rettangolo che contiene tutti i rettangoli (lat_min, lat_max, lon_min, lon_max) dati."""
+    bounds = list(bounds)
+    return (min(b[0] for b in bounds), max(b[1] for b in bounds), min(b[2] for b in bounds), max(b[3] for b in bounds))
+
+def extent_view(bounds, width_px=900, height_px=800, padding=0.1):
+    """Centro e zoom della mappa che inquadrano il rettangolo (proiezione di Mercatore)."""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    center = {"lat": (lat_min + lat_max) / 2, "lon": (lon_min + lon_max) / 2}
+
+    def mercator(lat):
+        lat = np.radians(np.clip(lat, -85.0, 85.0))
+        return np.degrees(np.log(np.tan(np.pi / 4 + lat / 2)))
+
+    lon_span = (lon_max - lon_min) * (1 + padding)
+    lat_span = (mercator(lat_max) - mercator(lat_min)) * (1 + padding)
+    zooms = [np.log2(360.0 * px / (MAP_TILE_PX * span)) for px, span in ((width_px, lon_span), (height_px, lat_span)) if span > 0]
+    zoom = min(zooms) if zooms else MAX_AUTO_ZOOM
+    return center, float(np.clip(np.floor(zoom * 2) / 2, 0, MAX_AUTO_ZOOM))
@@ -1,123 +1,525 @@
+import warnings
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go  
-import plotly.express as px  
-from script_app.load_plotting_utils.plotting import create_and_render_plot  
-
-# Funzione per convertire timestamp Unix in datetime
-import pandas as pd
+from script_app.load_plotting_utils.load import infer_and_parse_dates
+from script_app.load_plotting_utils.cache import get_cache
+from script_app.load_plotting_utils.pyramid import ROWS
+from script_app.load_plotting_utils.dataset import dataset_pyramid
+from script_app.load_plotting_utils.profiling import profiled
 
 # Funzione per convertire timestamp Unix in datetime
+@profiled
 def convert_unix_to_datetime(df):
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
-            # Verifica se i valori sono plausibili per timestamp in secondi
-            if df[col].between(1e9, 2e9).all():
-                df[col] = pd.to_datetime(df[col], unit='s')
-            # Verifica se i valori sono plausibili per timestamp in millisecondi
-            elif df[col].between(1e12, 2e12).all():
-                df[col] = pd.to_datetime(df[col], unit='ms')
-        elif pd.api.types.is_string_dtype(df[col]):
-            # Verifica se la colonna è nel formato YYYYMMDD
-            if df[col].str.match(r'^\d{8}$').all():
-                df[col] = pd.to_datetime(df[col], format='%Y%m%d')
-            # Verifica se la colonna è nel formato YYYY-MM-DD
-            elif df[col].str.match(r'^\d{4}-\d{2}-\d{2}$').all():
-                df[col] = pd.to_datetime(df[col], format='%Y-%m-%d')
-    return df
+    """Converte le colonne di date non ancora convertite.
+
+    Le date sono già rilevate una volta sola al caricamento (`infer_and_parse_dates`), che salva i
+    formati in `df.attrs["datetime_formats"]`: se ci sono il DataFrame è restituito senza riesaminarlo.
+    """
+    if "datetime_formats" in df.attrs:
+        return df
+    return infer_and_parse_dates(df)
+
+
+# 🔹 Quantile normale delle bande di confidenza (95%)
+CONFIDENCE_Z = 1.96
+
+def max_correlation_lag(n_rows):
+    """Lag massimo utile per una serie di n righe: oltre n/2 le coppie sono troppo poche per la stima."""
+    return max(int(n_rows) // 2, 1)
+
+def _fft_size(n):
+    """Lunghezza FFT (potenza di 2) per n campioni."""
+    return 1 << max(int(n) - 1, 1).bit_length()
+
+def _center(values):
+    """Centra le colonne sulla media dei valori validi; restituisce (centrati con NaN a 0, maschera dei validi)."""
+    mask = ~np.isnan(values)
+    counts = np.maximum(mask.sum(axis=0), 1)
+    means = np.where(mask, values, 0.0).sum(axis=0) / counts
+    return np.where(mask, values - means, 0.0), mask.astype(np.float64)
+
+def autocorrelation_fft(values, max_lag):
+    """Autocorrelazione per i lag 0..max_lag di tutte le colonne di `values` (n x k) in un solo passaggio FFT.
+
+    Stimatore distorto (come `acf` di statsmodels): la covarianza di ogni lag è divisa per quella al
+    lag 0, non per il numero di coppie, quindi i valori restano in [-1, 1] anche sui lag lunghi.
+    I NaN sono esclusi (contano come scarti nulli dalla media). Costo O(n log n).
+    Restituisce (autocorrelazioni (max_lag+1) x k, numero di valori validi per colonna).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    centered, mask = _center(values)
+    size = _fft_size(len(values) + max_lag)  # Padding: evita la sovrapposizione circolare
 
+    spectrum = np.fft.rfft(centered, size, axis=0)
+    autocov = np.fft.irfft(spectrum * np.conj(spectrum), size, axis=0)[:max_lag + 1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return autocov / autocov[0], mask.sum(axis=0)
 
 # Funzione per calcolare l'autocorrelazione
-def compute_autocorrelation(df, column, max_lag=50):
-    if column not in df.columns:
+@profiled
+def compute_autocorrelation_batch(df, columns, max_lag=50):
+    """Autocorrelazione di più colonne in un solo passaggio FFT.
+
+    Restituisce {colonna: (lags, valori, banda di confidenza)} per i lag 1..max_lag; la banda è
+    il limite ±z/sqrt(n) oltre il quale la correlazione è significativa al 95%.
+    """
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
         st.error(f"❌ Error: One of the selected columns does not exist in the DataFrame.")
         return None
-    autocorr_values = [df[column].autocorr(lag) for lag in range(1, min(len(df), max_lag))]
-    lags = list(range(1, len(autocorr_values) + 1))
+    max_lag = max(min(int(max_lag), max_correlation_lag(len(df))), 1)
+    acf, valid = autocorrelation_fft(df[columns].to_numpy(dtype=np.float64), max_lag)
+    lags = np.arange(1, max_lag + 1)
+    return {column: (lags, acf[1:, i], CONFIDENCE_Z / np.sqrt(max(valid[i], 1)))
+            for i, column in enumerate(columns)}
+
+@profiled
+def compute_autocorrelation(df, column, max_lag=50):
+    result = compute_autocorrelation_batch(df, [column], max_lag)
+    if result is None:
+        return None
+    lags, autocorr_values, _ = result[column]
     return lags, autocorr_values
     
-def compute_cross_correlation(df, column1, column2, max_lag=50):
-    if column1 not in df.columns or column2 not in df.columns:
+def cross_correlation_fft(x_values, y_values, max_lag):
+    """Correlazione incrociata tra le colonne corrispondenti di `x_values` e `y_values` (n x k) per i lag -L..+L.
+
+    Il valore al lag k è la correlazione tra x[t] e y[t-k]: lag positivo significa che y anticipa x.
+    Tutti i lag e tutte le coppie sono calcolati in un solo passaggio FFT; come nell'autocorrelazione
+    lo stimatore è distorto (valori in [-1, 1]) e i NaN sono esclusi. Restituisce (lags, correlazioni (2L+1) x k).
+    """
+    x_values = np.asarray(x_values, dtype=np.float64)
+    y_values = np.asarray(y_values, dtype=np.float64)
+    if x_values.ndim == 1:
+        x_values, y_values = x_values[:, None], y_values[:, None]
+    x_centered, x_mask = _center(x_values)
+    y_centered, y_mask = _center(y_values)
+    size = _fft_size(len(x_values) + max_lag)
+
+    def _correlate(a, b):
+        full = np.fft.irfft(np.fft.rfft(a, size, axis=0) * np.conj(np.fft.rfft(b, size, axis=0)), size, axis=0)
+        return np.concatenate([full[size - max_lag:], full[:max_lag + 1]])  # Lag -L..-1 poi 0..L
+
+    covariance = _correlate(x_centered, y_centered)
+    scale = np.sqrt((x_centered ** 2).sum(axis=0) * (y_centered ** 2).sum(axis=0))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = covariance / scale
+    return np.arange(-max_lag, max_lag + 1), correlation
+
+@profiled
+def compute_cross_correlation_batch(df, pairs, max_lag=50):
+    """Correlazione incrociata di più coppie di colonne in un solo passaggio FFT.
+
+    Restituisce {(colonna1, colonna2): (lags, valori, lag del picco, valore del picco)}, dove il picco
+    è il lag con la correlazione più forte in valore assoluto.
+    """
+    if any(column not in df.columns for pair in pairs for column in pair):
         st.error("❌ Error: One of the selected columns does not exist in the DataFrame.")
         return None
-    cross_corr_values = [df[column1].corr(df[column2].shift(lag)) for lag in range(1, min(len(df), max_lag))]
-    lags = list(range(1, len(cross_corr_values) + 1))
+    max_lag = max(min(int(max_lag), max_correlation_lag(len(df))), 1)
+    first = df[[pair[0] for pair in pairs]].to_numpy(dtype=np.float64)
+    second = df[[pair[1] for pair in pairs]].to_numpy(dtype=np.float64)
+    lags, correlation = cross_correlation_fft(first, second, max_lag)
+
+    results = {}
+    for i, pair in enumerate(pairs):
+        values = correlation[:, i]
+        peak = int(np.nanargmax(np.abs(values))) if np.isfinite(values).any() else max_lag
+        results[tuple(pair)] = (lags, values, int(lags[peak]), values[peak])
+    return results
+
+@profiled
+def compute_cross_correlation(df, column1, column2, max_lag=50):
+    results = compute_cross_correlation_batch(df, [(column1, column2)], max_lag)
+    if results is None:
+        return None
+    lags, cross_corr_values, _, _ = results[(column1, column2)]
     return lags, cross_corr_values
 
+# 🔹 Metodi di allineamento temporale tra dataset
+ALIGN_METHODS = {"Nearest": "nearest", "Backward": "backward", "Resample": "resample"}
+
+def _naive_time(series):
+    """Riporta le date con fuso orario a UTC senza fuso, per confrontarle con le altre."""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_convert("UTC").dt.tz_localize(None)
+    return series
+
+@profiled
+def time_order(dataset):
+    """Posizioni delle righe del dataset in ordine di tempo (None se già ordinate); calcolate una sola volta.
+
+    In cache c'è solo la permutazione, non una copia ordinata del DataFrame.
+    """
+    if dataset.time_sorted:
+        return None
+
+    def _argsort():
+        return np.argsort(_naive_time(dataset.df[dataset.time_column]).to_numpy(), kind="stable")
+
+    return get_cache("time_order").get_or_compute((dataset.key, dataset.time_column), _argsort)
+
+def _time_frame(dataset, columns):
+    """DataFrame con la sola colonna temporale (senza date nulle) e le colonne richieste, ordinato per tempo."""
+    df = dataset.df
+    order = time_order(dataset)
+    frame = pd.DataFrame({"time": _naive_time(df[dataset.time_column]).to_numpy()})
+    for column in columns:
+        frame[f"{dataset.name}: {column}"] = df[column].to_numpy()
+    if order is not None:
+        frame = frame.take(order).reset_index(drop=True)
+    return frame.dropna(subset=["time"])
+
+@profiled
+def align_datasets(datasets, value_columns, method="nearest", tolerance=None, freq="1h"):
+    """Allinea nel tempo più dataset su una griglia comune.
+
+    - "nearest" / "backward": ogni riga del primo dataset riceve il valore più vicino (o l'ultimo
+      precedente) degli altri dataset, con `merge_asof` su dati già ordinati (O(n) per dataset);
+      `tolerance` (es. "30min") limita la distanza massima.
+    - "resample": ogni dataset viene ridotto alla media su intervalli regolari `freq` e i risultati
+      sono uniti sulla stessa griglia.
+    `value_columns` è {nome del dataset: [colonne]}. Il risultato ha l'indice temporale e una colonna
+    "dataset: variabile" per ogni serie, ed è in cache per combinazione di dataset e parametri.
+    Il nome del dataset fa parte della chiave: lo stesso contenuto caricato con un altro nome
+    produce colonne con un altro prefisso.
+    """
+    key = (tuple((dataset.key, dataset.name, dataset.time_column, tuple(value_columns[dataset.name]))
+                 for dataset in datasets),
+           method, tolerance, freq)
+
+    def _align():
+        frames = [_time_frame(dataset, value_columns[dataset.name]) for dataset in datasets]
+        if method == "resample":
+            resampled = [frame.set_index("time").resample(freq).mean() for frame in frames]
+            return pd.concat(resampled, axis=1, join="outer")
+
+        aligned = frames[0]
+        for frame in frames[1:]:
+            aligned = pd.merge_asof(aligned, frame, on="time", direction=method,
+                                    tolerance=pd.Timedelta(tolerance) if tolerance else None)
+        return aligned.set_index("time")
+
+    return get_cache("alignment").get_or_compute(key, _align)
+
+# 🔹 Parametri del calcolo delle statistiche
+STATS_CHUNK_ROWS = 250_000  # Righe elaborate per blocco (i temporanei restano piccoli)
+QUANTILE_SAMPLE_ROWS = 200_000  # Oltre questa soglia i quantili sono stimati su un campione uniforme
+QUANTILES = (0.25, 0.5, 0.75)
+
+def _iter_chunks(data, chunksize=STATS_CHUNK_ROWS):
+    """Blocchi di righe di un DataFrame, o i blocchi già pronti di un iterabile (es. `pd.read_csv(chunksize=...)`)."""
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, max(len(data), 1), chunksize):
+            yield data.iloc[start:start + chunksize]
+    else:
+        yield from data
+
+class _QuantileSketch:
+    """Campione uniforme a dimensione limitata delle righe, per stimare i quantili.
+
+    Con il numero totale di righe noto (DataFrame in memoria) prende una riga ogni `step`;
+    altrimenti (dati a blocchi) usa un campionamento di Bernoulli con probabilità che si dimezza
+    quando il campione cresce troppo. Finché le righe sono poche il campione le contiene tutte
+    e i quantili sono esatti.
+    """
+
+    def __init__(self, size=QUANTILE_SAMPLE_ROWS, total_rows=None, seed=0):
+        self.size = size
+        self.step = max(-(-total_rows // size), 1) if total_rows else None
+        self.probability = 1.0
+        self.samples = []
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, chunk, offset):
+        if self.step is not None:
+            chunk = chunk.iloc[(-offset) % self.step::self.step]
+        block = chunk.to_numpy(dtype=np.float64, na_value=np.nan)
+        if self.step is None and self.probability < 1.0:
+            block = block[self.rng.random(len(block)) < self.probability]
+        self.samples.append(block)
+        if self.step is None and sum(len(sample) for sample in self.samples) > 2 * self.size:
+            # Dimezza la probabilità di inclusione e sottocampiona quanto già raccolto
+            merged = np.concatenate(self.samples)
+            self.samples = [merged[self.rng.random(len(merged)) < 0.5]]
+            self.probability /= 2
+
+    @property
+    def exact(self):
+        return self.probability == 1.0 and (self.step or 1) == 1
+
+    def quantiles(self, q):
+        values = np.concatenate(self.samples)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Colonne tutte NaN
+            return np.nanquantile(values, q, axis=0)
+
+class _RunningMoments:
+    """Conteggio, somma, media, M2, minimo e massimo di una colonna, aggiornati blocco per blocco."""
+
+    def __init__(self):
+        self.n, self.total, self.mean, self.m2 = 0, 0.0, 0.0, 0.0
+        self.minimum, self.maximum = np.inf, -np.inf
+
+    def add(self, values):
+        if np.isnan(values).any():
+            values = values[~np.isnan(values)]
+        n = len(values)
+        if n == 0:
+            return
+        total = values.sum()
+        mean = total / n
+        centered = values - mean
+        m2 = np.dot(centered, centered)
+        # Combinazione delle varianze dei blocchi (Chan et al.)
+        combined = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.n * n / combined
+        self.mean = (self.mean * self.n + total) / combined
+        self.n, self.total = combined, self.total + total
+        self.minimum = min(self.minimum, values.min())
+        self.maximum = max(self.maximum, values.max())
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / max(self.n - 1, 1))
+
 # Funzione per calcolare le statistiche
-def calcula_statistics(df):
+@profiled
+def calcula_statistics(data, chunksize=STATS_CHUNK_ROWS):
+    """Statistiche di tutte le colonne in un solo passaggio per blocchi.
+
+    Ogni blocco di righe viene letto una volta sola: per ogni colonna numerica si aggiornano
+    conteggio, somma, media, minimo, massimo e deviazione standard (varianze combinate con
+    l'algoritmo di Chan) e un campione per mediana e quartili, esatti fino a QUANTILE_SAMPLE_ROWS
+    righe e stimati oltre. `data` può essere un DataFrame o un iterabile di DataFrame (dati a blocchi).
+    """
+    total_rows = len(data) if isinstance(data, pd.DataFrame) else None
+    columns = None
+    counts, moments = {}, {}
+    offset = 0
+    for chunk in _iter_chunks(data, chunksize):
+        if columns is None:
+            columns = chunk.columns.tolist()
+            numeric = [col for col in columns if pd.api.types.is_numeric_dtype(chunk[col])]
+            moments = {col: _RunningMoments() for col in numeric}
+            sketch = _QuantileSketch(total_rows=total_rows)
+
+        for col in columns:
+            if col in moments:
+                moments[col].add(chunk[col].to_numpy(dtype=np.float64, na_value=np.nan))
+            else:
+                counts[col] = counts.get(col, 0) + int(chunk[col].count())
+        if numeric and not chunk.empty:
+            sketch.add(chunk[numeric], offset)
+        offset += len(chunk)
+
+    if columns is None:
+        return pd.DataFrame()
+
+    if numeric:
+        quantiles = dict(zip(numeric, sketch.quantiles(QUANTILES).T))
     stats = []
-    for col in df.columns:
-        if pd.api.types.is_numeric_dtype(df[col]):
+    for col in columns:
+        if col in moments:
+            column = moments[col]
+            has_values = column.n > 0
+            q25, median, q75 = quantiles[col] if has_values else (None, None, None)
             stats.append({
                 'Variable': col,
-                'Counting': df[col].count(),
-                'Sum': df[col].sum(),
-                'Mean': df[col].mean(),
-                'Minum': df[col].min(),
-                'Max': df[col].max(),
-                'Median': df[col].median()
+                'Counting': column.n,
+                'Sum': column.total,
+                'Mean': column.mean if has_values else None,
+                'Minimum': column.minimum if has_values else None,
+                'Max': column.maximum if has_values else None,
+                'Std': column.std if has_values else None,
+                'Q25': q25,
+                'Median': median,
+                'Q75': q75,
+                'Quantiles': "exact" if sketch.exact else "approximate",
             })
         else:
-            stats.append({
-                'Variable': col,
-                'Counting': df[col].count(),
-                'Sum': 'N/A',
-                'Mean': 'N/A',
-                'Minimum': 'N/A',
-                'Max': 'N/A',
-                'Median': 'N/A'
-            })
+            stats.append({'Variable': col, 'Counting': counts.get(col, 0)})
     return pd.DataFrame(stats)
 
-# Funzione per aggregare dati temporali
-import pandas as pd
-import streamlit as st
+@profiled
+def dataset_statistics(dataset):
+    """Statistiche del dataset, calcolate una volta e riusate a ogni rerun."""
+    return get_cache("statistics").get_or_compute(dataset.key, lambda: calcula_statistics(dataset.df))
 
-import pandas as pd
-import plotly.express as px
+# 🔹 Aggregazioni temporali
+SEASONS = {
+    12: "Winter", 1: "Winter", 2: "Winter",
+    3: "Spring", 4: "Spring", 5: "Spring",
+    6: "Summer", 7: "Summer", 8: "Summer",
+    9: "Autumn", 10: "Autumn", 11: "Autumn"
+}
+SEASON_ORDER = ["Winter", "Spring", "Summer", "Autumn"]
 
-import pandas as pd
+# Riduzioni disponibili: le prime sono combinabili tra periodi, i percentili richiedono i dati grezzi
+AGGREGATION_REDUCERS = {
+    "Count": "count", "Mean": "mean", "Max": "max", "Min": "min", "Sum": "sum",
+    "Median": 0.5, "P10": 0.1, "P90": 0.9,
+}
+_MONTHLY_PARTIALS = {"count": "sum", "valid": "sum", "sum": "sum", "max": "max", "min": "min"}
 
-def aggrega_datos_time(df, colonna_data, colonna_valore):
-    # Assicura che la colonna datetime sia nel formato corretto
-    df[colonna_data] = pd.to_datetime(df[colonna_data], errors='coerce')
-    
-    # Rimuove eventuali righe con date nulle
-    df = df.dropna(subset=[colonna_data])
-    
-    # Imposta la colonna datetime come indice
-    df = df.set_index(colonna_data)
-    
-    # Riempie eventuali NaN nella colonna di valore
-    df[colonna_valore] = df[colonna_valore].fillna(0)
-    
-    # Mappa le stagioni
-    stagioni = {
-        12: "Winter", 1: "Winter", 2: "Winter",
-        3: "Spring", 4: "Spring", 5: "Spring",
-        6: "Summer", 7: "Summer", 8: "Summer",
-        9: "Autumn", 10: "Autumn", 11: "Autumn"
-    }
-    
-    df['Season'] = df.index.month.map(stagioni)
-    
-    # Mantiene l'ordine corretto delle stagioni
-    stagioni_ordine = pd.CategoricalDtype(["Winter", "Spring", "Summer", "Autumn"], ordered=True)
-    df['Season'] = df['Season'].astype(stagioni_ordine)
-
-    # Aggregazione per stagione
-    agg_stagioni = df.groupby('Season')[colonna_valore].count()
-
-    # Debug per controllare la struttura dei dati
-    print("Aggregazioni Stagionali:")
-    print(agg_stagioni)
-
-    aggregazioni = {
-        'Annually': df[colonna_valore].resample('YE').count(),
-        'Monthly': df[colonna_valore].resample('ME').count(),
-        'Seasonality': agg_stagioni,
-        'Six-monthly': df[colonna_valore].resample('6M').count()
+def _period_labels(month_keys):
+    """Etichette annuali, semestrali, mensili e stagionali a partire dalla chiave mensile (anno * 12 + mese - 1)."""
+    years, months = np.divmod(np.asarray(month_keys, dtype=np.int64), 12)
+    return {
+        "Annually": years,
+        "Six-monthly": pd.Index([f"{year}-H{month // 6 + 1}" for year, month in zip(years, months)]),
+        "Monthly": pd.DatetimeIndex(pd.to_datetime({"year": years, "month": months + 1, "day": 1})),
+        "Seasonality": pd.Categorical([SEASONS[month + 1] for month in months], categories=SEASON_ORDER, ordered=True),
     }
-    
+
+def _monthly_from_pyramid(pyramid, colonna_valore):
+    """Parziali mensili ricavati dal livello più grossolano della piramide, senza leggere le righe grezze."""
+    level = pyramid.levels[pyramid.coarsest]
+    month_key = level.index.year.to_numpy(dtype=np.int64) * 12 + level.index.month.to_numpy(dtype=np.int64) - 1
+    partials = pd.DataFrame({
+        "count": level[(ROWS, "count")].to_numpy(),
+        "valid": level[(colonna_valore, "count")].to_numpy(),
+        "sum": level[(colonna_valore, "sum")].to_numpy(),
+        "max": level[(colonna_valore, "max")].to_numpy(),
+        "min": level[(colonna_valore, "min")].to_numpy(),
+    }, index=pd.Index(month_key, name="month_key"))
+    return partials.groupby(level=0, sort=True).agg(_MONTHLY_PARTIALS)
+
+@profiled
+def aggrega_datos_time(df, colonna_data, colonna_valore, reducers=("count",), pyramid=None):
+    """Aggrega `colonna_valore` per anno, semestre, mese e stagione senza modificare `df`.
+
+    Le chiavi di periodo sono calcolate una volta sola e i dati sono raggruppati una volta per mese;
+    annuale, semestrale e stagionale si ottengono combinando i parziali mensili (conteggio, somma,
+    minimo, massimo). Se è disponibile una piramide sulla stessa colonna temporale i parziali mensili
+    sono letti da lì; solo i percentili richiedono un raggruppamento dei dati grezzi per livello.
+    Restituisce {periodo: DataFrame indicizzato per periodo con una colonna per riduzione}.
+    """
+    quantiles = [reducer for reducer in reducers if not isinstance(reducer, str)]
+    use_pyramid = (
+        not quantiles and pyramid is not None and pyramid.levels
+        and pyramid.time_column == colonna_data and colonna_valore in pyramid.columns
+    )
+    if use_pyramid:
+        monthly = _monthly_from_pyramid(pyramid, colonna_valore)
+    else:
+        dates = df[colonna_data]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors='coerce')
+        valid = dates.notna().to_numpy()
+        dates = dates[valid]
+        values = pd.to_numeric(df[colonna_valore], errors='coerce').to_numpy(dtype=np.float64)[valid]
+
+        # Chiave di periodo mensile, unica base per tutti i livelli
+        month_key = dates.dt.year.to_numpy(dtype=np.int64) * 12 + dates.dt.month.to_numpy(dtype=np.int64) - 1
+        frame = pd.DataFrame({"month_key": month_key, "value": values})
+        monthly = frame.groupby("month_key", sort=True)["value"].agg(
+            count="size", valid="count", sum="sum", max="max", min="min"
+        )
+
+        # Posizione di ogni riga nella tabella mensile, per etichettare i dati grezzi senza ricalcolare i periodi
+        row_positions = np.searchsorted(monthly.index.to_numpy(), month_key)
+
+    aggregazioni = {}
+    for periodo, labels in _period_labels(monthly.index).items():
+        partials = monthly.groupby(labels, sort=True, observed=False).agg(_MONTHLY_PARTIALS)
+        if quantiles:
+            # Tutti i percentili del livello in un solo raggruppamento dei dati grezzi
+            row_labels = labels.take(row_positions)
+            percentiles = frame["value"].groupby(row_labels, sort=True, observed=False).quantile(quantiles).unstack()
+        result = pd.DataFrame(index=partials.index)
+        for reducer in reducers:
+            if reducer == "mean":
+                result[reducer] = partials["sum"] / partials["valid"].where(partials["valid"] > 0)
+            elif isinstance(reducer, str):
+                result[reducer] = partials[reducer]
+            else:
+                result[reducer] = percentiles[reducer]
+        result.index.name = periodo
+        aggregazioni[periodo] = result
     return aggregazioni
+
+@profiled
+def dataset_aggregations(dataset, colonna_data, colonna_valore, reducers=("count",)):
+    """Aggregazioni temporali del dataset, calcolate una volta per colonna di date, variabile e riduzioni."""
+    key = (dataset.key, colonna_data, colonna_valore, tuple(reducers))
+    return get_cache("aggregations").get_or_compute(
+        key, lambda: aggrega_datos_time(dataset.df, colonna_data, colonna_valore, reducers,
+                                        dataset_pyramid(dataset, colonna_data, [colonna_valore]))
+    )
+
+# 🔹 Parametri della PCA
+PCA_MAX_COMPONENTS = 10  # Componenti calcolate una volta sola; le richieste minori ne prendono una sezione
+PCA_FULL_ROWS = 200_000  # Oltre questa soglia standardizzazione e PCA procedono a blocchi (IncrementalPCA)
+PCA_BATCH_ROWS = 50_000
+
+def _complete_blocks(df, columns, chunksize):
+    """Blocchi float64 delle righe complete (senza NaN) nelle colonne date."""
+    for chunk in _iter_chunks(df, chunksize):
+        block = chunk[columns].to_numpy(dtype=np.float64)
+        yield block[~np.isnan(block).any(axis=1)]
+
+@profiled
+def compute_pca(df, columns, max_components=PCA_MAX_COMPONENTS, chunksize=PCA_BATCH_ROWS):
+    """PCA delle colonne standardizzate (solo righe complete) con il numero massimo di componenti.
+
+    Fino a PCA_FULL_ROWS righe usa la SVD completa; oltre, la standardizzazione e la IncrementalPCA
+    lavorano a blocchi, quindi la memoria dipende dalla dimensione del blocco e non dal dataset.
+    Restituisce (componenti PC1..PCk in float32, varianza spiegata, risolutore), o None se le righe
+    complete sono meno delle componenti.
+    """
+    from sklearn.decomposition import PCA, IncrementalPCA
+    from sklearn.preprocessing import StandardScaler
+
+    n_components = min(max_components, len(columns))
+    scaler = StandardScaler()
+    if len(df) <= PCA_FULL_ROWS:
+        values = np.concatenate(list(_complete_blocks(df, columns, chunksize)))
+        if len(values) < n_components:
+            return None
+        pca = PCA(n_components=n_components, svd_solver="full")
+        scores = pca.fit_transform(scaler.fit_transform(values))
+        solver = "full SVD"
+    else:
+        # Primo passaggio: media e deviazione standard
+        for block in _complete_blocks(df, columns, chunksize):
+            if len(block):
+                scaler.partial_fit(block)
+        if scaler.n_samples_seen_ < n_components:
+            return None
+
+        # Secondo passaggio: ogni blocco deve avere almeno n_components righe, quelli piccoli si accodano al precedente
+        pca = IncrementalPCA(n_components=n_components)
+        pending = None
+        for block in _complete_blocks(df, columns, chunksize):
+            if not len(block):
+                continue
+            block = scaler.transform(block)
+            if pending is not None and len(pending) >= n_components and len(block) >= n_components:
+                pca.partial_fit(pending)
+                pending = block
+            else:
+                pending = block if pending is None else np.concatenate([pending, block])
+        pca.partial_fit(pending)
+
+        # Terzo passaggio: proiezione delle righe
+        scores = np.concatenate([
+            pca.transform(scaler.transform(block))
+            for block in _complete_blocks(df, columns, chunksize) if len(block)
+        ])
+        solver = "incremental"
+
+    pca_df = pd.DataFrame(scores.astype(np.float32), columns=[f'PC{i+1}' for i in range(n_components)])
+    return pca_df, pca.explained_variance_ratio_, solver
+
+@profiled
+def dataset_pca(dataset, columns):
+    """PCA del dataset sulle colonne date, calcolata una volta e riusata per ogni numero di componenti."""
+    key = (dataset.key, tuple(columns), PCA_MAX_COMPONENTS)
+    return get_cache("pca").get_or_compute(key, lambda: compute_pca(dataset.df, list(columns)))
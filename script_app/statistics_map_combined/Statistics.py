@@ -2,32 +2,72 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go  
 import plotly.express as px  
-from script_app.load_plotting_utils.plotting import create_and_render_plot  
-from script_app.load_plotting_utils.utils import convert_unix_to_datetime, compute_autocorrelation,  compute_cross_correlation, calcula_statistics, aggrega_datos_time
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-def perform_pca(df, num_components):
-    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+from script_app.load_plotting_utils.cache import get_cache
+from script_app.load_plotting_utils.plotting import create_and_render_plot, plotly_chart, cached_figure, chart_settings, decimate_trace, reduction_messages, scatter_trace, render_mode_selector
+from script_app.load_plotting_utils.utils import compute_autocorrelation_batch,  compute_cross_correlation_batch, dataset_statistics, dataset_pca, PCA_MAX_COMPONENTS, dataset_aggregations, AGGREGATION_REDUCERS, align_datasets, ALIGN_METHODS, max_correlation_lag
+from script_app.load_plotting_utils.dataset import build_dataset, dataset_pyramid
+from script_app.load_plotting_utils.pyramid import query_pyramid, level_means
+from script_app.load_plotting_utils.profiling import profiled, fragment
+
+# Nome con cui i dati allineati della vista Merge compaiono nella PCA
+ALIGNED_DATASET_NAME = "Aligned datasets (Merge)"
+
+@profiled
+def perform_pca(dataset, num_components, numeric_cols=None):
+    """Componenti principali del dataset: la PCA è calcolata una volta e qui se ne prende una sezione."""
+    if numeric_cols is None:
+        numeric_cols = dataset.numeric_columns
     
     if len(numeric_cols) < 2:
         st.warning("⚠️ PCA requires at least two numerical variables.")
         return None, None
     
-    scaler = StandardScaler()
-    df_scaled = scaler.fit_transform(df[numeric_cols])
-    pca = PCA(n_components=num_components)
-    principal_components = pca.fit_transform(df_scaled)
+    result = dataset_pca(dataset, numeric_cols)  # Righe complete (es. dopo un allineamento temporale)
+    if result is None:
+        st.warning("⚠️ Not enough complete rows for PCA.")
+        return None, None
     
-    pca_df = pd.DataFrame(principal_components, columns=[f'PC{i+1}' for i in range(num_components)])
-    explained_variance = pca.explained_variance_ratio_
+    pca_df, explained_variance, solver = result
+    st.caption(f"PCA solver: {solver} · {len(pca_df):,} complete rows")
+    return pca_df.iloc[:, :num_components], explained_variance[:num_components]
+
+@profiled
+def pca_breakdown_png(pca_df, explained_variance, num_components):
+    """Varianza spiegata, prime tre componenti nel tempo e scatter PC1-PC2 in un'immagine PNG."""
+    # matplotlib e seaborn servono solo qui: importati all'apertura della vista
+    import io
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     
-    return pca_df, explained_variance
+    # Creazione della figura con tre sottotrame affiancate
+    fig_pca, axes = plt.subplots(1, 3, figsize=(18, 5))
+
+    # 1. Varianza spiegata per componente
+    sns.barplot(x=[f'PC{i+1}' for i in range(num_components)], y=explained_variance, ax=axes[0])
+    axes[0].set_title("Explained Variance by Component")
+    axes[0].set_ylabel("Variance Explained")
+    axes[0].set_xticklabels([f'PC{i+1}' for i in range(num_components)], rotation=45)
+
+    # 2. Serie temporali delle prime tre componenti principali
+    pca_df.iloc[:, :3].plot(ax=axes[1])
+    axes[1].set_title("Top 3 Principal Components over Time")
+    axes[1].set_ylabel("Component Value")
+
+    # 3. Scatter plot delle prime due componenti principali
+    axes[2].scatter(pca_df.iloc[:, 0], pca_df.iloc[:, 1])
+    axes[2].set_title("Scatter Plot of First Two Principal Components")
+    axes[2].set_xlabel("PC1")
+    axes[2].set_ylabel("PC2")
+
+    buffer = io.BytesIO()
+    fig_pca.savefig(buffer, format="png", bbox_inches="tight", dpi=200)  # Come st.pyplot
+    plt.close(fig_pca)
+    return buffer.getvalue()
 
 # Funzione principale per la visualizzazione e analisi dei dataset
-def Statistics_Data(df_list, filenames):
+@profiled
+def Statistics_Data(datasets):
+    filenames = [dataset.name for dataset in datasets]
     if "show_individual_plots" not in st.session_state:
         st.session_state["show_individual_plots"] = True
     if "show_merge_multiple_dataset" not in st.session_state:
@@ -94,79 +134,158 @@ def Statistics_Data(df_list, filenames):
             st.session_state["show_autocorrelation"] = False
             st.session_state["show_cross_correlation"] = False
 
-    # Sezione per i singoli grafici
+    # Ogni vista è un frammento: i suoi widget rieseguono solo la vista, sui dataset già in cache
     if st.session_state["show_individual_plots"]:
-        for idx, df in enumerate(df_list):
-            df = convert_unix_to_datetime(df)
-
-            st.caption(f"**Dataset {idx + 1} - {filenames[idx]}**")
-
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                x_axis = st.selectbox(f"X Axis {idx + 1}", df.columns.tolist(), key=f"x_axis_{idx}")
-            with col2:
-                y_axis = st.selectbox(f"Y Axis {idx + 1}", df.columns.tolist(), key=f"y_axis_{idx}")
-            with col3:
-                plot_type = st.selectbox(f"Plot Type {idx + 1}", ["Basic Scatter", "Basic Bar", "Basic Line", "Mixed Line and Bar", 
-                                         "Calendar Heatmap", "DataZoom"], key=f"plot_type_{idx}")
-
-            col1, col2 = st.columns([1, 2])
-            with col1:
-                st.dataframe(df)
-            with col2:
-                create_and_render_plot(df, x_axis, y_axis, plot_type)
-
-    # Sezione per Merge Datasets (UNICO GRAFICO)
+        single_plot_view(datasets)
     elif st.session_state["show_merge_multiple_dataset"]:
-        st.subheader("📊 Merge Multiple Datasets in One Plot")
-        
-        selected_datasets = st.multiselect("Select datasets", filenames, default=filenames)
+        merge_view(datasets)
+    elif st.session_state["show_autocorrelation"]:
+        autocorrelation_view(datasets)
+    elif st.session_state["show_cross_correlation"]:
+        cross_correlation_view(datasets)
+    elif st.session_state["show_distribution_data"]:
+        distribution_view(datasets)
 
-        if selected_datasets:
-            fig = go.Figure()  # Unico grafico
+    if st.session_state["show_pca"]:
+        pca_view(datasets)
 
-            x_axes, y_axes, second_y_axes, plot_types = {}, {}, {}, {}
+@fragment
+def single_plot_view(datasets):
+    """Grafici dei singoli dataset, con assi, tipo di grafico e intervallo temporale per ciascuno."""
+    filenames = [dataset.name for dataset in datasets]
+    for idx, dataset in enumerate(datasets):
+        df = dataset.df
+        st.caption(f"**Dataset {idx + 1} - {filenames[idx]}**")
 
-            col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
+        with col1:
+            x_axis = st.selectbox(f"X Axis {idx + 1}", dataset.columns, key=f"x_axis_{idx}")
+        with col2:
+            y_axis = st.selectbox(f"Y Axis {idx + 1}", dataset.columns, key=f"y_axis_{idx}")
+        with col3:
+            plot_type = st.selectbox(f"Plot Type {idx + 1}", ["Basic Scatter", "Basic Bar", "Basic Line", "Mixed Line and Bar", 
+                                     "Calendar Heatmap", "DataZoom"], key=f"plot_type_{idx}")
+        with col4:
+            render_mode = render_mode_selector(f"render_mode_{idx}")
 
-            with col1:
-                for i, dataset_name in enumerate(selected_datasets):
-                    df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                    x_axes[dataset_name] = st.selectbox(f"X Axis ({dataset_name})", df.columns.tolist(), key=f"x_axis_merge_{i}")
+        # Serie temporali lunghe: il grafico legge il livello della piramide adatto all'intervallo scelto
+        df_plot, rows_key = df, None  # `rows_key` identifica le righe disegnate nella chiave della figura
+        # Il grafico misto sceglie le sue colonne tra quelle del DataFrame disegnato
+        pyramid_columns = dataset.numeric_columns if plot_type == "Mixed Line and Bar" else [y_axis]
+        pyramid = dataset_pyramid(dataset, x_axis, pyramid_columns) if y_axis in dataset.numeric_columns else None
+        if pyramid is not None:
+            t_min, t_max = (value.to_pydatetime() for value in dataset.column_ranges[x_axis])
+            if t_min < t_max:
+                time_range = st.slider(f"Time range {idx + 1}", min_value=t_min, max_value=t_max,
+                                       value=(t_min, t_max), key=f"time_range_{idx}")
+                level, selection = query_pyramid(pyramid, *time_range, max_points=chart_settings()[0])
+                if level:
+                    df_plot, rows_key = level_means(pyramid, selection, pyramid_columns), (level, time_range)
+                    st.caption(f"📉 Showing {level} means: {len(df_plot):,} points for {dataset.n_rows:,} rows")
+                elif time_range != (t_min, t_max):
+                    df_plot, rows_key = df[df[x_axis].between(*time_range)], time_range
+
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.dataframe(df)
+        with col2:
+            create_and_render_plot(df_plot, x_axis, y_axis, plot_type, render_mode, cache_key=(dataset.key, rows_key))
+
+@fragment
+def merge_view(datasets):
+    """Più dataset in un unico grafico, con allineamento temporale opzionale."""
+    filenames = [dataset.name for dataset in datasets]
+    st.subheader("📊 Merge Multiple Datasets in One Plot")
+    
+    selected_datasets = st.multiselect("Select datasets", filenames, default=filenames)
 
-            with col2:
-                for i, dataset_name in enumerate(selected_datasets):
-                    df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                    y_axes[dataset_name] = st.selectbox(f"Y Axis ({dataset_name})", df.columns.tolist(), key=f"y_axis_merge_{i}")
+    if selected_datasets:
+        render_mode = render_mode_selector("merge_render_mode")
 
-            with col3:
-                for i, dataset_name in enumerate(selected_datasets):
-                    selected_plot_type = st.selectbox(f"Plot Type ({dataset_name})", 
-                                        ["Scatter", "Bar", "Line"], 
-                                        key=f"plot_type_{i}")
-                    plot_types[dataset_name] = selected_plot_type
+        x_axes, y_axes, second_y_axes, plot_types = {}, {}, {}, {}
 
-            with col4:
-                for i, dataset_name in enumerate(selected_datasets):
-                    second_y_axes[dataset_name] = st.checkbox(f"Second axes Y? ({dataset_name})", key=f"secondary_y_{i}")
+        col1, col2, col3, col4 = st.columns(4)
 
+        with col1:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                x_axes[dataset_name] = st.selectbox(f"X Axis ({dataset_name})", dataset.columns, key=f"x_axis_merge_{i}")
+
+        with col2:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                y_axes[dataset_name] = st.selectbox(f"Y Axis ({dataset_name})", dataset.columns, key=f"y_axis_merge_{i}")
+
+        with col3:
+            for i, dataset_name in enumerate(selected_datasets):
+                selected_plot_type = st.selectbox(f"Plot Type ({dataset_name})", 
+                                    ["Scatter", "Bar", "Line"], 
+                                    key=f"plot_type_{i}")
+                plot_types[dataset_name] = selected_plot_type
+
+        with col4:
+            for i, dataset_name in enumerate(selected_datasets):
+                second_y_axes[dataset_name] = st.checkbox(f"Second axes Y? ({dataset_name})", key=f"secondary_y_{i}")
+
+        # Allineamento temporale opzionale dei dataset sulla loro colonna di date
+        col1, col2 = st.columns(2)
+        with col1:
+            alignment = st.selectbox("Time alignment", ["None (raw traces)"] + list(ALIGN_METHODS), key="merge_alignment")
+        with col2:
+            if alignment == "Resample":
+                align_option = st.text_input("Resampling interval (e.g. 10min, 1h, 1D)", "1h", key="merge_freq")
+            elif alignment in ALIGN_METHODS:
+                align_option = st.text_input("Maximum time distance (optional, e.g. 30min)", "", key="merge_tolerance")
+
+        aligned = None
+        if alignment in ALIGN_METHODS:
+            aligned_datasets = [datasets[filenames.index(name)] for name in selected_datasets]
+            without_time = [dataset.name for dataset in aligned_datasets if dataset.time_column is None]
+            value_columns = {dataset.name: [y_axes[dataset.name]] for dataset in aligned_datasets
+                             if y_axes[dataset.name] in dataset.numeric_columns}
+            if without_time or len(value_columns) < len(aligned_datasets):
+                st.warning("⚠️ Time alignment needs a datetime column and a numerical Y axis in every selected dataset.")
+            else:
+                try:
+                    aligned = align_datasets(aligned_datasets, value_columns, ALIGN_METHODS[alignment],
+                                             tolerance=align_option if alignment != "Resample" else None,
+                                             freq=align_option if alignment == "Resample" else None)
+                except ValueError as e:
+                    st.error(f"❌ Error: invalid time interval ({e}).")
+
+        def build_merge():
+            fig = go.Figure()  # Unico grafico
+            points = [0, 0]  # Punti originali e disegnati, per l'indicatore di riduzione
             for dataset_name in selected_datasets:
-                df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                
-                if dataset_name in x_axes and dataset_name in y_axes:
+                dataset = datasets[filenames.index(dataset_name)]
+                df = dataset.df
+
+                if aligned is not None:
+                    # Tutte le serie condividono la stessa griglia temporale
+                    trace_kwargs = {
+                        "x": aligned.index,
+                        "y": aligned[f"{dataset_name}: {y_axes[dataset_name]}"],
+                        "name": dataset_name,
+                        "yaxis": "y2" if second_y_axes.get(dataset_name, False) else "y1"
+                    }
+                elif dataset_name in x_axes and dataset_name in y_axes:
                     trace_kwargs = {
                         "x": df[x_axes[dataset_name]],
                         "y": df[y_axes[dataset_name]],
                         "name": dataset_name,
                         "yaxis": "y2" if second_y_axes.get(dataset_name, False) else "y1"
                     }
-                    
-                    if plot_types[dataset_name] == "Scatter":
-                        fig.add_trace(go.Scatter(mode='lines+markers', **trace_kwargs))
-                    elif plot_types[dataset_name] == "Bar":
-                        fig.add_trace(go.Bar(**trace_kwargs))
-                    elif plot_types[dataset_name] == "Line":
-                        fig.add_trace(go.Scatter(mode='lines', **trace_kwargs))
+                else:
+                    continue
+                n_points = len(trace_kwargs["x"])  # Righe originali: decidono SVG o WebGL
+                trace_kwargs["x"], trace_kwargs["y"] = decimate_trace(trace_kwargs["x"], trace_kwargs["y"], points)
+
+                if plot_types[dataset_name] == "Scatter":
+                    fig.add_trace(scatter_trace(n_points, render_mode, mode='lines+markers', **trace_kwargs))
+                elif plot_types[dataset_name] == "Bar":
+                    fig.add_trace(go.Bar(**trace_kwargs))
+                elif plot_types[dataset_name] == "Line":
+                    fig.add_trace(scatter_trace(n_points, render_mode, mode='lines', **trace_kwargs))
 
             fig.update_layout(
                 title="Merged Datasets",
@@ -180,64 +299,108 @@ def Statistics_Data(df_list, filenames):
                 ),
                 legend=dict(title="Datasets")
             )
+            return fig, reduction_messages(points[0], points[1], chart_settings()[1])
 
-            st.plotly_chart(fig, use_container_width=True)
+        # Figura riusata finché dataset, colonne, tipi di grafico e allineamento non cambiano
+        alignment_key = (alignment, align_option) if aligned is not None else None
+        merge_key = ("merge", tuple((datasets[filenames.index(name)].key, x_axes[name], y_axes[name], second_y_axes[name],
+                                     plot_types[name]) for name in selected_datasets),
+                     alignment_key, render_mode, chart_settings())
+        plotly_chart(cached_figure(merge_key, build_merge), use_container_width=True)
 
-    elif st.session_state["show_autocorrelation"]:
-        st.subheader("📈 Autocorrelation Analysis")
-    
-        # Selezione dataset
-        selected_datasets = st.multiselect("Select datasets", filenames, default=filenames)
-    
-        if selected_datasets:
+        if aligned is not None and aligned.shape[1] > 1:
+            # Correlazione tra le serie allineate e riuso nella PCA
+            st.write("### Correlation between aligned datasets")
+            fig_corr = cached_figure(("aligned_correlation", merge_key[1], alignment_key), lambda: (
+                px.imshow(aligned.corr(), text_auto=".2f", zmin=-1, zmax=1, color_continuous_scale="RdBu_r"), []))
+            plotly_chart(fig_corr, use_container_width=True)
+            aligned_key = ("aligned", tuple(dataset.key for dataset in aligned_datasets), alignment, align_option,
+                           tuple(aligned.columns))
+            previous = st.session_state.get("aligned_dataset")
+            if previous is None or previous.key != aligned_key:
+                st.session_state["aligned_dataset"] = build_dataset(aligned.reset_index(), ALIGNED_DATASET_NAME, aligned_key)
+            st.caption(f"The aligned data is available in **PCA Analysis** as '{ALIGNED_DATASET_NAME}'.")
+
+@fragment
+def autocorrelation_view(datasets):
+    """Autocorrelazione di una o due variabili per dataset."""
+    filenames = [dataset.name for dataset in datasets]
+    st.subheader("📈 Autocorrelation Analysis")
+
+    # Selezione dataset
+    selected_datasets = st.multiselect("Select datasets", filenames, default=filenames)
+
+    if selected_datasets:
+        render_mode = render_mode_selector("autocorrelation_render_mode")
+        y_axis_1, y_axis_2, plot_types, max_lag_values = {}, {}, {}, {}
+
+        # UI con 4 colonne: Y1, Y2 (opzionale), tipo di grafico, lag
+        col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+
+        with col1:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                y_axis_1[dataset_name] = st.selectbox(f"Primary Y Axis ({dataset_name})", dataset.numeric_columns, key=f"y_axis1_{i}")
+
+        with col2:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                y_axis_2[dataset_name] = st.selectbox(f"Secondary Y Axis (opzionale) ({dataset_name})", ["None"] + dataset.numeric_columns, key=f"y_axis2_{i}")
+
+        with col3:
+            for i, dataset_name in enumerate(selected_datasets):
+                plot_types[dataset_name] = st.selectbox(f"Plot Type ({dataset_name})", ["Basic Scatter", "Basic Bar", "Basic Line", "Mixed Line and Bar", 
+                                     "Calendar Heatmap", "DataZoom"], key=f"plot_type_{i}")
+
+        with col4:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                # Lag fino a metà della serie (es. 86400 lag = un giorno di dati a 1 Hz)
+                max_lag_values[dataset_name] = st.number_input(f"Lag ({dataset_name})", min_value=1, max_value=max_correlation_lag(dataset.n_rows),
+                                                               value=min(50, max_correlation_lag(dataset.n_rows)), step=1, key=f"lag_{i}")
+
+        plotted = []
+        for dataset_name in selected_datasets:
+            if y_axis_1[dataset_name] is None:
+                st.warning(f"⚠️ No numerical variables found in the dataset {dataset_name}.")
+            else:
+                plotted.append(dataset_name)
+
+        # Creazione del grafico
+        def build_autocorrelation():
             fig = go.Figure()
-            y_axis_1, y_axis_2, plot_types, max_lag_values = {}, {}, {}, {}
-    
-            # UI con 4 colonne: Y1, Y2 (opzionale), tipo di grafico, lag
-            col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
-    
-            with col1:
-                for i, dataset_name in enumerate(selected_datasets):
-                    df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                    y_axis_1[dataset_name] = st.selectbox(f"Primary Y Axis ({dataset_name})", df.columns.tolist(), key=f"y_axis1_{i}")
-    
-            with col2:
-                for i, dataset_name in enumerate(selected_datasets):
-                    df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                    y_axis_2[dataset_name] = st.selectbox(f"Secondary Y Axis (opzionale) ({dataset_name})", ["None"] + df.columns.tolist(), key=f"y_axis2_{i}")
-    
-            with col3:
-                for i, dataset_name in enumerate(selected_datasets):
-                    plot_types[dataset_name] = st.selectbox(f"Plot Type ({dataset_name})", ["Basic Scatter", "Basic Bar", "Basic Line", "Mixed Line and Bar", 
-                                         "Calendar Heatmap", "DataZoom"], key=f"plot_type_{i}")
-    
-            with col4:
-                for i, dataset_name in enumerate(selected_datasets):
-                    max_lag_values[dataset_name] = st.slider(f"Lag ({dataset_name})", min_value=1, max_value=100, value=50, key=f"lag_{i}")
-    
-            # Creazione del grafico
-            for dataset_name in selected_datasets:
-                df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                
-                # Prima variabile Y
-                lags, autocorr_values = compute_autocorrelation(df, y_axis_1[dataset_name], max_lag_values[dataset_name])
-                fig.add_trace(go.Scatter(
-                    x=lags, y=autocorr_values,
-                    mode="lines+markers" if plot_types[dataset_name] == "Scatter" else "lines",
-                    name=f"{dataset_name} - {y_axis_1[dataset_name]}",
-                    yaxis="y1"
-                ))
-    
-                # Seconda variabile Y (se selezionata)
+            points = [0, 0]  # Punti originali e disegnati, per l'indicatore di riduzione
+            for dataset_name in plotted:
+                dataset = datasets[filenames.index(dataset_name)]
+                df = dataset.df
+
+                # Prima e seconda variabile Y (se selezionata) in un solo passaggio FFT
+                columns = {"y1": y_axis_1[dataset_name]}
                 if y_axis_2[dataset_name] != "None":
-                    lags, autocorr_values = compute_autocorrelation(df, y_axis_2[dataset_name], max_lag_values[dataset_name])
-                    fig.add_trace(go.Scatter(
-                        x=lags, y=autocorr_values,
+                    columns["y2"] = y_axis_2[dataset_name]
+                results = compute_autocorrelation_batch(df, list(dict.fromkeys(columns.values())), max_lag_values[dataset_name])
+                if results is None:
+                    continue
+
+                for yaxis, column in columns.items():
+                    lags, autocorr_values, band = results[column]
+                    x_values, y_values = decimate_trace(lags, autocorr_values, points)
+                    fig.add_trace(scatter_trace(
+                        len(lags), render_mode,
+                        x=x_values, y=y_values,
                         mode="lines+markers" if plot_types[dataset_name] == "Scatter" else "lines",
-                        name=f"{dataset_name} - {y_axis_2[dataset_name]}",
-                        yaxis="y2"
+                        name=f"{dataset_name} - {column}",
+                        yaxis=yaxis
                     ))
-    
+                    # Bande di confidenza al 95%
+                    for bound in (band, -band):
+                        fig.add_trace(go.Scatter(
+                            x=[lags[0], lags[-1]], y=[bound, bound],
+                            mode="lines", line=dict(dash="dash", width=1, color="gray"),
+                            name=f"95% confidence ({dataset_name} - {column})",
+                            showlegend=bool(bound > 0), yaxis=yaxis
+                        ))
+
             # Layout con secondo asse Y
             fig.update_layout(
                 title="Autocorrelation for Multiple Datasets",
@@ -251,219 +414,246 @@ def Statistics_Data(df_list, filenames):
                 ),
                 legend=dict(title="Datasets")
             )
+            return fig, reduction_messages(points[0], points[1], chart_settings()[1])
+
+        autocorrelation_key = ("autocorrelation", tuple((datasets[filenames.index(name)].key, y_axis_1[name], y_axis_2[name],
+                                                         plot_types[name], max_lag_values[name]) for name in plotted),
+                               render_mode, chart_settings())
+        plotly_chart(cached_figure(autocorrelation_key, build_autocorrelation), use_container_width=True)
+
+@fragment
+def cross_correlation_view(datasets):
+    """Correlazione incrociata tra due variabili per dataset."""
+    filenames = [dataset.name for dataset in datasets]
+    st.subheader("🔀 Cross-Correlation Analysis")
     
-            st.plotly_chart(fig, use_container_width=True)
-    elif st.session_state["show_cross_correlation"]:
-        st.subheader("🔀 Cross-Correlation Analysis")
-        
-        selected_datasets = st.multiselect("Select datasets", filenames, default=filenames)
-    
-        if selected_datasets:
+    selected_datasets = st.multiselect("Select datasets", filenames, default=filenames)
+
+    if selected_datasets:
+        render_mode = render_mode_selector("cross_render_mode")
+        y_axis_1, y_axis_2, plot_types, max_lag_values = {}, {}, {}, {}
+
+        # UI con 4 colonne: Y1, Y2 (opzionale), tipo di grafico, lag
+        col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+
+        with col1:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                y_axis_1[dataset_name] = st.selectbox(f"Primary Y Axis ({dataset_name})", dataset.numeric_columns, key=f"y_axis1_{dataset_name}")
+
+        with col2:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                y_axis_2[dataset_name] = st.selectbox(f"Secondary Y Axis ({dataset_name})", dataset.numeric_columns, key=f"y_axis2_{dataset_name}")
+
+        with col3:
+            for i, dataset_name in enumerate(selected_datasets):
+                plot_types[dataset_name] = st.selectbox(f"Plot Type ({dataset_name})", ["Scatter", "Bar", "Line"], key=f"plot_type_{dataset_name}")
+
+        with col4:
+            for i, dataset_name in enumerate(selected_datasets):
+                dataset = datasets[filenames.index(dataset_name)]
+                max_lag_values[dataset_name] = st.number_input(f"Lag ({dataset_name})", min_value=1, max_value=max_correlation_lag(dataset.n_rows),
+                                                               value=min(50, max_correlation_lag(dataset.n_rows)), step=1, key=f"lag_{dataset_name}")
+
+        plotted = []
+        for dataset_name in selected_datasets:
+            if y_axis_1[dataset_name] is None or y_axis_2[dataset_name] is None:
+                st.warning(f"⚠️ No numerical variables found in the dataset {dataset_name}.")
+            else:
+                plotted.append(dataset_name)
+
+        # Iteriamo sui dataset selezionati
+        def build_cross_correlation():
             fig = go.Figure()
-            y_axis_1, y_axis_2, plot_types, max_lag_values = {}, {}, {}, {}
+            points = [0, 0]  # Punti originali e disegnati, per l'indicatore di riduzione
+            captions = []  # Picco di correlazione per dataset, mostrato sopra il grafico
+            for dataset_name in plotted:
+                dataset = datasets[filenames.index(dataset_name)]
+                df = dataset.df
+                var1 = y_axis_1[dataset_name]  # Ora è definito
+                var2 = y_axis_2[dataset_name]  # Ora è definito
+                max_lag = max_lag_values[dataset_name]
+
+                # Lag negativi e positivi in un solo passaggio FFT
+                results = compute_cross_correlation_batch(df, [(var1, var2)], max_lag)
+                if results:
+                    lags, cross_corr_values, peak_lag, peak_value = results[(var1, var2)]
+                    x_values, y_values = decimate_trace(lags, cross_corr_values, points)
+                    fig.add_trace(scatter_trace(len(lags), render_mode, x=x_values, y=y_values, mode="lines+markers",
+                                                name=f"{dataset_name}: {var1} vs {var2}"))
+                    if peak_lag > 0:
+                        leader = f"{var2} leads {var1}"
+                    elif peak_lag < 0:
+                        leader = f"{var1} leads {var2}"
+                    else:
+                        leader = "no lead"
+                    captions.append(("caption", f"**{dataset_name}**: peak correlation {peak_value:.3f} at lag {peak_lag} ({leader})"))
+
+            fig.update_layout(title="Cross-Correlation", xaxis_title="Lag (positive: secondary leads primary)", yaxis_title="Cross-Correlation Value")
+            return fig, captions + reduction_messages(points[0], points[1], chart_settings()[1])
+
+        cross_key = ("cross_correlation", tuple((datasets[filenames.index(name)].key, y_axis_1[name], y_axis_2[name],
+                                                 max_lag_values[name]) for name in plotted),
+                     render_mode, chart_settings())
+        plotly_chart(cached_figure(cross_key, build_cross_correlation), use_container_width=True)
+
+@fragment
+def distribution_view(datasets):
+    """Statistiche e aggregazioni per periodo di un dataset."""
+    filenames = [dataset.name for dataset in datasets]
+    st.subheader("Distribution Data")
+    # Controllo che filenames sia definito e non vuoto
+    if not filenames:
+        st.warning("⚠️ No datasets available. Please upload or load datasets first.")
+        st.stop()
     
-            # UI con 4 colonne: Y1, Y2 (opzionale), tipo di grafico, lag
-            col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+    # Usa session_state per mantenere lo stato dei dataset selezionati
+    if 'selected_distribution_datasets' not in st.session_state:
+        st.session_state.selected_distribution_datasets = []  # Imposta il valore iniziale come lista vuota
     
-            with col1:
-                for i, dataset_name in enumerate(selected_datasets):
-                    df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                    y_axis_1[dataset_name] = st.selectbox(f"Primary Y Axis ({dataset_name})", df.columns.tolist(), key=f"y_axis1_{dataset_name}")
+    # Seleziona un singolo dataset con selectbox
+    dataset_name = st.selectbox("Select a dataset and click again on Distribution Data botton", filenames, index=0 if len(filenames) > 0 else None)
     
-            with col2:
-                for i, dataset_name in enumerate(selected_datasets):
-                    df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                    y_axis_2[dataset_name] = st.selectbox(f"Secondary Y Axis ({dataset_name})", df.columns.tolist(), key=f"y_axis2_{dataset_name}")
+    # Se è stato selezionato un dataset
+    if dataset_name:
+        # Logica di visualizzazione dei dati
+        idx = filenames.index(dataset_name)
+        dataset = datasets[idx]
+        df = dataset.df  # Recupera il dataframe dal dataset
+        # (continua con la logica di visualizzazione del dataset)
     
-            with col3:
-                for i, dataset_name in enumerate(selected_datasets):
-                    plot_types[dataset_name] = st.selectbox(f"Plot Type ({dataset_name})", ["Scatter", "Bar", "Line"], key=f"plot_type_{dataset_name}")
+        st.subheader(f"**Dataset {idx + 1} - {dataset_name}**")
     
-            with col4:
-                for i, dataset_name in enumerate(selected_datasets):
-                    max_lag_values[dataset_name] = st.slider(f"Lag ({dataset_name})", min_value=1, max_value=100, value=50, key=f"lag_{dataset_name}")
+        # Controllo se il dataframe è vuoto
+        if df.empty:
+            st.warning(f"⚠️ No data available in the dataset {dataset_name}.")
+        else:
+            # Calcola le statistiche (una volta per dataset, poi dalla cache)
+            stats_df = dataset_statistics(dataset)
+            if stats_df.empty:
+                st.warning(f"⚠️ No data available for {dataset_name}")
+            else:
+                # Visualizza le statistiche in un'unica tabella
+                st.dataframe(stats_df, hide_index=True, use_container_width=True)
+                if (stats_df.get("Quantiles") == "approximate").any():
+                    st.caption("Median and quartiles are estimated on a uniform sample of the rows.")
+                st.markdown("---")
     
-            # Iteriamo sui dataset selezionati
-            for dataset_name in selected_datasets:
-                df = convert_unix_to_datetime(df_list[filenames.index(dataset_name)])
-                var1 = y_axis_1[dataset_name]  # Ora è definito
-                var2 = y_axis_2[dataset_name]  # Ora è definito
-                max_lag = max_lag_values[dataset_name]
+                # Selezione della colonna datetime
+                colonne_datetime = dataset.datetime_columns
     
-                lags, cross_corr_values = compute_cross_correlation(df, var1, var2, max_lag)
-                if lags:
-                    fig.add_trace(go.Scatter(x=lags, y=cross_corr_values, mode="lines+markers", name=f"{dataset_name}: {var1} vs {var2}"))
+                # Selezione delle variabili numeriche e categoriche
+                variabili_numeriche = dataset.numeric_columns
+                variabili_categoriche = dataset.categorical_columns
     
-            fig.update_layout(title="Cross-Correlation", xaxis_title="Lag", yaxis_title="Cross-Correlation Value")
-            st.plotly_chart(fig, use_container_width=True)
-    # Streamlit UI
-    # Sezione per Merge Datasets (UNICO GRAFICO)
-    elif st.session_state["show_distribution_data"]:    
-        st.subheader("Distribution Data")
-        # Controllo che filenames sia definito e non vuoto
-        if not filenames:
-            st.warning("⚠️ No datasets available. Please upload or load datasets first.")
-            st.stop()
-        
-        # Usa session_state per mantenere lo stato dei dataset selezionati
-        if 'selected_distribution_datasets' not in st.session_state:
-            st.session_state.selected_distribution_datasets = []  # Imposta il valore iniziale come lista vuota
-        
-        # Seleziona un singolo dataset con selectbox
-        dataset_name = st.selectbox("Select a dataset and click again on Distribution Data botton", filenames, index=0 if len(filenames) > 0 else None)
-        
-        # Se è stato selezionato un dataset
-        if dataset_name:
-            # Logica di visualizzazione dei dati
-            idx = filenames.index(dataset_name)
-            df = df_list[idx]  # Recupera il dataframe dalla lista
-            df = convert_unix_to_datetime(df)  # Converti la data solo una volta
-            # (continua con la logica di visualizzazione del dataset)
-        
-            st.subheader(f"**Dataset {idx + 1} - {dataset_name}**")
-        
-            # Controllo se il dataframe è vuoto
-            if df.empty:
-                st.warning(f"⚠️ No data available in the dataset {dataset_name}.")
-            else:
-                # Calcola le statistiche
-                stats_df = calcula_statistics(df)
-                if stats_df.empty:
-                    st.warning(f"⚠️ No data available for {dataset_name}")
-                else:
-                    # Visualizza le metriche statistiche
-                    col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
-                    for _, row in stats_df.iterrows():
-                        with col1:
-                            st.write(f"**Variable:** {row['Variable']}")
-                        with col2:
-                            st.metric(label="Counting", value=row.get('Counting', 'N/A'))
-                        if row.get('Sum', 'N/A') != 'N/A':
-                            with col3:
-                                st.metric(label="Sum", value=row['Sum'])
-                            with col4:
-                                st.metric(label="Mean", value=row['Mean'])
-                            with col5:
-                                st.metric(label="Minimum", value=row['Minimum'])
-                            with col6:
-                                st.metric(label="Max", value=row['Max'])
-                            with col7:
-                                st.metric(label="Median", value=row['Median'])
-                    st.markdown("---")
-        
-                    # Selezione della colonna datetime
-                    colonne_datetime = df.select_dtypes(include=['datetime64[ns]', 'datetime64[ns, UTC]']).columns
-        
-                    # Selezione delle variabili numeriche e categoriche
-                    variabili_numeriche = df.select_dtypes(include=['number']).columns
-                    variabili_categoriche = df.select_dtypes(include=['object']).columns
-        
-                    col1, col2, col3 = st.columns([1, 2, 2])
-        
-                    # Selezione della colonna datetime
-                    with col1:
-                        if len(colonne_datetime) > 0:
-                            colonna_data = st.selectbox(
-                                f"Select datetime for {dataset_name}",
-                                colonne_datetime,
-                                key=f"datetime_{dataset_name}_{idx}"
-                            )
-                        else:
-                            st.warning(f"⚠️ No datetime columns found in the dataset {dataset_name}.")
-                            colonna_data = None  # Se non ci sono colonne datetime, colonna_data è None
-        
-                    # Selezione variabili numeriche
-                    with col2:
-                        if len(variabili_numeriche) > 0:
-                            y_axis_num = st.selectbox(
-                                f"Select numerical variable for {dataset_name}",
-                                variabili_numeriche.tolist(),
-                                key=f"y_axis_num_{dataset_name}_{idx}"
-                            )
-                        else:
-                            st.warning(f"⚠️ No numerical variables found in the dataset {dataset_name}.")
-                            y_axis_num = None  # Se non ci sono variabili numeriche, y_axis_num è None
-        
-                    # Selezione variabili categoriche
-                    with col3:
-                        if len(variabili_categoriche) > 0:
-                            categoria_scelta = st.selectbox(
-                                f"Select categorical variable for {dataset_name}",
-                                variabili_categoriche.tolist(),
-                                key=f"var_cat_{dataset_name}_{idx}"
-                            )
-                        else:
-                            st.warning(f"⚠️ No categorical variables found in the dataset {dataset_name}.")
-                            categoria_scelta = None  # Se non ci sono variabili categoriche, categoria_scelta è None
-        
-                    # Verifica che siano stati selezionati sia una colonna datetime che una variabile numerica prima di chiamare la funzione aggrega_datos_time
-                    if colonna_data and y_axis_num:  # Verifica se entrambe le variabili sono definite
-                        aggregazioni = aggrega_datos_time(df, colonna_data, y_axis_num)
+                col1, col2, col3 = st.columns([1, 2, 2])
+    
+                # Selezione della colonna datetime
+                with col1:
+                    if len(colonne_datetime) > 0:
+                        colonna_data = st.selectbox(
+                            f"Select datetime for {dataset_name}",
+                            colonne_datetime,
+                            key=f"datetime_{dataset_name}_{idx}"
+                        )
                     else:
-                        st.warning("⚠️ Please select both a datetime column and a numerical variable.")
-                        aggregazioni = None  # Imposta aggregazioni a None se non è stato selezionato colonna_data o y_axis_num
-        
-                    # Grafico per i dati aggregati
-                    with col2:
-                        if aggregazioni:
-                            for periodo, agg_df in aggregazioni.items():
-                                if isinstance(agg_df, (pd.Series, pd.DataFrame)):
-                                    if not agg_df.empty:
-                                        if isinstance(agg_df, pd.Series):
-                                            agg_df = agg_df.reset_index()
-        
-                                        st.write(f"Data shape: {agg_df.shape}")
-        
-                                        if len(agg_df) > 1:
-                                            fig = px.bar(agg_df, x=agg_df.iloc[:, 0], y=agg_df.iloc[:, 1], title=f"{periodo} Aggregate")
-                                            st.plotly_chart(fig)
-                                        else:
-                                            st.warning(f"⚠️ No sufficient data to plot for {periodo}.")
+                        st.warning(f"⚠️ No datetime columns found in the dataset {dataset_name}.")
+                        colonna_data = None  # Se non ci sono colonne datetime, colonna_data è None
+                    # Riduzione applicata a ogni periodo (conteggio, media, massimo, percentili...)
+                    reducer_label = st.selectbox(
+                        "Aggregate by",
+                        list(AGGREGATION_REDUCERS.keys()),
+                        key=f"reducer_{dataset_name}_{idx}"
+                    )
+                    reducer = AGGREGATION_REDUCERS[reducer_label]
+    
+                # Selezione variabili numeriche
+                with col2:
+                    if len(variabili_numeriche) > 0:
+                        y_axis_num = st.selectbox(
+                            f"Select numerical variable for {dataset_name}",
+                            variabili_numeriche,
+                            key=f"y_axis_num_{dataset_name}_{idx}"
+                        )
+                    else:
+                        st.warning(f"⚠️ No numerical variables found in the dataset {dataset_name}.")
+                        y_axis_num = None  # Se non ci sono variabili numeriche, y_axis_num è None
+    
+                # Selezione variabili categoriche
+                with col3:
+                    if len(variabili_categoriche) > 0:
+                        categoria_scelta = st.selectbox(
+                            f"Select categorical variable for {dataset_name}",
+                            variabili_categoriche,
+                            key=f"var_cat_{dataset_name}_{idx}"
+                        )
+                    else:
+                        st.warning(f"⚠️ No categorical variables found in the dataset {dataset_name}.")
+                        categoria_scelta = None  # Se non ci sono variabili categoriche, categoria_scelta è None
+    
+                # Verifica che siano stati selezionati sia una colonna datetime che una variabile numerica prima di calcolare le aggregazioni
+                if colonna_data and y_axis_num:  # Verifica se entrambe le variabili sono definite
+                    aggregazioni = dataset_aggregations(dataset, colonna_data, y_axis_num, (reducer,))
+                else:
+                    st.warning("⚠️ Please select both a datetime column and a numerical variable.")
+                    aggregazioni = None  # Imposta aggregazioni a None se non è stato selezionato colonna_data o y_axis_num
+    
+                # Grafico per i dati aggregati
+                with col2:
+                    if aggregazioni:
+                        for periodo, agg_df in aggregazioni.items():
+                            if isinstance(agg_df, (pd.Series, pd.DataFrame)):
+                                if not agg_df.empty:
+                                    agg_df = agg_df[reducer].rename(reducer_label).reset_index()
+                                    if isinstance(agg_df[periodo].dtype, pd.CategoricalDtype):
+                                        agg_df[periodo] = agg_df[periodo].astype(str)
+    
+                                    st.write(f"Data shape: {agg_df.shape}")
+    
+                                    if len(agg_df) > 1:
+                                        distribution_key = ("distribution", dataset.key, colonna_data, y_axis_num, reducer, periodo)
+                                        fig = cached_figure(distribution_key, lambda: (
+                                            px.bar(agg_df, x=periodo, y=reducer_label, title=f"{periodo} {reducer_label} of {y_axis_num}"), []))
+                                        plotly_chart(fig)
                                     else:
-                                        st.warning(f"⚠️ No data to plot for {periodo}.")
-                        else:
-                            st.warning(f"⚠️ No aggregated data available.")
-    # Corretto l'indentazione del blocco PCA
+                                        st.warning(f"⚠️ No sufficient data to plot for {periodo}.")
+                                else:
+                                    st.warning(f"⚠️ No data to plot for {periodo}.")
+                    else:
+                        st.warning(f"⚠️ No aggregated data available.")
+
+@fragment
+def pca_view(datasets):
+    """Componenti principali di un dataset (o dei dati allineati nella vista Merge)."""
+    filenames = [dataset.name for dataset in datasets]
+    st.subheader("🔢 Principal Component Analysis (PCA)")
+    aligned_dataset = st.session_state.get("aligned_dataset")
+    pca_options = filenames + ([ALIGNED_DATASET_NAME] if aligned_dataset is not None else [])
+    selected_dataset = st.selectbox("Select dataset for PCA", pca_options)
     
-    if st.session_state["show_pca"]:        
-        st.subheader("🔢 Principal Component Analysis (PCA)")
-        selected_dataset = st.selectbox("Select dataset for PCA", filenames)
+    if selected_dataset:
+        dataset = aligned_dataset if selected_dataset == ALIGNED_DATASET_NAME else datasets[filenames.index(selected_dataset)]
+        max_components = min(len(dataset.numeric_columns), PCA_MAX_COMPONENTS)
+        if max_components > 2:
+            num_components = st.slider("Number of Principal Components", 2, max_components, 2)
+        else:
+            num_components = 2
+        pca_df, explained_variance = perform_pca(dataset, num_components, dataset.numeric_columns)
         
-        if selected_dataset:
-            df = df_list[filenames.index(selected_dataset)]
-            num_components = st.slider("Number of Principal Components", 2, min(len(df.columns), 10), 2)
-            pca_df, explained_variance = perform_pca(df, num_components)
+        if pca_df is not None:
+            st.write("### Principal Components Data")
+            st.dataframe(pca_df)
+            
+            st.write("### Explained Variance Ratio")
+            var_exp_df = pd.DataFrame({"Component": [f'PC{i+1}' for i in range(num_components)], "Variance Explained": explained_variance})
+            pca_key = (dataset.key, tuple(dataset.numeric_columns), num_components)
+            fig = cached_figure(("pca_variance",) + pca_key, lambda: (
+                px.bar(var_exp_df, x="Component", y="Variance Explained", title="Explained Variance by Principal Components"), []))
+            plotly_chart(fig)
             
-            if pca_df is not None:
-                st.write("### Principal Components Data")
-                st.dataframe(pca_df)
-                
-                st.write("### Explained Variance Ratio")
-                var_exp_df = pd.DataFrame({"Component": [f'PC{i+1}' for i in range(num_components)], "Variance Explained": explained_variance})
-                fig = px.bar(var_exp_df, x="Component", y="Variance Explained", title="Explained Variance by Principal Components")
-                st.plotly_chart(fig)
-                
-                if num_components >= 3:
-                    st.write("### Principal Component Analysis (PCA) - Breakdown")
-                    
-                    # Creazione della figura con tre sottotrame affiancate
-                    fig_pca, axes = plt.subplots(1, 3, figsize=(18, 5))
-                
-                    # 1. Varianza spiegata per componente
-                    sns.barplot(x=[f'PC{i+1}' for i in range(num_components)], y=explained_variance, ax=axes[0])
-                    axes[0].set_title("Explained Variance by Component")
-                    axes[0].set_ylabel("Variance Explained")
-                    axes[0].set_xticklabels([f'PC{i+1}' for i in range(num_components)], rotation=45)
-                
-                    # 2. Serie temporali delle prime tre componenti principali
-                    pca_df.iloc[:, :3].plot(ax=axes[1])
-                    axes[1].set_title("Top 3 Principal Components over Time")
-                    axes[1].set_ylabel("Component Value")
-                
-                    # 3. Scatter plot delle prime due componenti principali
-                    axes[2].scatter(pca_df.iloc[:, 0], pca_df.iloc[:, 1])
-                    axes[2].set_title("Scatter Plot of First Two Principal Components")
-                    axes[2].set_xlabel("PC1")
-                    axes[2].set_ylabel("PC2")
-                
-                    st.pyplot(fig_pca)
+            if num_components >= 3:
+                st.write("### Principal Component Analysis (PCA) - Breakdown")
+                # Immagine matplotlib renderizzata una volta per dataset e numero di componenti
+                st.image(get_cache("figures").get_or_compute(
+                    ("pca_breakdown",) + pca_key, lambda: pca_breakdown_png(pca_df, explained_variance, num_components)), use_column_width=True)
@@ -1,15 +1,173 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from script_app.load_plotting_utils.plotting import create_and_render_plot
-from script_app.load_plotting_utils.load import load_file, process_file
+from script_app.load_plotting_utils.cache import get_cache
+from script_app.load_plotting_utils.dataset import build_dataset
+from script_app.load_plotting_utils.plotting import plotly_chart, cached_figure, datetime_to_ms
+from script_app.load_plotting_utils.profiling import profiled, fragment, fragment_rerun
+from script_app.load_plotting_utils.spatial import (coordinates, grid_bins, grid_cell_size, build_spatial_index, query_bbox,
+                                                    union_bounds, extent_view, MAP_POINT_BUDGET, KM_PER_DEGREE)
 
-def map_combined_datasets(dataframes, filenames=None):
+# 🔹 Colonne mostrate di default nel popup (oltre alle coordinate)
+HOVER_DEFAULT_COLUMNS = 6
+MAP_MODES = ["Auto", "Markers", "Grid bins"]
+MAP_HEIGHT_PX = 800
+AREA_STATE = "map_area"  # Rettangolo (lat_min, lat_max, lon_min, lon_max) selezionato sulla mappa
+APPLIED_AREA_STATE = "_statistics_area"  # Selezione usata dalle statistiche nell'ultimo rerun completo
+AREA_SUBSETS_STATE = "_area_subsets"  # Ultimo sottoinsieme per dataset: {chiave del dataset: Dataset}
+
+@profiled
+def dataset_spatial_index(dataset, lat_col, lon_col):
+    """Indice spaziale sulle colonne scelte: quello del Dataset se sono le rilevate, altrimenti costruito una volta."""
+    index = dataset.spatial_index
+    if index is not None and (index.lat_column, index.lon_column) == (lat_col, lon_col):
+        return index
+    key = (dataset.key, lat_col, lon_col)
+    return get_cache("spatial_index").get_or_compute(key, lambda: build_spatial_index(dataset.df, lat_col, lon_col))
+
+@profiled
+def area_positions(dataset, index, area=None):
+    """Righe con coordinate nell'area (tutte quelle valide se `area` è None), estratte dall'indice."""
+    bounds = area or index.bounds
+    key = (dataset.key, index.lat_column, index.lon_column, bounds)
+    return get_cache("area_positions").get_or_compute(key, lambda: query_bbox(index, *bounds))
+
+def selection_area(points):
+    """Rettangolo che contiene i punti selezionati sulla mappa (box o lazo), None se non ce ne sono."""
+    coords = [(point["lat"], point["lon"]) for point in points if "lat" in point and "lon" in point]
+    if not coords:
+        return None
+    lat, lon = zip(*coords)
+    return (min(lat), max(lat), min(lon), max(lon))
+
+def _on_map_select():
+    """Salva l'area selezionata prima del rerun, così la vedono anche le statistiche."""
+    area = selection_area(st.session_state["map_chart"]["selection"]["points"])
+    if area is not None:
+        st.session_state[AREA_STATE] = area
+
+def _clear_area():
+    st.session_state.pop(AREA_STATE, None)
+
+def area_selection(datasets):
+    """Area selezionata e colonne di coordinate scelte sulla mappa: ciò da cui dipende `area_datasets`."""
+    area = st.session_state.get(AREA_STATE)
+    if area is None:
+        return None
+    return area, tuple((st.session_state.get(f"lat_{i}"), st.session_state.get(f"lon_{i}")) for i in range(len(datasets)))
+
+def describe_area(area):
+    return f"lat {area[0]:.4f} – {area[1]:.4f}, lon {area[2]:.4f} – {area[3]:.4f}"
+
+@profiled
+def area_datasets(datasets):
+    """Dataset ristretti all'area selezionata sulla mappa, per le viste statistiche.
+
+    Senza selezione restituisce i dataset invariati; quelli senza coordinate non sono filtrati.
+    I sottoinsiemi sono estratti con l'indice spaziale; la sessione conserva solo quello dell'area
+    corrente per ogni dataset, così la memoria non cresce con le aree disegnate.
     """
-    Mappa più dataset con coordinate e popups, centrando la mappa sui dati caricati o sull'Italia di default.
+    st.session_state[APPLIED_AREA_STATE] = area_selection(datasets)
+    area = st.session_state.get(AREA_STATE)
+    if area is None:
+        st.session_state.pop(AREA_SUBSETS_STATE, None)
+        return datasets
+
+    previous = st.session_state.get(AREA_SUBSETS_STATE, {})
+    subsets = {}
+    selected = []
+    for i, dataset in enumerate(datasets):
+        lat_col = st.session_state.get(f"lat_{i}", dataset.lat_column)  # Colonne scelte nella vista mappa
+        lon_col = st.session_state.get(f"lon_{i}", dataset.lon_column)
+        index = dataset_spatial_index(dataset, lat_col, lon_col) if lat_col and lon_col else None
+        if index is None:
+            selected.append(dataset)
+            continue
+
+        rows = area_positions(dataset, index, area)
+        if not len(rows):
+            st.warning(f"⚠ '{dataset.name}' has no points in the selected map area.")
+            continue
+        key = (dataset.key, lat_col, lon_col, area)
+        subset = previous.get(dataset.key)
+        if subset is None or subset.key != key:
+            subset = build_dataset(dataset.df.iloc[rows].reset_index(drop=True), dataset.name, key)
+        subsets[dataset.key] = subset
+        selected.append(subset)
+    st.session_state[AREA_SUBSETS_STATE] = subsets
+
+    col1, col2 = st.columns([5, 1])
+    col1.info(f"📍 Statistics restricted to the map selection ({describe_area(area)}): "
+              + ", ".join(f"**{dataset.name}** {dataset.n_rows:,} rows" for dataset in selected))
+    col2.button("Clear selection", key="clear_area_statistics", on_click=_clear_area)
+    return selected
+
+def hover_template(filename, lat_col, lon_col, hover_columns, float_columns=(), date_columns=()):
+    """Template del popup: i valori sono letti da `customdata` nel browser, nessun testo per riga lato server."""
+    formats = {col: ":.6~g" for col in float_columns}  # float32 senza cifre spurie
+    formats.update({col: "|%Y-%m-%d %H:%M:%S" for col in date_columns})
+    lines = [f"<b>{filename}</b>", f"<b>{lat_col}</b>: %{{lat}}", f"<b>{lon_col}</b>: %{{lon}}"]
+    lines += [f"<b>{col}</b>: %{{customdata[{j}]{formats.get(col, '')}}}" for j, col in enumerate(hover_columns)]
+    return "<br>".join(lines) + "<extra></extra>"
+
+def hover_customdata(df, hover_columns):
+    """Valori del popup: matrice float (serializzata in binario) se le colonne sono numeriche o date, altrimenti oggetti.
+
+    Le date diventano millisecondi, formattati come date dal template del popup.
     """
-    if filenames is None:
-        filenames = [f"Dataset {i+1}" for i in range(len(dataframes))]
+    if not hover_columns:
+        return None
+    frame = df[hover_columns]
+    if not all(pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_dtype(dtype) for dtype in frame.dtypes):
+        return frame
+    return np.column_stack([
+        datetime_to_ms(frame[col].to_numpy()) if pd.api.types.is_datetime64_dtype(frame[col].dtype)
+        else frame[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        for col in hover_columns
+    ])
+
+@profiled
+def map_bins(dataset, index, rows, value_col, zoom, area=None):
+    """Celle della griglia per le righe dell'area al livello di zoom dato, calcolate una volta e riusate."""
+    def _compute():
+        lat, lon, _ = coordinates(dataset.df.iloc[rows], index.lat_column, index.lon_column)
+        values = dataset.df[value_col].to_numpy(dtype=np.float64, na_value=np.nan)[rows] if value_col else None
+        return grid_bins(lat, lon, values, grid_cell_size(zoom))
+
+    key = (dataset.key, index.lat_column, index.lon_column, value_col, zoom, area)
+    return get_cache("map_bins").get_or_compute(key, _compute)
+
+def bins_trace(bins, filename, color, value_col, index=0):
+    """Traccia delle celle: dimensione secondo il numero di punti, colore secondo la media della variabile."""
+    sizes = 6 + 24 * np.sqrt(bins["count"] / bins["count"].max())
+    if value_col:
+        marker = dict(size=sizes, color=bins["mean"], colorscale="Viridis", showscale=True,
+                      colorbar=dict(title=value_col, x=1.0 + 0.12 * index), opacity=0.8)  # Una scala per dataset, affiancate
+        customdata = bins[["count", "mean", "min", "max"]]
+        hover = (f"<b>{filename}</b><br>Points: %{{customdata[0]:,}}<br>{value_col} mean: %{{customdata[1]:.4~g}}"
+                 f"<br>min: %{{customdata[2]:.4~g}} · max: %{{customdata[3]:.4~g}}<extra></extra>")
+    else:
+        marker = dict(size=sizes, color=color, opacity=0.6)
+        customdata = bins[["count"]]
+        hover = f"<b>{filename}</b><br>Points: %{{customdata[0]:,}}<extra></extra>"
+    return go.Scattermapbox(lat=bins["lat"], lon=bins["lon"], mode="markers", marker=marker,
+                            name=f"{filename} (binned)", customdata=customdata, hovertemplate=hover)
+
+@fragment
+def map_combined_datasets(datasets):
+    """
+    Mappa più dataset con coordinate e popups, inquadrando l'estensione dei dati o l'area selezionata.
+    Le colonne di coordinate sono quelle rilevate al caricamento (`Dataset.lat_column` / `lon_column`).
+    Un box o un lazo disegnato sulla mappa seleziona un'area: solo i punti al suo interno sono
+    disegnati e le viste statistiche usano lo stesso sottoinsieme (vedi `area_datasets`).
+    La mappa è un frammento: zoom, modalità e colonne la rieseguono da sola, mentre una nuova
+    area riesegue tutta la pagina perché cambia anche le statistiche.
+    """
+    if fragment_rerun() and area_selection(datasets) != st.session_state.get(APPLIED_AREA_STATE):
+        st.rerun()
+    dataframes = [dataset.df for dataset in datasets]
+    filenames = [dataset.name for dataset in datasets]
 
     if not dataframes:
         st.error("❌ No available datasets.")
@@ -17,77 +175,97 @@ def map_combined_datasets(dataframes, filenames=None):
 
     col1, col2 = st.columns([5, 1])
     colors = ["red", "blue", "green", "purple", "orange", "pink"]
-    
-    default_center = {"lat": 41.8719, "lon": 12.5674}  # Centro Italia
-
-    coordinate_keywords = {
-        "lat": ["lat", "latitude", "y", "_latitude"],  # parole chiave per latitudine
-        "lon": ["lon", "longitude", "x", "_longitude"]  # parole chiave per longitudine
-    }
+    area = st.session_state.get(AREA_STATE)
 
     with col2:
         st.subheader("📂 Datasets")
-        lat_columns = []
-        lon_columns = []
+        map_mode = st.selectbox("Map mode", MAP_MODES, key="map_mode",
+                                help=f"Auto shows raw markers up to {MAP_POINT_BUDGET:,} points per dataset and grid cells above.")
+        zoom_choice = st.select_slider("Zoom", ["Auto"] + list(range(1, 16)), value="Auto", key="map_zoom",
+                                       help="Auto frames the data extent (or the selected area); grid cells get smaller as the zoom grows.")
+        if area is None:
+            st.caption("Draw a box or lasso on the map to select an area.")
+        else:
+            st.caption(f"📍 Selected area: {describe_area(area)}")
+            st.button("Clear selection", key="clear_area_map", on_click=_clear_area)
+        lat_columns = {}
+        lon_columns = {}
+        hover_columns = {}
+        value_columns = {}
         
-        for i, df in enumerate(dataframes):
-            if df is None or df.empty:
+        for i, dataset in enumerate(datasets):
+            if dataset.n_rows == 0:
                 st.warning(f"⚠ Dataset '{filenames[i]}' is empty.")
                 continue
 
-            # Convertiamo tutto in minuscolo per ignorare maiuscole/minuscole
-            df.columns = df.columns.str.strip().str.lower()
-
-            detected_lat_col = None
-            detected_lon_col = None
-
-            # Cerchiamo colonne contenenti "lat" e "lon"
-            for col in df.columns:
-                if any(keyword in col for keyword in coordinate_keywords["lat"]):
-                    detected_lat_col = col
-                if any(keyword in col for keyword in coordinate_keywords["lon"]):
-                    detected_lon_col = col
-
-            if detected_lat_col is None or detected_lon_col is None:
+            if not dataset.has_coordinates:
                 st.warning(f"⚠ Dataset '{filenames[i]}' hasn't lat and lon.")
                 continue
 
             with st.expander(f"File: {filenames[i]}"):
-                lat_col = st.selectbox(f"Select latitude", df.columns, index=df.columns.get_loc(detected_lat_col), key=f"lat_{i}")
-                lon_col = st.selectbox(f"Select longitude", df.columns, index=df.columns.get_loc(detected_lon_col), key=f"lon_{i}")
+                lat_col = st.selectbox(f"Select latitude", dataset.columns, index=dataset.columns.index(dataset.lat_column), key=f"lat_{i}")
+                lon_col = st.selectbox(f"Select longitude", dataset.columns, index=dataset.columns.index(dataset.lon_column), key=f"lon_{i}")
+                other_columns = [col for col in dataset.columns if col not in (lat_col, lon_col)]
+                hover_cols = st.multiselect("Popup columns", other_columns, default=other_columns[:HOVER_DEFAULT_COLUMNS], key=f"hover_{i}")
+                value_options = [col for col in dataset.numeric_columns if col not in (lat_col, lon_col)]
+                value_col = st.selectbox("Grid cell value", [None] + value_options, key=f"bin_value_{i}",
+                                         format_func=lambda col: "Point count" if col is None else col)
             
-            lat_columns.append(lat_col)
-            lon_columns.append(lon_col)
+            lat_columns[i] = lat_col
+            lon_columns[i] = lon_col
+            hover_columns[i] = hover_cols
+            value_columns[i] = value_col
     
     with col1:
         st.subheader("🗺 Data Mapping")
-        fig = go.Figure()
-        all_latitudes = []
-        all_longitudes = []
-        first_valid_center = None  
-
-        for i, (df, filename) in enumerate(zip(dataframes, filenames)):
-            try:
-                lat_col = lat_columns[i]
-                lon_col = lon_columns[i]
-
-                if lat_col and lon_col and lat_col in df.columns and lon_col in df.columns:
-                    df_map = df.dropna(subset=[lat_col, lon_col]).copy()
-                    df_map["lat"] = pd.to_numeric(df_map[lat_col], errors="coerce")
-                    df_map["lon"] = pd.to_numeric(df_map[lon_col], errors="coerce")
-                    df_map = df_map.dropna()
-
-                    if df_map.empty:
-                        st.warning(f"⚠ '{filename}' no valid data after cleaning.")
-                        continue
+        # Indici spaziali dei dataset con coordinate valide: l'inquadratura segue l'estensione dei dati o l'area
+        indexes = {}
+        for i, dataset in enumerate(datasets):
+            if i in lat_columns:
+                index = dataset_spatial_index(dataset, lat_columns[i], lon_columns[i])
+                if index is None:
+                    st.warning(f"⚠ '{filenames[i]}' no valid data after cleaning.")
+                    continue
+                indexes[i] = index
+
+        if not indexes:
+            st.warning("❌ No valid data to display the map.")
+            return
 
-                    all_latitudes.extend(df_map["lat"].tolist())
-                    all_longitudes.extend(df_map["lon"].tolist())
+        bounds = area or union_bounds(index.bounds for index in indexes.values())
+        center, auto_zoom = extent_view(bounds, height_px=MAP_HEIGHT_PX)
+        zoom = auto_zoom if zoom_choice == "Auto" else zoom_choice
 
-                    if first_valid_center is None and not df_map.empty:
-                        first_valid_center = {"lat": df_map["lat"].iloc[0], "lon": df_map["lon"].iloc[0]}
+        def build_map():
+            fig = go.Figure()
+            messages = []  # Avvisi e didascalie per dataset, mostrati sopra la mappa
+            has_points = False
 
-                    popup_info = df_map.apply(lambda row: "<br>".join([f"<b>{col}</b>: {row[col]}" for col in df.columns]), axis=1)
+            for i, index in indexes.items():
+                dataset, df, filename = datasets[i], dataframes[i], filenames[i]
+                try:
+                    lat_col, lon_col = index.lat_column, index.lon_column
+                    rows = area_positions(dataset, index, area)  # Solo i punti nell'area, senza scorrere il dataset
+                    n_valid = len(rows)
+
+                    if n_valid == 0:
+                        messages.append(("warning", f"⚠ '{filename}' has no points in the selected area."))
+                        continue
+                    has_points = True
+
+                    # Oltre il budget (o su richiesta) i punti sono aggregati in celle lato server
+                    if map_mode == "Grid bins" or (map_mode == "Auto" and n_valid > MAP_POINT_BUDGET):
+                        bins, cell_size = map_bins(dataset, index, rows, value_columns.get(i), zoom, area)
+                        fig.add_trace(bins_trace(bins, filename, colors[i % len(colors)], value_columns.get(i), i))
+                        messages.append(("caption", f"🔷 **{filename}**: {n_valid:,} points in {len(bins):,} grid cells "
+                                                    f"of ~{cell_size * KM_PER_DEGREE:.2f} km"))
+                        continue
+
+                    # Solo coordinate e colonne del popup delle righe nell'area
+                    hover_cols = [col for col in hover_columns.get(i, []) if col in df.columns]
+                    df_area = df.iloc[rows]
+                    lat, lon, _ = coordinates(df_area, lat_col, lon_col)
+                    df_map = df_area[hover_cols].assign(lat=lat, lon=lon)
 
                     fig.add_trace(go.Scattermapbox(
                         lat=df_map["lat"],
@@ -95,30 +273,38 @@ def map_combined_datasets(dataframes, filenames=None):
                         mode="markers",
                         marker=dict(size=15, color=colors[i % len(colors)]),
                         name=filename,
-                        hoverinfo="text",
-                        text=popup_info
+                        customdata=hover_customdata(df_map, hover_cols),
+                        hovertemplate=hover_template(filename, lat_col, lon_col, hover_cols,
+                                                     df_map.select_dtypes(include="floating").columns,
+                                                     df_map.select_dtypes(include="datetime").columns)
                     ))
-            
-            except Exception as e:
-                st.warning(f"⚠ Error '{filename}': {e}")
 
-        if not all_latitudes or not all_longitudes:
-            st.warning("❌ No valid data to display the map.")
+                except Exception as e:
+                    messages.append(("warning", f"⚠ Error '{filename}': {e}"))
+
+            if not has_points:
+                return None, messages + [("warning", "❌ No valid data to display the map.")]
+
+            fig.update_layout(
+                autosize=True,
+                mapbox=dict(
+                    style="open-street-map",
+                    center=center,
+                    zoom=zoom
+                ),
+                legend=dict(title="Legenda", x=1.05, y=0.9),
+                height=MAP_HEIGHT_PX,
+                margin={"r":0,"t":0,"l":0,"b":0}
+            )
+            return fig, messages
+
+        # Figura riusata finché dataset, colonne, modalità, zoom e area non cambiano
+        map_key = ("map", tuple((i, datasets[i].key, index.lat_column, index.lon_column, tuple(hover_columns.get(i, [])),
+                                 value_columns.get(i)) for i, index in indexes.items()), map_mode, zoom, area)
+        fig = cached_figure(map_key, build_map)
+        if fig is None:
             return
 
-        center_lat = first_valid_center["lat"] if first_valid_center else default_center["lat"]
-        center_lon = first_valid_center["lon"] if first_valid_center else default_center["lon"]
-
-        fig.update_layout(
-            autosize=True,
-            mapbox=dict(
-                style="open-street-map",
-                center=dict(lat=center_lat, lon=center_lon),
-                zoom=5
-            ),
-            legend=dict(title="Legenda", x=1.05, y=0.9),
-            height=800,
-            margin={"r":0,"t":0,"l":0,"b":0}
-        )
-
-        st.plotly_chart(fig, use_container_width=True)
+        # Box e lazo selezionano un'area: la callback la salva prima del rerun
+        plotly_chart(fig, use_container_width=True, key="map_chart", on_select=_on_map_select,
+                        selection_mode=("box", "lasso"))
@@ -66,7 +66,9 @@ def main():
             st.write("""The column separators must be unique, or all commas, or all spaces, or all semicolons. If the column separators are not the same, 
                     the application may read the data incorrectly and not display it correctly in charts, tables and maps.""")
             st.caption("Datatime")
-            st.write("""If the date format is present, the following formats are read: Unixtime, YYYY-MM-DD and is translated to DD-MM-YYYY.""")
+            st.write("""If the date format is present, the following formats are read: Unixtime (seconds or milliseconds), YYYYMMDD, 
+                    ISO (YYYY-MM-DD, optionally with time), day first (DD/MM/YYYY, DD-MM-YYYY, DD.MM.YYYY, optionally with time) and YYYY/MM/DD. 
+                    Dates are detected once when the file is loaded.""")
             st.caption("Coordinates")
             st.write("""The existing coordinates are preferred in the case studies: latitude, longitude, lat, long, x and y. 
                     However, the system also reads if there is a different formulation with the words "lat" or "lon" within the data frame. 
@@ -75,5 +77,9 @@ def main():
             st.subheader("Contact Us")
             st.write("""Information about how to contact the team or get support. Rachele Franceschini : rfranceschini@ogs.it""")
             st.markdown("For more details about ITINERIS project, click on link -> **[ITINERIS](https://itineris.d4science.org/)**")
+        # Misure delle chiamate della dashboard in questa sessione
+        with st.expander("🩺 Diagnostics"):
+            from script_app.diagnostics import diagnostics_panel
+            diagnostics_panel()
 if __name__ == "__main__":
     main()
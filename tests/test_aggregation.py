@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from script_app.load_plotting_utils.pyramid import build_pyramid
+from script_app.load_plotting_utils.utils import aggrega_datos_time
+
+def _frame():
+    n = 60_000
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"time": pd.date_range("2020-11-15", periods=n, freq="10min"),
+                       "rain": rng.gamma(0.5, 2.0, size=n)})
+    df.loc[rng.choice(n, 500, replace=False), "rain"] = np.nan
+    return df
+
+def test_pyramid_gives_the_same_aggregations_as_the_raw_rows():
+    df = _frame()
+    pyramid = build_pyramid(df, "time", ["rain"])
+    assert pyramid.coarsest == "month"
+    reducers = ("count", "mean", "max", "min", "sum")
+
+    raw = aggrega_datos_time(df, "time", "rain", reducers)
+    from_pyramid = aggrega_datos_time(df, "time", "rain", reducers, pyramid)
+    assert list(raw) == ["Annually", "Six-monthly", "Monthly", "Seasonality"]
+    for periodo in raw:
+        pd.testing.assert_frame_equal(from_pyramid[periodo], raw[periodo], check_exact=False, rtol=1e-9)
+
+def test_monthly_values_match_a_plain_groupby():
+    df = _frame()
+    monthly = aggrega_datos_time(df, "time", "rain", ("count", "sum", "mean"), build_pyramid(df, "time", ["rain"]))["Monthly"]
+    grouped = df.groupby(df["time"].dt.to_period("M"))["rain"]
+
+    assert monthly["count"].tolist() == grouped.size().tolist()
+    np.testing.assert_allclose(monthly["sum"], grouped.sum())
+    np.testing.assert_allclose(monthly["mean"], grouped.mean())
+
+def test_percentiles_fall_back_to_the_raw_rows():
+    df = _frame()
+    result = aggrega_datos_time(df, "time", "rain", ("count", 0.5), build_pyramid(df, "time", ["rain"]))["Annually"]
+    expected = df.groupby(df["time"].dt.year)["rain"].median()
+    np.testing.assert_allclose(result[0.5], expected)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from script_app.load_plotting_utils.dataset import build_dataset
+from script_app.load_plotting_utils.utils import align_datasets
+
+def _frame(start, values, freq="1h"):
+    return pd.DataFrame({"time": pd.date_range(start, periods=len(values), freq=freq), "value": values})
+
+def test_nearest_takes_the_closest_row_of_the_other_dataset():
+    first = build_dataset(_frame("2020-01-01 00:00", [1.0, 2.0, 3.0]), "a.csv", ("a",))
+    second = build_dataset(_frame("2020-01-01 00:20", [10.0, 20.0, 30.0]), "b.csv", ("b",))
+
+    aligned = align_datasets([first, second], {"a.csv": ["value"], "b.csv": ["value"]}, "nearest")
+    assert list(aligned.columns) == ["a.csv: value", "b.csv: value"]
+    assert aligned["b.csv: value"].tolist() == [10.0, 20.0, 30.0]
+
+def test_unsorted_dataset_is_aligned_in_time_order():
+    frame = _frame("2020-01-01", [1.0, 2.0, 3.0, 4.0]).iloc[[2, 0, 3, 1]].reset_index(drop=True)
+    first = build_dataset(frame, "a.csv", ("unsorted",))
+    second = build_dataset(_frame("2020-01-01", [5.0, 6.0, 7.0, 8.0]), "b.csv", ("sorted",))
+
+    aligned = align_datasets([first, second], {"a.csv": ["value"], "b.csv": ["value"]}, "backward")
+    assert aligned.index.is_monotonic_increasing
+    assert aligned["a.csv: value"].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert aligned["b.csv: value"].tolist() == [5.0, 6.0, 7.0, 8.0]
+
+def test_resample_averages_on_a_common_grid():
+    first = build_dataset(_frame("2020-01-01", [1.0, 3.0, 5.0, 7.0], "30min"), "a.csv", ("a30",))
+    second = build_dataset(_frame("2020-01-01", [2.0, 4.0]), "b.csv", ("b60",))
+
+    aligned = align_datasets([first, second], {"a.csv": ["value"], "b.csv": ["value"]}, "resample", freq="1h")
+    assert aligned["a.csv: value"].tolist() == [2.0, 6.0]
+    assert aligned["b.csv: value"].tolist() == [2.0, 4.0]
+
+def test_same_content_under_another_name_gets_its_own_columns():
+    values = np.arange(3, dtype=float)
+    first = build_dataset(_frame("2020-01-01", values), "a.csv", ("same",))
+    second = build_dataset(_frame("2020-01-01", values), "b.csv", ("other",))
+    align_datasets([first, second], {"a.csv": ["value"], "b.csv": ["value"]}, "nearest")
+
+    renamed = build_dataset(first.df, "renamed.csv", ("same",))
+    aligned = align_datasets([renamed, second], {"renamed.csv": ["value"], "b.csv": ["value"]}, "nearest")
+    assert list(aligned.columns) == ["renamed.csv: value", "b.csv: value"]
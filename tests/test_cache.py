@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pytest
+import pandas as pd
+
+from script_app.load_plotting_utils import cache as disk_cache
+from script_app.load_plotting_utils.cache import MemoryCache, get_cache
+from script_app.load_plotting_utils.dataset import build_dataset, dataset_pyramid
+
+def test_least_recently_used_entries_are_evicted_over_budget():
+    cache = MemoryCache("test", 100, getsizeof=len)
+    cache.get_or_compute("a", lambda: "x" * 40)
+    cache.get_or_compute("b", lambda: "x" * 40)
+    cache.get_or_compute("a", lambda: None)  # "a" diventa la più recente
+    cache.get_or_compute("c", lambda: "x" * 40)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def test_value_larger_than_the_budget_is_returned_but_not_stored():
+    cache = MemoryCache("test", 10, getsizeof=len)
+    assert cache.get_or_compute("big", lambda: "x" * 20) == "x" * 20
+    assert "big" not in cache
+
+def test_resize_accounts_for_values_grown_in_place():
+    cache = MemoryCache("test", 100, getsizeof=len)
+    cache.get_or_compute("a", lambda: ["x"] * 30)
+    grown = cache.get_or_compute("b", lambda: ["x"] * 30)
+    grown.extend(["x"] * 40)
+    cache.resize("b")
+
+    assert cache.stats()["entries"] == 1 and "b" in cache
+    grown.extend(["x"] * 40)
+    cache.resize("b")
+    assert "b" not in cache
+
+def test_pyramid_columns_count_against_the_datasets_budget():
+    n = 20_000
+    df = pd.DataFrame({"time": pd.date_range("2020-01-01", periods=n, freq="1min"),
+                       "a": np.random.default_rng(0).normal(size=n), "b": np.arange(n, dtype=float)})
+    key = ("test_pyramid_budget",)
+    cache = get_cache("datasets")
+    dataset = cache.get_or_compute(key, lambda: build_dataset(df, "pyramid.csv", key))
+    before, empty = cache.stats()["used_mb"], dataset.pyramid.nbytes
+
+    dataset_pyramid(dataset, "time", ["a", "b"])
+    assert dataset.pyramid.nbytes > empty
+    assert cache.stats()["used_mb"] - before == pytest.approx((dataset.pyramid.nbytes - empty) / 1024 ** 2)
+
+def test_disk_cache_round_trip_keeps_values_and_types(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "DISK_CACHE_DIR", str(tmp_path))
+    df = pd.DataFrame({
+        "time": pd.date_range("2020-01-01", periods=4, freq="h", tz="UTC"),
+        "level": np.array([1.5, np.nan, 2.5, 3.5], dtype=np.float32),
+        "count": np.array([1, 2, 3, 4], dtype=np.int16),
+        "station": pd.Categorical(["A", "B", "A", "B"]),
+        "note": ["x", None, "y", "z"],
+    })
+    disk_cache.write_disk_cache(("round_trip",), df)
+    assert disk_cache.disk_cache_path(("round_trip",)).startswith(str(tmp_path))
+
+    pd.testing.assert_frame_equal(disk_cache.read_disk_cache(("round_trip",)), df)
+    assert disk_cache.read_disk_cache(("missing",)) is None
+
+def test_corrupted_disk_cache_file_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "DISK_CACHE_DIR", str(tmp_path))
+    path = disk_cache.disk_cache_path(("corrupted",))
+    with open(path, "wb") as handle:
+        handle.write(b"not arrow")
+    assert disk_cache.read_disk_cache(("corrupted",)) is None
+
+def test_prune_removes_least_recently_used_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "DISK_CACHE_DIR", str(tmp_path))
+    df = pd.DataFrame({"value": np.arange(1000, dtype=np.float64)})
+    for key in ("old", "new"):
+        disk_cache.write_disk_cache((key,), df)
+    old = os.path.getmtime(disk_cache.disk_cache_path(("new",))) - 60
+    os.utime(disk_cache.disk_cache_path(("old",)), (old, old))
+
+    disk_cache.prune_disk_cache(max_mb=10 / 1024)  # Spazio per un solo file
+    assert disk_cache.read_disk_cache(("old",)) is None
+    assert disk_cache.read_disk_cache(("new",)) is not None
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from script_app.load_plotting_utils.utils import autocorrelation_fft, cross_correlation_fft, compute_autocorrelation_batch
+
+def _biased_autocorrelation(values, lag):
+    """Riferimento con il ciclo: covarianza al lag divisa per la varianza, entrambe su n."""
+    centered = values - values.mean()
+    return (centered[lag:] * centered[:len(values) - lag]).sum() / (centered ** 2).sum()
+
+def test_autocorrelation_stays_bounded_on_short_series():
+    acf, valid = autocorrelation_fft(np.array([1.0, 2.0, 3.0]), 2)
+    assert np.allclose(acf[:, 0], [1.0, 0.0, -0.5])
+    assert valid[0] == 3
+
+def test_autocorrelation_matches_the_lag_loop():
+    values = np.random.default_rng(0).normal(size=200).cumsum()
+    acf, _ = autocorrelation_fft(values, 10)
+    expected = [_biased_autocorrelation(values, lag) for lag in range(11)]
+    assert np.allclose(acf[:, 0], expected)
+    assert np.all(np.abs(acf) <= 1 + 1e-12)
+
+def test_autocorrelation_on_long_series_is_close_to_pearson():
+    values = np.sin(np.arange(5000) / 20) + np.random.default_rng(1).normal(scale=0.1, size=5000)
+    acf, _ = autocorrelation_fft(values, 5)
+    pearson = [np.corrcoef(values[lag:], values[:-lag])[0, 1] for lag in range(1, 6)]
+    assert np.allclose(acf[1:, 0], pearson, atol=1e-2)
+
+def test_autocorrelation_ignores_missing_values():
+    values = np.random.default_rng(2).normal(size=100)
+    with_gap = values.copy()
+    with_gap[[10, 50]] = np.nan
+    acf, valid = autocorrelation_fft(with_gap, 5)
+    assert valid[0] == 98
+    assert np.isfinite(acf).all()
+
+def test_cross_correlation_peaks_at_the_shift():
+    x = np.random.default_rng(3).normal(size=500)
+    y = np.roll(x, -7)  # y anticipa x di 7 campioni
+    lags, correlation = cross_correlation_fft(x, y, 20)
+    assert lags[np.argmax(correlation[:, 0])] == 7
+    assert np.all(np.abs(correlation) <= 1 + 1e-12)
+    assert np.isclose(correlation[lags == 0, 0][0], np.corrcoef(x, y)[0, 1])
+
+def test_batch_caps_the_lag_at_half_the_series():
+    df = pd.DataFrame({"a": np.arange(10, dtype=float)})
+    lags, values, band = compute_autocorrelation_batch(df, ["a"], max_lag=50)["a"]
+    assert lags[-1] == 5
+    assert np.isclose(band, 1.96 / np.sqrt(10))
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from script_app.load_plotting_utils.decimation import decimate, decimate_xy, lttb_indices, minmax_indices
+
+def _series(n=10_000):
+    x = np.arange(n, dtype=np.float64)
+    y = np.sin(x / 300) + np.random.default_rng(0).normal(scale=0.05, size=n)
+    y[n * 43 // 100], y[n * 77 // 100] = 5.0, -5.0  # Picchi isolati
+    return x, y
+
+def test_lttb_keeps_ends_and_spikes_within_budget():
+    x, y = _series()
+    selected = lttb_indices(x, y, 500)
+
+    assert len(selected) == 500
+    assert selected[0] == 0 and selected[-1] == len(x) - 1
+    assert np.all(np.diff(selected) > 0)
+    assert {4300, 7700} <= set(selected.tolist())
+
+def test_minmax_keeps_every_bucket_extreme():
+    _, y = _series()
+    selected = minmax_indices(y, 500)
+
+    assert len(selected) <= 500
+    assert y[selected].max() == y.max() and y[selected].min() == y.min()
+    assert selected[0] == 0 and selected[-1] == len(y) - 1
+
+def test_short_series_are_returned_unchanged():
+    x, y = _series(100)
+    assert np.array_equal(lttb_indices(x, y, 500), np.arange(100))
+    df = pd.DataFrame({"x": x, "y": y})
+    assert decimate(df, "x", ["y"], budget=500) is df
+
+def test_decimate_sorts_by_x_and_skips_missing_values():
+    x, y = _series()
+    y[1::10] = np.nan
+    order = np.random.default_rng(1).permutation(len(x))
+    df = pd.DataFrame({"time": pd.to_datetime(x[order], unit="s"), "y": y[order]})
+
+    for method in ("lttb", "minmax"):
+        reduced = decimate(df, "time", ["y"], budget=400, method=method)
+        assert len(reduced) <= 400
+        assert reduced["time"].is_monotonic_increasing
+        assert reduced["y"].notna().all()
+        assert reduced["y"].max() == 5.0
+
+def test_decimate_xy_returns_matching_pairs():
+    x, y = _series()
+    small_x, small_y = decimate_xy(x, y, budget=300, method="minmax")
+    assert len(small_x) == len(small_y) <= 300
+    np.testing.assert_array_equal(small_y.to_numpy(), y[small_x.to_numpy().astype(int)])
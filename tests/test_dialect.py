@@ -0,0 +1,50 @@
+import io
+import pytest
+
+from script_app.load_plotting_utils.dialect import sniff_dialect
+from script_app.load_plotting_utils.load import load_file, process_file
+
+def _upload(name, text):
+    buffer = io.BytesIO(text.encode("utf-8"))
+    buffer.name = name
+    return buffer
+
+def test_semicolon_decimal_comma_keeps_day_first_dates():
+    rows = "".join(f"{day:02d}.02.2020;{day},5;1{day},25\n" for day in range(1, 29))
+    text = "Date;Level;Rain\n" + rows
+
+    dialect = sniff_dialect(io.BytesIO(text.encode("utf-8")))
+    assert (dialect.sep, dialect.decimal, dialect.thousands) == (";", ",", None)
+
+    df = process_file(load_file(_upload("station.csv", text), dialect=dialect))
+    assert str(df["Date"].dtype).startswith("datetime64")
+    assert df["Date"].iloc[0].strftime("%Y-%m-%d") == "2020-02-01"
+    assert df["Level"].iloc[0] == 1.5
+
+def test_semicolon_point_thousands_keeps_day_first_dates():
+    text = "Date;Discharge\n" + "".join(f"{day:02d}.02.2020;1.2{day:02d},5\n" for day in range(1, 29))
+
+    dialect = sniff_dialect(io.BytesIO(text.encode("utf-8")))
+    assert (dialect.decimal, dialect.thousands, dialect.thousands_columns) == (",", None, (1,))
+
+    df = process_file(load_file(_upload("river.csv", text), dialect=dialect))
+    assert str(df["Date"].dtype).startswith("datetime64")
+    assert df["Date"].iloc[0].strftime("%Y-%m-%d") == "2020-02-01"
+    assert df["Discharge"].iloc[0] == 1201.5
+
+def test_semicolon_point_thousands_without_dates():
+    text = "Station;Discharge\n" + "".join(f"S{day};1.2{day:02d},5\n" for day in range(1, 29))
+
+    dialect = sniff_dialect(io.BytesIO(text.encode("utf-8")))
+    assert (dialect.decimal, dialect.thousands, dialect.thousands_columns) == (",", ".", ())
+
+    df = process_file(load_file(_upload("river.csv", text), dialect=dialect))
+    assert df["Discharge"].iloc[0] == 1201.5
+
+def test_convert_unix_to_datetime_skips_frames_already_examined(monkeypatch):
+    from script_app.load_plotting_utils import utils
+
+    df = process_file(load_file(_upload("station.csv", "Date,Level\n2020-02-01,1.5\n2020-02-02,2.5\n")))
+    assert "datetime_formats" in df.attrs
+    monkeypatch.setattr(utils, "infer_and_parse_dates", lambda df: pytest.fail("dates examined again"))
+    assert utils.convert_unix_to_datetime(df) is df
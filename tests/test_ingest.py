@@ -0,0 +1,48 @@
+import uuid
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+from script_app.load_plotting_utils import cache, ingest
+from script_app.load_plotting_utils.ingest import _Upload, load_datasets
+
+@pytest.fixture(autouse=True)
+def disk_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "DISK_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+def _csv(name, rows=50):
+    # Contenuto unico per test: la cache in memoria dei Dataset è condivisa
+    tag = uuid.uuid4().hex[:8]
+    lines = "".join(f"2020-01-{day % 28 + 1:02d} 00:00:00,{day}.5,{tag}\n" for day in range(rows))
+    return _Upload(name, f"Date,Level,Tag\n{lines}".encode())
+
+def test_arrow_buffer_round_trip():
+    df = pd.DataFrame({"a": [1.0, 2.0], "b": ["x", "y"]})
+    pd.testing.assert_frame_equal(ingest._from_arrow(ingest._to_arrow(df)), df)
+
+def test_unreadable_file_does_not_stop_the_others():
+    files = [_csv("a.csv"), _Upload("broken.xlsx", b"not a workbook"), _Upload("empty.csv", b""), _csv("b.csv")]
+    datasets = load_datasets(files, workers=2)
+    assert [dataset.name for dataset in datasets] == ["a.csv", "b.csv"]
+    assert all(dataset.n_rows == 50 for dataset in datasets)
+
+def test_broken_pool_falls_back_to_sequential_loading(monkeypatch):
+    class _BrokenPool:
+        def submit(self, *args):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+    def _pool(workers):
+        return _BrokenPool()
+
+    _pool.clear = lambda: None
+    monkeypatch.setattr(ingest, "ingest_pool", _pool)
+
+    files = [_csv("a.csv"), _Upload("broken.xlsx", b"not a workbook"), _csv("b.csv")]
+    datasets = load_datasets(files, workers=2)
+    assert [dataset.name for dataset in datasets] == ["a.csv", "b.csv"]
+    assert str(datasets[0].df["Date"].dtype).startswith("datetime64")
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from script_app.load_plotting_utils.spatial import build_spatial_index, query_bbox
+
+def _points(n=20_000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"lat": rng.uniform(44.0, 46.0, size=n), "lon": rng.uniform(9.0, 12.0, size=n)})
+    df.loc[::101, "lat"] = np.nan  # Coordinate mancanti: fuori dall'indice
+    return df
+
+def _brute_force(df, lat_min, lat_max, lon_min, lon_max):
+    inside = df["lat"].between(lat_min, lat_max) & df["lon"].between(lon_min, lon_max)
+    return np.flatnonzero(inside.to_numpy())
+
+def test_query_matches_a_full_scan():
+    df = _points()
+    index = build_spatial_index(df, "lat", "lon")
+    assert len(index) == df["lat"].notna().sum()
+
+    for box in [(44.5, 45.0, 10.0, 10.7), (43.0, 44.1, 8.0, 9.05), (45.123, 45.124, 9.0, 12.0), (44.0, 46.0, 9.0, 12.0)]:
+        np.testing.assert_array_equal(query_bbox(index, *box), _brute_force(df, *box))
+
+def test_bounds_are_inclusive_and_outside_boxes_are_empty():
+    df = pd.DataFrame({"lat": [45.0, 45.5, 46.0], "lon": [10.0, 10.5, 11.0]})
+    index = build_spatial_index(df, "lat", "lon")
+
+    assert query_bbox(index, 45.0, 45.5, 10.0, 10.5).tolist() == [0, 1]
+    assert query_bbox(index, 47.0, 48.0, 10.0, 11.0).size == 0
+
+def test_no_valid_coordinates_gives_no_index():
+    assert build_spatial_index(pd.DataFrame({"lat": [np.nan], "lon": [10.0]}), "lat", "lon") is None
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from script_app.load_plotting_utils.utils import calcula_statistics, _QuantileSketch
+
+def _frame(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(10, 3, size=n)
+    values[::97] = np.nan
+    return pd.DataFrame({"value": values, "level": rng.integers(0, 50, size=n), "station": ["S1", None] * (n // 2)})
+
+def test_chunked_moments_match_pandas():
+    df = _frame()
+    stats = calcula_statistics(df, chunksize=64).set_index("Variable")
+
+    for col in ("value", "level"):
+        series = df[col]
+        assert stats.loc[col, "Counting"] == series.count()
+        assert stats.loc[col, "Sum"] == pytest.approx(series.sum())
+        assert stats.loc[col, "Mean"] == pytest.approx(series.mean())
+        assert stats.loc[col, "Std"] == pytest.approx(series.std())
+        assert (stats.loc[col, "Minimum"], stats.loc[col, "Max"]) == (series.min(), series.max())
+        assert stats.loc[col, "Median"] == pytest.approx(series.median())
+        assert stats.loc[col, "Quantiles"] == "exact"
+    assert stats.loc["station", "Counting"] == 500
+
+def test_iterable_of_chunks_gives_the_same_statistics():
+    df = _frame()
+    chunks = (df.iloc[start:start + 100] for start in range(0, len(df), 100))
+    pd.testing.assert_frame_equal(calcula_statistics(chunks), calcula_statistics(df))
+
+def test_strided_sketch_estimates_quantiles_of_long_columns():
+    values = pd.DataFrame({"value": np.random.default_rng(1).uniform(0, 1, size=50_000)})
+    sketch = _QuantileSketch(size=1000, total_rows=len(values))
+    for start in range(0, len(values), 7000):
+        sketch.add(values.iloc[start:start + 7000], start)
+
+    assert not sketch.exact
+    assert sum(len(sample) for sample in sketch.samples) == 1000
+    assert sketch.quantiles([0.25, 0.5, 0.75])[:, 0] == pytest.approx([0.25, 0.5, 0.75], abs=0.05)
+
+def test_bernoulli_sketch_stays_bounded_without_total_rows():
+    values = pd.DataFrame({"value": np.random.default_rng(2).uniform(0, 1, size=50_000)})
+    sketch = _QuantileSketch(size=1000)
+    for start in range(0, len(values), 5000):
+        sketch.add(values.iloc[start:start + 5000], start)
+
+    assert not sketch.exact
+    assert sum(len(sample) for sample in sketch.samples) <= 2 * 1000 + 5000
+    assert sketch.quantiles([0.5])[0, 0] == pytest.approx(0.5, abs=0.05)